@@ -43,6 +43,10 @@ except Exception as e:
         @staticmethod
         def get_all_bot_users(): return []
         @staticmethod
+        def get_bot_users_page(cursor=None, page_size=50): return [], None
+        @staticmethod
+        def count_bot_users(): return 0
+        @staticmethod
         def get_config(key): return None
         @staticmethod
         def update_config(key, value): return False
@@ -66,6 +70,14 @@ except Exception as e:
         def get_telegram_session(phone=None): return None
         @staticmethod
         def delete_telegram_session(phone): return False
+        @staticmethod
+        def save_media_file(file_type, file_path, description=""): return None
+        @staticmethod
+        def create_broadcast(message): return None
+        @staticmethod
+        def get_broadcasts(limit=10): return []
+        @staticmethod
+        def cancel_broadcast(broadcast_id): return False
 
 app = Flask(__name__)
 app.secret_key = os.getenv("SECRET_KEY", "escrow_bot_secret_key_change_this_in_production")
@@ -91,7 +103,8 @@ def not_found(error):
 # Health check
 @app.route('/health')
 def health():
-    return jsonify({'status': 'ok', 'service': 'escrow-admin-panel', 'db_available': DB_AVAILABLE}), 200
+    cache_stats = database.get_cache_stats() if DB_AVAILABLE else {}
+    return jsonify({'status': 'ok', 'service': 'escrow-admin-panel', 'db_available': DB_AVAILABLE, 'cache': cache_stats}), 200
 
 # Helper functions
 def allowed_file(filename):
@@ -136,8 +149,10 @@ def logout():
 def dashboard():
     try:
         stats = database.get_statistics() or {'total_deals': 0, 'disputes_resolved': 0}
-        users = database.get_all_bot_users() or []
-        return render_template('admin_dashboard.html', stats=stats, users=users)
+        recent_users, _ = database.get_bot_users_page(page_size=10) or ([], None)
+        users_count = database.count_bot_users() or 0
+        return render_template('admin_dashboard.html', stats=stats,
+                               recent_users=recent_users, users_count=users_count)
     except Exception as e:
         print(f"Dashboard error: {e}")
         import traceback
@@ -148,8 +163,11 @@ def dashboard():
 @login_required
 def users():
     try:
-        all_users = database.get_all_bot_users() or []
-        return render_template('admin_users.html', users=all_users)
+        cursor = request.args.get('cursor')
+        page_users, next_cursor = database.get_bot_users_page(cursor=cursor) or ([], None)
+        users_count = database.count_bot_users() or 0
+        return render_template('admin_users.html', users=page_users, users_count=users_count,
+                               cursor=cursor, next_cursor=next_cursor)
     except Exception as e:
         print(f"Users error: {e}")
         return f"Error loading users: {str(e)}", 500
@@ -172,6 +190,8 @@ def videos():
                 filename = secure_filename(file.filename)
                 filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                 file.save(filepath)
+                # Becomes the current video; its new content is uploaded to Telegram once
+                database.save_media_file('video', filepath, filename)
                 flash(f'Video uploaded: {filename}', 'success')
             else:
                 flash('Invalid file type!', 'danger')
@@ -205,6 +225,37 @@ def content():
         print(f"Content error: {e}")
         return f"Error: {str(e)}", 500
 
+@app.route('/broadcast', methods=['GET', 'POST'])
+@login_required
+def broadcast():
+    try:
+        if request.method == 'POST':
+            action = request.form.get('action')
+            
+            if action == 'send':
+                message = (request.form.get('message') or '').strip()
+                # Only queued here; the bot sends it at Telegram's rate limits
+                if message and database.create_broadcast(message):
+                    flash('Broadcast queued! The bot will start sending it shortly.', 'success')
+                else:
+                    flash('Error queueing broadcast!', 'danger')
+            
+            elif action == 'cancel':
+                broadcast_id = request.form.get('broadcast_id')
+                if database.cancel_broadcast(int(broadcast_id)):
+                    flash('Broadcast cancelled.', 'success')
+                else:
+                    flash('Broadcast already finished or not found.', 'danger')
+            
+            return redirect(url_for('broadcast'))
+        
+        broadcasts = database.get_broadcasts() or []
+        users_count = database.count_bot_users() or 0
+        return render_template('admin_broadcast.html', broadcasts=broadcasts, users_count=users_count)
+    except Exception as e:
+        print(f"Broadcast error: {e}")
+        return f"Error: {str(e)}", 500
+
 @app.route('/settings', methods=['GET', 'POST'])
 @login_required
 def settings():
@@ -0,0 +1,1024 @@
+"""
+Async Database Layer
+Awaitable mirror of database.py for use inside the bot's event loop.
+
+Every function keeps the same name and return shape as its counterpart in
+database.py, but talks to Supabase's PostgREST endpoint through an async
+HTTP client, so a slow round-trip no longer blocks other chats.
+"""
+import os
+import time
+import asyncio
+from collections import Counter
+from datetime import datetime
+from dotenv import load_dotenv
+
+from bot_error_wrapper import safe_async_call
+from cache import config_cache, deal_cache, table_cache, group_id_variants, MISSING
+from wallet_resolver import wallet_resolver, legacy_wallets_from_rows
+from write_behind import WriteBehindQueue
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Storage backend: "supabase" (default) or "sqlite" (local file, see sqlite_backend.py)
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "supabase").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "escrow.db")
+
+# Supabase configuration
+SUPABASE_URL = os.getenv("SUPABASE_URL", "YOUR_SUPABASE_URL_HERE")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY", "YOUR_SUPABASE_KEY_HERE")
+
+# Seconds between statistic flushes (0 = write every increment immediately)
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "0"))
+
+# Increments waiting for the next flush, and the task flushing them
+_pending_stats = Counter()
+_stats_flusher = None
+
+# Bumped whenever this process changes statistics ('statistics') or an
+# editable_content row ('content:<key>'), so render_cache rebuilds the
+# messages made from them instead of waiting for their TTL
+data_versions = Counter()
+
+# track_user write-behind: seconds between bulk upserts, and max rows per upsert
+USER_TRACKING_FLUSH_INTERVAL = float(os.getenv("USER_TRACKING_FLUSH_INTERVAL", "0.3"))
+USER_TRACKING_BATCH_SIZE = int(os.getenv("USER_TRACKING_BATCH_SIZE", "500"))
+
+def _create_client():
+    """Create an async client for the configured backend"""
+    if DATABASE_BACKEND == 'sqlite':
+        import sqlite_backend
+        return sqlite_backend.create_async_client(SQLITE_PATH)
+
+    # Async PostgREST client (same endpoint and auth the sync supabase client uses)
+    from postgrest import AsyncPostgrestClient
+    from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+    return AsyncPostgrestClient(
+        f"{SUPABASE_URL}/rest/v1",
+        headers={
+            **DEFAULT_POSTGREST_CLIENT_HEADERS,
+            'apiKey': SUPABASE_KEY,
+            'Authorization': f'Bearer {SUPABASE_KEY}'
+        }
+    )
+
+# Initialize async client
+supabase = _create_client()
+
+async def close():
+    """Close the HTTP connection pool (a fresh client is ready if the bot restarts polling)"""
+    global supabase
+    await supabase.aclose()
+    supabase = _create_client()
+
+# Admin panel login, seeded only on a fresh install (no admin_username row):
+# a password the operator blanked or deleted must never come back as admin123
+DEFAULT_ADMIN_CONFIG = {
+    'admin_username': 'MiddleCryptoSupport',
+    'admin_password': 'admin123'
+}
+# Default rows seeded on first start (only where the key has no row)
+DEFAULT_CONFIG = {
+    # Legacy wallet fallback
+    'wallet_BTC': 'bc1q2szy4xmj4gxel6xdpp0zaelsn6x43885yy8nhg',
+    'wallet_LTC': 'LPGJ1UeHiNYyUJjzBcwTCQEdMPpekqswFc',
+    'wallet_USDT (TRC20)': 'TJUq1Ab456XeKrJPwbDGUEZnwW3y31E5iQ'
+}
+DEFAULT_STATISTICS = {
+    'total_deals': 5542,
+    'disputes_resolved': 158
+}
+DEFAULT_CRYPTO_ADDRESSES = [
+    {'currency': 'BTC', 'address': 'bc1q2szy4xmj4gxel6xdpp0zaelsn6x43885yy8nhg', 'network': 'Bitcoin', 'label': 'Main Wallet'},
+    {'currency': 'LTC', 'address': 'LPGJ1UeHiNYyUJjzBcwTCQEdMPpekqswFc', 'network': 'Litecoin', 'label': 'Main Wallet'},
+    {'currency': 'USDT', 'address': 'TJUq1Ab456XeKrJPwbDGUEZnwW3y31E5iQ', 'network': 'TRC20', 'label': 'Main Wallet'}
+]
+
+@safe_async_call
+async def init_db():
+    """
+    Warm up: load config, crypto_addresses, statistics, editable_content,
+    media_files and media_file_ids in parallel into the in-process caches,
+    then seed any missing defaults with one batched write per table.
+    Returns the warm-up time in seconds.
+    """
+    started = time.perf_counter()
+    try:
+        config, addresses, statistics, content, media, media_ids = await asyncio.gather(
+            supabase.table('config').select('key, value').execute(),
+            supabase.table('crypto_addresses').select('*').order('created_at', desc=True).execute(),
+            supabase.table('statistics').select('key, value').execute(),
+            supabase.table('editable_content').select('key, content').execute(),
+            supabase.table('media_files').select('file_type, file_path').order('uploaded_at', desc=True).execute(),
+            supabase.table('media_file_ids').select('content_hash, file_id').execute()
+        )
+        config_rows = {row['key']: row['value'] for row in config.data}
+        address_rows = addresses.data
+        stats = {row['key']: row['value'] for row in statistics.data}
+
+        # Seed defaults only where missing; existing rows are never rewritten
+        seeds = []
+        defaults = dict(DEFAULT_CONFIG)
+        if 'admin_username' not in config_rows:
+            defaults.update(DEFAULT_ADMIN_CONFIG)
+        missing_config = [
+            {'key': key, 'value': value} for key, value in defaults.items()
+            if key not in config_rows
+        ]
+        if missing_config:
+            seeds.append(supabase.table('config').upsert(missing_config, ignore_duplicates=True).execute())
+            config_rows.update({row['key']: row['value'] for row in missing_config})
+        missing_stats = [
+            {'key': key, 'value': value} for key, value in DEFAULT_STATISTICS.items()
+            if key not in stats
+        ]
+        if missing_stats:
+            seeds.append(supabase.table('statistics').upsert(missing_stats, ignore_duplicates=True).execute())
+            stats.update({row['key']: row['value'] for row in missing_stats})
+        if not address_rows:
+            seeds.append(supabase.table('crypto_addresses').insert(DEFAULT_CRYPTO_ADDRESSES).execute())
+        if seeds:
+            await asyncio.gather(*seeds)
+            if not address_rows:
+                # Re-read so cached rows carry their generated ids
+                address_rows = (await supabase.table('crypto_addresses').select('*').order('created_at', desc=True).execute()).data
+
+        # Fill the caches
+        for key, value in config_rows.items():
+            config_cache.set(key, value)
+        address_tuples = [_address_tuple(a) for a in address_rows]
+        table_cache.set('crypto_addresses', address_tuples)
+        wallet_resolver.build(
+            address_tuples,
+            legacy_wallets_from_rows([{'key': k, 'value': v} for k, v in config_rows.items()])
+        )
+        table_cache.set('statistics', stats)
+        for row in content.data:
+            table_cache.set(f"content:{row['key']}", row['content'])
+        for row in reversed(media.data):
+            # Newest last, so it wins for its file_type
+            table_cache.set(f"media:{row['file_type']}", row['file_path'])
+        for row in media_ids.data:
+            table_cache.set(f"media_id:{row['content_hash']}", row['file_id'])
+
+        elapsed = time.perf_counter() - started
+        print(f"✅ Database warmed up in {elapsed:.2f}s "
+              f"({len(config_rows)} config, {len(address_tuples)} addresses, "
+              f"{len(content.data)} content, {len(media.data)} media"
+              f"{', seeded defaults' if seeds else ''})")
+        return elapsed
+    except Exception as e:
+        print(f"❌ Database init error: {e}")
+
+def _address_tuple(a):
+    """crypto_addresses row -> (id, currency, address, network, label, created_at)"""
+    return (a['id'], a['currency'], a['address'], a['network'], a['label'], a['created_at'])
+
+@safe_async_call
+async def set_user_role(user_id, role, address):
+    """Set user role and wallet address"""
+    try:
+        await supabase.table('users').upsert({
+            'user_id': user_id,
+            'role': role,
+            'wallet_address': address
+        }).execute()
+    except Exception as e:
+        print(f"Error setting user role: {e}")
+
+@safe_async_call
+async def get_user_role(user_id):
+    """Get user role and wallet address"""
+    try:
+        result = await supabase.table('users').select('role, wallet_address').eq('user_id', user_id).execute()
+        if result.data:
+            return (result.data[0]['role'], result.data[0]['wallet_address'])
+        return None
+    except Exception as e:
+        print(f"Error getting user role: {e}")
+        return None
+
+@safe_async_call
+async def set_config(key, value):
+    """Set configuration value"""
+    try:
+        await supabase.table('config').upsert({'key': key, 'value': value}).execute()
+    except Exception as e:
+        print(f"Error setting config: {e}")
+    finally:
+        config_cache.invalidate(key)
+        if str(key).startswith('wallet_'):
+            wallet_resolver.invalidate()
+
+# Alias for compatibility
+update_config = set_config
+
+@safe_async_call
+async def get_config(key):
+    """Get configuration value (served from the in-process config cache when fresh)"""
+    cached = config_cache.get(key)
+    if cached is not MISSING:
+        return cached
+    try:
+        result = await supabase.table('config').select('value').eq('key', key).execute()
+        value = result.data[0]['value'] if result.data else None
+        config_cache.set(key, value)
+        return value
+    except Exception as e:
+        print(f"Error getting config: {e}")
+        return None
+
+def get_cache_stats():
+    """Hit/miss counters for the in-process caches"""
+    return {'config': config_cache.stats(), 'deals': deal_cache.stats(), 'tables': table_cache.stats()}
+
+def get_queue_stats():
+    """Depth and write counters for the write-behind queues"""
+    return {'bot_users': user_tracking_queue.stats()}
+
+@safe_async_call
+async def create_deal(deal_id, buyer_id, seller_id, group_id):
+    """Create a new escrow deal"""
+    try:
+        await supabase.table('deals').insert({
+            'deal_id': deal_id,
+            'buyer_id': buyer_id,
+            'seller_id': seller_id,
+            'group_id': group_id,
+            'status': 'active'
+        }).execute()
+        deal_cache.put(group_id, (deal_id, buyer_id, seller_id, None, None, None, 'active'))
+    except Exception as e:
+        print(f"Error creating deal: {e}")
+
+@safe_async_call
+async def update_deal_address(deal_id, role, address, user_id=None):
+    """Update buyer or seller address AND user_id for a deal"""
+    try:
+        data = {}
+        if role == 'buyer':
+            data['buyer_address'] = address
+            if user_id:
+                data['buyer_id'] = user_id
+            await supabase.table('deals').update(data).eq('deal_id', deal_id).execute()
+        elif role == 'seller':
+            data['seller_address'] = address
+            if user_id:
+                data['seller_id'] = user_id
+            await supabase.table('deals').update(data).eq('deal_id', deal_id).execute()
+        if data:
+            deal_cache.update(deal_id, **data)
+    except Exception as e:
+        print(f"Error updating deal address: {e}")
+
+@safe_async_call
+async def close_deal(deal_id, status='completed'):
+    """Mark a deal as finished (its group can then be recycled)"""
+    try:
+        await supabase.table('deals').update({'status': status}).eq('deal_id', deal_id).execute()
+        deal_cache.update(deal_id, status=status)
+        return True
+    except Exception as e:
+        print(f"Error closing deal: {e}")
+        return False
+
+@safe_async_call
+async def get_deal_by_group(group_id):
+    """Get deal information by group ID (Flexible check, cached per group)"""
+    cached = deal_cache.get(group_id)
+    if cached is not None:
+        return cached
+    try:
+        # One query covering every stored form (e.g. -100123 and 123)
+        result = await supabase.table('deals').select('*').in_('group_id', group_id_variants(group_id)).order('created_at', desc=True).limit(1).execute()
+
+        if result.data:
+            d = result.data[0]
+            deal = (d['deal_id'], d['buyer_id'], d['seller_id'], d['buyer_address'],
+                    d['seller_address'], d['bot_address'], d['status'])
+            deal_cache.put(group_id, deal)
+            return deal
+        return None
+    except Exception as e:
+        print(f"Error getting deal: {e}")
+        return None
+
+@safe_async_call
+async def get_statistics():
+    """Get current bot statistics"""
+    try:
+        cached = table_cache.get('statistics')
+        if cached is MISSING:
+            result = await supabase.table('statistics').select('*').execute()
+            cached = {row['key']: row['value'] for row in result.data}
+            table_cache.set('statistics', cached)
+        stats = dict(cached)
+        # Include increments that have not been flushed yet
+        for key, amount in _pending_stats.items():
+            stats[key] = stats.get(key, 0) + amount
+        return stats
+    except Exception as e:
+        print(f"Error getting statistics: {e}")
+        return {}
+
+@safe_async_call
+async def track_user(user_id, username, first_name, last_name=None):
+    """
+    Track user who started the bot
+    While the user tracking queue runs, the row is buffered and written in bulk.
+    """
+    row = {
+        'user_id': user_id,
+        'username': username,
+        'first_name': first_name,
+        'last_name': last_name
+    }
+    if user_tracking_queue.running:
+        user_tracking_queue.put(row)
+        return
+    try:
+        await supabase.table('bot_users').upsert(row).execute()
+    except Exception as e:
+        print(f"Error tracking user: {e}")
+
+async def _upsert_bot_users(rows):
+    """Bulk upsert for the user tracking queue (raises so the queue can retry)"""
+    await supabase.table('bot_users').upsert(rows).execute()
+
+# Write-behind buffer for track_user (deduplicated by user_id)
+user_tracking_queue = WriteBehindQueue(
+    'bot_users',
+    _upsert_bot_users,
+    key='user_id',
+    flush_interval=USER_TRACKING_FLUSH_INTERVAL,
+    max_batch=USER_TRACKING_BATCH_SIZE
+)
+
+@safe_async_call
+async def get_all_users():
+    """Get all users who started the bot"""
+    try:
+        result = await supabase.table('bot_users').select('*').order('started_at', desc=True).execute()
+        return [(u['user_id'], u['username'], u['first_name'], u['last_name'], u['started_at'])
+                for u in result.data]
+    except Exception as e:
+        print(f"Error getting users: {e}")
+        return []
+
+# Alias for compatibility
+get_all_bot_users = get_all_users
+
+# Default page size of the admin users list
+USERS_PAGE_SIZE = 50
+
+@safe_async_call
+async def get_bot_users_page(cursor=None, page_size=USERS_PAGE_SIZE):
+    """
+    One page of users, newest first, using a (started_at, user_id) keyset.
+
+    cursor is the next_cursor returned for the previous page (None for the
+    first page). Returns (users, next_cursor); next_cursor is None on the last
+    page. Returns None if the read failed, so callers can tell an error from
+    the end of the list.
+    """
+    try:
+        params = {'page_size': page_size}
+        if cursor:
+            started_at, user_id = cursor.rsplit('|', 1)
+            params.update(after_started_at=started_at, after_user_id=int(user_id))
+        result = await supabase.rpc('bot_users_page', params).execute()
+        users = [(u['user_id'], u['username'], u['first_name'], u['last_name'], u['started_at'])
+                 for u in result.data]
+        next_cursor = None
+        if len(users) == page_size:
+            next_cursor = f"{users[-1][4]}|{users[-1][0]}"
+        return users, next_cursor
+    except Exception as e:
+        print(f"Error getting users page: {e}")
+        return None
+
+@safe_async_call
+async def count_bot_users():
+    """Number of users who started the bot (trigger-maintained counter, no table scan)"""
+    try:
+        result = await supabase.table('row_counts').select('total').eq('table_name', 'bot_users').execute()
+        return result.data[0]['total'] if result.data else 0
+    except Exception as e:
+        print(f"Error counting users: {e}")
+        return 0
+
+@safe_async_call
+async def save_media_file(file_type, file_path, description=""):
+    """Save media file info"""
+    try:
+        # Delete old file of same type
+        await supabase.table('media_files').delete().eq('file_type', file_type).execute()
+        # Insert new
+        await supabase.table('media_files').insert({
+            'file_type': file_type,
+            'file_path': file_path,
+            'description': description
+        }).execute()
+    except Exception as e:
+        print(f"Error saving media file: {e}")
+    finally:
+        table_cache.invalidate(f"media:{file_type}")
+
+@safe_async_call
+async def get_media_file(file_type):
+    """Get media file path by type"""
+    cached = table_cache.get(f"media:{file_type}")
+    if cached is not MISSING:
+        return cached
+    try:
+        result = await supabase.table('media_files').select('file_path').eq('file_type', file_type).order('uploaded_at', desc=True).limit(1).execute()
+        path = result.data[0]['file_path'] if result.data else None
+        table_cache.set(f"media:{file_type}", path)
+        return path
+    except Exception as e:
+        print(f"Error getting media file: {e}")
+        return None
+
+@safe_async_call
+async def get_media_file_id(content_hash):
+    """Telegram file_id stored for a file's SHA-256, or None"""
+    cached = table_cache.get(f"media_id:{content_hash}")
+    if cached is not MISSING:
+        return cached
+    try:
+        result = await supabase.table('media_file_ids').select('file_id').eq('content_hash', content_hash).execute()
+        file_id = result.data[0]['file_id'] if result.data else None
+        table_cache.set(f"media_id:{content_hash}", file_id)
+        return file_id
+    except Exception as e:
+        print(f"Error getting media file_id: {e}")
+        return None
+
+@safe_async_call
+async def save_media_file_id(file_type, file_path, content_hash, file_id):
+    """
+    Remember the Telegram file_id of an uploaded file's content
+    (media_files, and so which file is current, is left alone)
+    """
+    try:
+        await supabase.table('media_file_ids').upsert({
+            'content_hash': content_hash,
+            'file_id': file_id,
+            'file_type': file_type,
+            'file_path': file_path,
+            'updated_at': datetime.now().isoformat()
+        }).execute()
+        return True
+    except Exception as e:
+        print(f"Error saving media file_id: {e}")
+        return False
+    finally:
+        table_cache.set(f"media_id:{content_hash}", file_id)
+
+@safe_async_call
+async def forget_media_file_id(content_hash):
+    """Drop a file_id Telegram no longer accepts"""
+    try:
+        await supabase.table('media_file_ids').delete().eq('content_hash', content_hash).execute()
+    except Exception as e:
+        print(f"Error clearing media file_id: {e}")
+    finally:
+        table_cache.invalidate(f"media_id:{content_hash}")
+
+@safe_async_call
+async def update_content(key, content):
+    """Update editable content"""
+    try:
+        await supabase.table('editable_content').upsert({
+            'key': key,
+            'content': content,
+            'updated_at': datetime.now().isoformat()
+        }).execute()
+    except Exception as e:
+        print(f"Error updating content: {e}")
+    finally:
+        table_cache.invalidate(f"content:{key}")
+        data_versions[f"content:{key}"] += 1
+
+@safe_async_call
+async def get_content(key, default=""):
+    """Get editable content"""
+    cached = table_cache.get(f"content:{key}")
+    if cached is not MISSING:
+        return cached if cached is not None else default
+    try:
+        result = await supabase.table('editable_content').select('content').eq('key', key).execute()
+        content = result.data[0]['content'] if result.data else None
+        table_cache.set(f"content:{key}", content)
+        return content if content is not None else default
+    except Exception as e:
+        print(f"Error getting content: {e}")
+        return default
+
+@safe_async_call
+async def get_all_media():
+    """Get all media files"""
+    try:
+        result = await supabase.table('media_files').select('*').order('uploaded_at', desc=True).execute()
+        return [(m['file_type'], m['file_path'], m['description'], m['uploaded_at'])
+                for m in result.data]
+    except Exception as e:
+        print(f"Error getting all media: {e}")
+        return []
+
+@safe_async_call
+async def increment_stat(key, amount=1):
+    """
+    Increment a statistic atomically (increment_stat SQL function, see supabase_schema.sql)
+    While the stats flusher runs, increments are coalesced in memory instead.
+    """
+    if _stats_flusher is not None:
+        _pending_stats[key] += amount
+        data_versions['statistics'] += 1
+        return
+    try:
+        await supabase.rpc('increment_stat', {'stat_key': key, 'amount': amount}).execute()
+        table_cache.invalidate('statistics')
+        data_versions['statistics'] += 1
+    except Exception as e:
+        print(f"Error incrementing stat: {e}")
+
+@safe_async_call
+async def flush_stats():
+    """Write all coalesced increments in one increment_stats call"""
+    if not _pending_stats:
+        return
+    deltas = dict(_pending_stats)
+    _pending_stats.clear()
+    try:
+        await supabase.rpc('increment_stats', {'deltas': deltas}).execute()
+        table_cache.invalidate('statistics')
+    except Exception as e:
+        # Keep the deltas for the next flush so no increment is lost
+        _pending_stats.update(deltas)
+        print(f"Error flushing stats: {e}")
+
+async def _stats_flush_loop(interval):
+    while True:
+        await asyncio.sleep(interval)
+        await flush_stats()
+
+def start_stats_flusher(interval=None):
+    """Coalesce increment_stat calls and flush every `interval` seconds (STATS_FLUSH_INTERVAL)"""
+    global _stats_flusher
+    interval = STATS_FLUSH_INTERVAL if interval is None else interval
+    if interval <= 0 or _stats_flusher is not None:
+        return
+    _stats_flusher = asyncio.create_task(_stats_flush_loop(interval))
+
+async def stop_stats_flusher():
+    """Stop coalescing and flush whatever is pending"""
+    global _stats_flusher
+    if _stats_flusher is None:
+        return
+    _stats_flusher.cancel()
+    _stats_flusher = None
+    await flush_stats()
+
+# Telegram Session Management
+@safe_async_call
+async def get_telegram_admin_session():
+    """
+    Get the most recent admin Telegram session from database
+    Returns: dict with session_string, user_id, phone, etc. or None
+    """
+    try:
+        result = await supabase.table('telegram_sessions').select('*').order('updated_at', desc=True).limit(1).execute()
+        if result.data and len(result.data) > 0:
+            return result.data[0]
+        return None
+    except Exception as e:
+        print(f"Error getting telegram admin session: {e}")
+        return None
+
+@safe_async_call
+async def get_telegram_sessions():
+    """
+    Get every stored admin Telegram session, most recently updated first
+    Returns: list of session dicts
+    """
+    try:
+        result = await supabase.table('telegram_sessions').select('*').order('updated_at', desc=True).execute()
+        return result.data
+    except Exception as e:
+        print(f"Error getting telegram sessions: {e}")
+        return []
+
+@safe_async_call
+async def get_telegram_session_versions():
+    """
+    Cheap change check for telegram_sessions: (id, updated_at) of every row
+    Returns: sorted tuple, or None on error
+    """
+    try:
+        result = await supabase.table('telegram_sessions').select('id, updated_at').execute()
+        return tuple(sorted((row['id'], str(row['updated_at'])) for row in result.data))
+    except Exception as e:
+        print(f"Error getting telegram session versions: {e}")
+        return None
+
+@safe_async_call
+async def save_entity_cache(session_id, entity_cache):
+    """Store an admin account's resolved input peers (see entity_cache.py)"""
+    try:
+        await supabase.table('telegram_sessions').update({'entity_cache': entity_cache}).eq('id', session_id).execute()
+        return True
+    except Exception as e:
+        print(f"Error saving entity cache: {e}")
+        return False
+
+# -------------------------------------------------------------------------
+# Group pool (see group_pool.py)
+# -------------------------------------------------------------------------
+
+@safe_async_call
+async def add_pool_group(group_id, access_hash, invite_link, bot_username, creator_id=None,
+                         status='ready', deal_id=None):
+    """Store a provisioned group (status 'claimed' + deal_id for groups created inline for a deal)"""
+    try:
+        await supabase.table('group_pool').insert({
+            'group_id': group_id,
+            'access_hash': access_hash,
+            'creator_id': creator_id,
+            'invite_link': invite_link,
+            'bot_username': bot_username,
+            'status': status,
+            'deal_id': deal_id
+        }).execute()
+        return True
+    except Exception as e:
+        print(f"Error adding pool group: {e}")
+        return False
+
+@safe_async_call
+async def claim_pool_group(deal_id, bot_username):
+    """
+    Atomically mark the oldest ready group as claimed by deal_id
+    Returns: group_pool row dict or None if the pool is empty
+    """
+    try:
+        result = await supabase.rpc('claim_pool_group', {
+            'claim_deal_id': deal_id,
+            'claim_bot_username': bot_username
+        }).execute()
+        return result.data[0] if result.data else None
+    except Exception as e:
+        print(f"Error claiming pool group: {e}")
+        return None
+
+@safe_async_call
+async def get_pool_group(group_id):
+    """group_pool row for a group (any ID form), or None"""
+    try:
+        result = await supabase.table('group_pool').select('*').in_('group_id', group_id_variants(group_id)).limit(1).execute()
+        return result.data[0] if result.data else None
+    except Exception as e:
+        print(f"Error getting pool group: {e}")
+        return None
+
+@safe_async_call
+async def release_pool_group(group_id, invite_link):
+    """Put a recycled group back in the pool as ready, with its fresh invite link"""
+    try:
+        await supabase.table('group_pool').update({
+            'status': 'ready',
+            'deal_id': None,
+            'claimed_at': None,
+            'invite_link': invite_link
+        }).in_('group_id', group_id_variants(group_id)).execute()
+        return True
+    except Exception as e:
+        print(f"Error releasing pool group: {e}")
+        return False
+
+@safe_async_call
+async def count_pool_groups(bot_username):
+    """Number of ready groups for this bot (None on error)"""
+    try:
+        result = await supabase.table('group_pool').select('id').eq('bot_username', bot_username).eq('status', 'ready').execute()
+        return len(result.data)
+    except Exception as e:
+        print(f"Error counting pool groups: {e}")
+        return None
+
+# -------------------------------------------------------------------------
+# Merged features from api/database.py
+# -------------------------------------------------------------------------
+
+@safe_async_call
+async def update_editable_content(key, content):
+    """Update editable content"""
+    try:
+        await supabase.table('editable_content').upsert({
+            'key': key,
+            'content': content,
+            'updated_at': datetime.now().isoformat()
+        }).execute()
+        return True
+    except Exception as e:
+        print(f"Error updating editable content: {e}")
+        return False
+    finally:
+        table_cache.invalidate(f"content:{key}")
+        data_versions[f"content:{key}"] += 1
+
+@safe_async_call
+async def get_all_editable_content():
+    """Get all editable content"""
+    try:
+        result = await supabase.table('editable_content').select('*').order('updated_at', desc=True).execute()
+        return [(c['key'], c['content'], c['updated_at']) for c in result.data]
+    except Exception as e:
+        print(f"Error getting editable content: {e}")
+        return []
+
+@safe_async_call
+async def get_crypto_addresses():
+    """Get all crypto addresses"""
+    cached = table_cache.get('crypto_addresses')
+    if cached is not MISSING:
+        return cached
+    try:
+        result = await supabase.table('crypto_addresses').select('*').order('created_at', desc=True).execute()
+        addresses = [_address_tuple(a) for a in result.data]
+        table_cache.set('crypto_addresses', addresses)
+        return addresses
+    except Exception as e:
+        print(f"Error getting crypto addresses: {e}")
+        return []
+
+@safe_async_call
+async def add_crypto_address(currency, address, network='', label=''):
+    """Add a new crypto address"""
+    try:
+        await supabase.table('crypto_addresses').insert({
+            'currency': currency,
+            'address': address,
+            'network': network,
+            'label': label
+        }).execute()
+        wallet_resolver.invalidate()
+        table_cache.invalidate('crypto_addresses')
+        return True
+    except Exception as e:
+        print(f"Error adding crypto address: {e}")
+        return False
+
+@safe_async_call
+async def delete_crypto_address(address_id):
+    """Delete a crypto address"""
+    try:
+        await supabase.table('crypto_addresses').delete().eq('id', address_id).execute()
+        wallet_resolver.invalidate()
+        table_cache.invalidate('crypto_addresses')
+        return True
+    except Exception as e:
+        print(f"Error deleting crypto address: {e}")
+        return False
+
+@safe_async_call
+async def update_crypto_address(address_id, currency, address, network='', label=''):
+    """Update a crypto address"""
+    try:
+        await supabase.table('crypto_addresses').update({
+            'currency': currency,
+            'address': address,
+            'network': network,
+            'label': label
+        }).eq('id', address_id).execute()
+        wallet_resolver.invalidate()
+        table_cache.invalidate('crypto_addresses')
+        return True
+    except Exception as e:
+        print(f"Error updating crypto address: {e}")
+        return False
+
+@safe_async_call
+async def get_bot_wallet_address(network_string):
+    """
+    Get bot address by network string (e.g. BTC, USDT (BEP20))
+    Prioritizes crypto_addresses table, then falls back to config.
+    Answered from the in-memory wallet index; the DB is only read to (re)build it.
+    """
+    if not wallet_resolver.ready:
+        await _build_wallet_index()
+    return wallet_resolver.resolve(network_string)
+
+async def _build_wallet_index():
+    """Load crypto_addresses and legacy wallet_* config keys into the wallet index"""
+    try:
+        addrs = await get_crypto_addresses()
+        result = await supabase.table('config').select('key, value').like('key', 'wallet_%').execute()
+        wallet_resolver.build(addrs or [], legacy_wallets_from_rows(result.data))
+    except Exception as e:
+        print(f"Error building wallet index: {e}")
+
+# -------------------------------------------------------------------------
+# Telegram Session Management (for Admin Panel group creation)
+# -------------------------------------------------------------------------
+
+# Bumped whenever this process saves or deletes a session, so the admin
+# account pool reloads right away instead of on its next check
+telegram_sessions_version = 0
+
+def _sessions_changed():
+    global telegram_sessions_version
+    telegram_sessions_version += 1
+
+@safe_async_call
+async def save_telegram_session(session_string, phone, user_data=None):
+    """Save Telegram session string to database"""
+    try:
+        data = {
+            'session_string': session_string,
+            'phone': phone,
+            'user_id': user_data.get('id') if user_data else None,
+            'username': user_data.get('username') if user_data else None,
+            'first_name': user_data.get('first_name') if user_data else None,
+            'last_name': user_data.get('last_name') if user_data else None,
+            'updated_at': datetime.now().isoformat()
+        }
+
+        # Check if session exists for this phone
+        result = await supabase.table('telegram_sessions').select('*').eq('phone', phone).execute()
+
+        if result.data:
+            await supabase.table('telegram_sessions').update(data).eq('phone', phone).execute()
+        else:
+            data['created_at'] = datetime.now().isoformat()
+            await supabase.table('telegram_sessions').insert(data).execute()
+
+        _sessions_changed()
+        return True
+    except Exception as e:
+        print(f"Error saving Telegram session: {e}")
+        return False
+
+@safe_async_call
+async def get_telegram_session(phone=None):
+    """Get Telegram session string from database"""
+    try:
+        if phone:
+            result = await supabase.table('telegram_sessions').select('*').eq('phone', phone).execute()
+        else:
+            # Get the most recent session
+            result = await supabase.table('telegram_sessions').select('*').order('updated_at', desc=True).limit(1).execute()
+
+        if result.data:
+            return result.data[0]
+        return None
+    except Exception as e:
+        print(f"Error getting Telegram session: {e}")
+        return None
+
+@safe_async_call
+async def delete_telegram_session(phone):
+    """Delete Telegram session from database"""
+    try:
+        await supabase.table('telegram_sessions').delete().eq('phone', phone).execute()
+        _sessions_changed()
+        return True
+    except Exception as e:
+        print(f"Error deleting Telegram session: {e}")
+        return False
+
+# -------------------------------------------------------------------------
+# Broadcasts (see broadcast.py)
+# -------------------------------------------------------------------------
+
+@safe_async_call
+async def create_broadcast(message):
+    """Queue a broadcast to every bot user. Returns: the new broadcast id, or None"""
+    try:
+        result = await supabase.table('broadcasts').insert({
+            'message': message,
+            'status': 'pending'
+        }).execute()
+        return result.data[0]['id'] if result.data else None
+    except Exception as e:
+        print(f"Error creating broadcast: {e}")
+        return None
+
+@safe_async_call
+async def get_broadcasts(limit=10):
+    """Most recent broadcasts (row dicts), newest first"""
+    try:
+        result = await supabase.table('broadcasts').select('*').order('id', desc=True).limit(limit).execute()
+        return result.data
+    except Exception as e:
+        print(f"Error getting broadcasts: {e}")
+        return []
+
+@safe_async_call
+async def get_broadcast(broadcast_id):
+    """broadcasts row dict, or None"""
+    try:
+        result = await supabase.table('broadcasts').select('*').eq('id', broadcast_id).execute()
+        return result.data[0] if result.data else None
+    except Exception as e:
+        print(f"Error getting broadcast: {e}")
+        return None
+
+@safe_async_call
+async def claim_broadcast(owner, lease_seconds):
+    """
+    Atomically take the oldest broadcast to send (pending, already owned by
+    owner, or running with an expired lease) and lease it to owner
+    Returns: the broadcasts row dict (status 'running'), or None
+    """
+    try:
+        result = await supabase.rpc('claim_broadcast', {
+            'claim_owner': owner,
+            'lease_seconds': lease_seconds
+        }).execute()
+        return result.data[0] if result.data else None
+    except Exception as e:
+        print(f"Error claiming broadcast: {e}")
+        return None
+
+@safe_async_call
+async def renew_broadcast_lease(broadcast_id, owner, lease_seconds):
+    """
+    Extend owner's lease on a running broadcast
+    Returns: True if still owned, False if cancelled or taken over, None on error
+    """
+    try:
+        result = await supabase.rpc('renew_broadcast_lease', {
+            'renew_id': broadcast_id,
+            'renew_owner': owner,
+            'lease_seconds': lease_seconds
+        }).execute()
+        return bool(result.data)
+    except Exception as e:
+        print(f"Error renewing broadcast lease: {e}")
+        return None
+
+@safe_async_call
+async def release_broadcast(broadcast_id, owner):
+    """Give up owner's lease so another process can resume the broadcast right away"""
+    try:
+        await supabase.table('broadcasts').update({
+            'lease_until': None,
+            'updated_at': datetime.now().isoformat()
+        }).eq('id', broadcast_id).eq('owner', owner).execute()
+        return True
+    except Exception as e:
+        print(f"Error releasing broadcast: {e}")
+        return False
+
+@safe_async_call
+async def update_broadcast(broadcast_id, **fields):
+    """Update status, counters or next_cursor of a broadcast"""
+    try:
+        fields['updated_at'] = datetime.now().isoformat()
+        await supabase.table('broadcasts').update(fields).eq('id', broadcast_id).execute()
+        return True
+    except Exception as e:
+        print(f"Error updating broadcast: {e}")
+        return False
+
+@safe_async_call
+async def save_broadcast_deliveries(rows):
+    """Record one page of outcomes: rows of {'broadcast_id', 'user_id', 'status', 'error'}"""
+    if not rows:
+        return True
+    try:
+        await supabase.table('broadcast_deliveries').upsert(rows).execute()
+        return True
+    except Exception as e:
+        print(f"Error saving broadcast deliveries: {e}")
+        return False
+
+@safe_async_call
+async def get_delivered_user_ids(broadcast_id, user_ids):
+    """Which of user_ids already have an outcome for this broadcast (set), or None if the read failed"""
+    try:
+        result = await supabase.table('broadcast_deliveries').select('user_id').eq('broadcast_id', broadcast_id).in_('user_id', list(user_ids)).execute()
+        return {row['user_id'] for row in result.data}
+    except Exception as e:
+        print(f"Error getting broadcast deliveries: {e}")
+        return None
+
+@safe_async_call
+async def finish_broadcast(broadcast_id, owner):
+    """
+    Mark owner's running broadcast done (a cancel that got in first is kept)
+    Returns: True if marked done, False if it is no longer running or owned, None on error
+    """
+    try:
+        now = datetime.now().isoformat()
+        result = await supabase.table('broadcasts').update({
+            'status': 'done',
+            'finished_at': now,
+            'updated_at': now
+        }).eq('id', broadcast_id).eq('status', 'running').eq('owner', owner).execute()
+        return bool(result.data)
+    except Exception as e:
+        print(f"Error finishing broadcast: {e}")
+        return None
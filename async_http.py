@@ -0,0 +1,167 @@
+"""
+Minimal asyncio HTTP server
+Just enough HTTP/1.1 for small JSON services (health checks, job status,
+webhooks) that need to run inside an existing event loop without a WSGI
+worker per request.
+"""
+import json
+import logging
+import asyncio
+from urllib.parse import urlsplit, parse_qs
+
+logger = logging.getLogger(__name__)
+
+# Largest request body accepted (bytes)
+MAX_BODY_SIZE = 1024 * 1024
+
+REASONS = {
+    200: 'OK', 202: 'Accepted', 400: 'Bad Request', 401: 'Unauthorized',
+    403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'
+}
+
+class Request:
+    """Parsed HTTP request"""
+
+    def __init__(self, method, target, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+        self.params = {}
+
+    def json(self):
+        """Decoded JSON body (None if empty or invalid)"""
+        try:
+            return json.loads(self.body) if self.body else None
+        except ValueError:
+            return None
+
+class Response:
+    """HTTP response"""
+
+    def __init__(self, body=b'', status=200, content_type='text/plain'):
+        self.body = body.encode() if isinstance(body, str) else body
+        self.status = status
+        self.content_type = content_type
+
+    def encode(self):
+        head = (
+            f"HTTP/1.1 {self.status} {REASONS.get(self.status, 'OK')}\r\n"
+            f"Content-Type: {self.content_type}\r\n"
+            f"Content-Length: {len(self.body)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        return head.encode() + self.body
+
+def json_response(data, status=200):
+    """Response with a JSON body"""
+    return Response(json.dumps(data, default=str), status, 'application/json')
+
+class HTTPServer:
+    """
+    Route table plus an asyncio server.
+
+    Routes are registered with @server.route('GET', '/jobs/<job_id>');
+    <name> segments are passed in request.params. Handlers are coroutines
+    taking the Request and returning a Response.
+    """
+
+    def __init__(self):
+        self._routes = []
+        self._server = None
+
+    def route(self, method, path):
+        def decorator(handler):
+            self._routes.append((method.upper(), path.strip('/').split('/'), handler))
+            return handler
+        return decorator
+
+    def _match(self, request):
+        segments = request.path.strip('/').split('/')
+        allowed = False
+        for method, pattern, handler in self._routes:
+            if len(pattern) != len(segments):
+                continue
+            params = {}
+            for expected, actual in zip(pattern, segments):
+                if expected.startswith('<') and expected.endswith('>'):
+                    params[expected[1:-1]] = actual
+                elif expected != actual:
+                    break
+            else:
+                if method != request.method:
+                    allowed = True
+                    continue
+                request.params = params
+                return handler, False
+        return None, allowed
+
+    async def start(self, host='0.0.0.0', port=8000):
+        """Start listening (returns once the socket is bound)"""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        logger.info(f"🚀 HTTP server listening on port {port}")
+        return self._server
+
+    async def serve_forever(self, host='0.0.0.0', port=8000):
+        """Start listening and serve until cancelled"""
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        if not request_line:
+            return None
+        method, target, _version = request_line.split(' ', 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY_SIZE:
+            raise OverflowError(length)
+        body = await reader.readexactly(length) if length else b''
+        return Request(method.upper(), target, headers, body)
+
+    async def _handle(self, reader, writer):
+        try:
+            try:
+                request = await self._read_request(reader)
+            except OverflowError:
+                request, response = None, Response('Payload Too Large', 413)
+            except (ValueError, asyncio.IncompleteReadError):
+                request, response = None, Response('Bad Request', 400)
+            else:
+                if request is None:
+                    return
+                handler, allowed = self._match(request)
+                if handler is None:
+                    response = Response('Method Not Allowed', 405) if allowed else Response('Not Found', 404)
+                else:
+                    try:
+                        response = await handler(request)
+                    except Exception as e:
+                        logger.error(f"❌ Error handling {request.method} {request.path}: {e}", exc_info=True)
+                        response = json_response({'success': False, 'error': str(e)}, 500)
+            writer.write(response.encode())
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"HTTP connection error: {e}")
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
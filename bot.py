@@ -1,7 +1,7 @@
 import logging
 import re
 import uuid
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton
 from telegram.ext import (
     ApplicationBuilder,
     ContextTypes,
@@ -11,15 +11,26 @@ from telegram.ext import (
     filters,
     ChatMemberHandler
 )
-from config import BOT_TOKEN, ADMIN_USER_IDS, ADMIN_USERNAMES
+from config import BOT_TOKEN, ADMIN_USER_IDS, ADMIN_USERNAMES, ADMIN_USER_ID, ADMIN_PANEL_URL, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET
 import messages
-import database
+import async_database as database
 import validators
 import asyncio
 import os
+import hmac
+import signal
 from bot_error_wrapper import handle_errors, safe_call
 from create_command import create_command
 import telegram_group_manager
+import group_pool
+import group_queue
+import media_delivery
+import render_cache
+import outbound
+import broadcast
+from update_processor import PerChatUpdateProcessor
+from async_http import HTTPServer, Response
+from callback_router import router
 
 # Logging setup
 logging.basicConfig(
@@ -32,31 +43,33 @@ logger = logging.getLogger(__name__)
 # UTILITY FUNCTIONS
 # =================
 
+# Health checks, plus Telegram updates in webhook mode, on PORT
+http_server = HTTPServer()
+
+@http_server.route('GET', '/')
+@http_server.route('GET', '/health')
+async def health(request):
+    return Response('OK')
+
+def register_webhook_route(application):
+    """Accept Telegram updates on WEBHOOK_PATH and queue them for the application"""
+    @http_server.route('POST', WEBHOOK_PATH)
+    async def telegram_webhook(request):
+        token = request.headers.get('x-telegram-bot-api-secret-token', '')
+        if not hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+            return Response('Forbidden', 403)
+        data = request.json()
+        if not isinstance(data, dict):
+            return Response('Bad Request', 400)
+        # Acknowledge right away; the update processor handles it in the background
+        await application.update_queue.put(Update.de_json(data, application.bot))
+        return Response('OK')
+
 async def health_check_server():
-    """Lightweight HTTP server for Koyeb health checks"""
+    """Serve http_server on PORT (Koyeb health checks and, in webhook mode, updates)"""
     port = int(os.environ.get("PORT", 8000))
-    
-    async def handle_health(reader, writer):
-        # Read the request just to clear it
-        try:
-            await reader.read(1024)
-            response = "HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 2\r\nConnection: close\r\n\r\nOK"
-            writer.write(response.encode())
-            await writer.drain()
-        except:
-            pass
-        finally:
-            writer.close()
-            try:
-                await writer.wait_closed()
-            except:
-                pass
-
     try:
-        server = await asyncio.start_server(handle_health, '0.0.0.0', port)
-        logger.info(f"🚀 Health check server listening on port {port}")
-        async with server:
-            await server.serve_forever()
+        await http_server.serve_forever(host='0.0.0.0', port=port)
     except Exception as e:
         logger.error(f"❌ Could not start health check server: {e}")
 
@@ -64,6 +77,15 @@ from telegram import BotCommand
 
 async def post_init(application):
     """Start tasks after bot initialization"""
+    # Warm up database caches (runs before polling starts accepting updates)
+    await database.init_db()
+    database.start_stats_flusher()
+    database.user_tracking_queue.start()
+    group_pool.pool.start(application.bot.username)
+    group_queue.queue.start()
+    outbound.scheduler.start()
+    broadcast.runner.start(application.bot)
+    
     asyncio.create_task(health_check_server())
     logger.info("✅ Health check task scheduled")
     
@@ -84,15 +106,21 @@ async def post_init(application):
     await application.bot.set_my_commands(commands)
     logger.info(f"✅ Set {len(commands)} bot commands")
 
+async def post_shutdown(application):
+    """Release resources after the bot stops"""
+    await database.stop_stats_flusher()
+    await database.user_tracking_queue.stop()
+    await group_queue.queue.stop()
+    await broadcast.runner.stop()
+    await outbound.scheduler.stop()
+    await group_pool.pool.stop()
+    await telegram_group_manager.admin_client.close()
+    await database.close()
+    logger.info("✅ Database connections closed")
+
 def get_group_keyboard():
-    """Get inline keyboard for group messages"""
-    keyboard = [
-        [InlineKeyboardButton(messages.BTN_WHAT_IS_ESCROW, callback_data='what_is_escrow')],
-        [InlineKeyboardButton(messages.BTN_INSTRUCTIONS, callback_data='instructions')],
-        [InlineKeyboardButton(messages.BTN_TERMS, callback_data='terms')],
-        [InlineKeyboardButton(messages.BTN_VIDEO_TUTORIAL, callback_data='video')]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    """Get inline keyboard for group messages (built once, see GROUP_KEYBOARD)"""
+    return GROUP_KEYBOARD
 
 # ====================
 # COMMAND HANDLERS
@@ -102,27 +130,20 @@ def get_group_keyboard():
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command"""
     try:
-        import os
-        
         # If in group, send group welcome
         if update.effective_chat.type in ['group', 'supergroup']:
-            stats = database.get_statistics()
-            welcome_text = messages.GROUP_WELCOME_TEXT.format(
-                total_deals=stats.get('total_deals', 5542),
-                disputes_resolved=stats.get('disputes_resolved', 158)
-            )
+            welcome_text = await render_cache.group_welcome_text()
             keyboard = get_group_keyboard()
             
-            if os.path.exists("video.mp4"):
-                with open("video.mp4", "rb") as video:
-                    await update.message.reply_video(
-                        video=video,
-                        caption=welcome_text,
-                        reply_markup=keyboard,
-                        parse_mode='HTML'
-                    )
-            else:
-                await update.message.reply_text(
+            sent = await media_delivery.send_video(
+                outbound.scheduled(update.message.reply_video, update.message.chat_id),
+                caption=welcome_text,
+                reply_markup=keyboard,
+                parse_mode='HTML'
+            )
+            if not sent:
+                await outbound.reply(
+                    update.message,
                     welcome_text,
                     reply_markup=keyboard,
                     parse_mode='HTML'
@@ -134,51 +155,34 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = user.id
         
         # Track user in database (Sync with Admin Panel)
-        database.track_user(
+        await database.track_user(
             user_id=user_id,
             username=user.username,
             first_name=user.first_name,
             last_name=user.last_name
         )
         
-        keyboard = [
-            [InlineKeyboardButton(messages.BTN_WHAT_IS_ESCROW, callback_data='what_is_escrow')],
-            [InlineKeyboardButton(messages.BTN_INSTRUCTIONS, callback_data='instructions')],
-            [InlineKeyboardButton(messages.BTN_TERMS, callback_data='terms')],
-            [InlineKeyboardButton(messages.BTN_CREATE_GROUP, callback_data='create_group')]
-        ]
+        # Admin Panel button for admin only (Telegram Web App)
+        reply_markup = PRIVATE_ADMIN_KEYBOARD if user_id == ADMIN_USER_ID else PRIVATE_KEYBOARD
         
-        # Add Admin Panel button for admin only (Telegram Web App)
-        try:
-            from config import ADMIN_USER_ID, ADMIN_PANEL_URL
-            if ADMIN_USER_ID > 0 and user_id == ADMIN_USER_ID:
-                keyboard.insert(0, [InlineKeyboardButton(
-                    "🛡️ Admin Panel", 
-                    web_app={'url': ADMIN_PANEL_URL}
-                )])
-        except (ImportError, AttributeError):
-            # Admin config not available, skip admin button
-            pass
-        
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        if os.path.exists("video.mp4"):
-            await update.message.reply_video(
-                video=open("video.mp4", "rb"),
-                caption=f"<b>{messages.WELCOME_TEXT}</b>",
-                reply_markup=reply_markup,
-                parse_mode='HTML'
-            )
-        else:
-            await update.message.reply_text(
-                f"<b>{messages.WELCOME_TEXT}</b>",
+        sent = await media_delivery.send_video(
+            outbound.scheduled(update.message.reply_video, update.message.chat_id),
+            caption=render_cache.WELCOME_HTML,
+            reply_markup=reply_markup,
+            parse_mode='HTML'
+        )
+        if not sent:
+            await outbound.reply(
+                update.message,
+                render_cache.WELCOME_HTML,
                 reply_markup=reply_markup,
                 parse_mode='HTML'
             )
     except Exception as e:
         logger.error(f"Error in start command: {e}")
         try:
-            await update.message.reply_text(
+            await outbound.reply(
+                update.message,
                 "⚠️ Welcome! The bot is experiencing technical issues. Please try again later.",
                 parse_mode='HTML'
             )
@@ -190,32 +194,17 @@ async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /menu command - show keyboard in groups"""
     if update.effective_chat.type in ['group', 'supergroup']:
         # Group menu with action buttons (from screenshot)
-        keyboard = [
-            [InlineKeyboardButton(messages.BTN_INSTRUCTIONS, callback_data='instructions')],
-            [
-                InlineKeyboardButton(messages.BTN_PAY_SELLER, callback_data='pay_seller'),
-                InlineKeyboardButton(messages.BTN_REFUND_BUYER, callback_data='refund_buyer')
-            ],
-            [InlineKeyboardButton(messages.BTN_RESET_ROLES, callback_data='reset_roles')],
-            [
-                InlineKeyboardButton(messages.BTN_BALANCE, callback_data='balance'),
-                InlineKeyboardButton(messages.BTN_BLOCKCHAIN, callback_data='blockchain')
-            ],
-            [
-                InlineKeyboardButton(messages.BTN_GET_QR, callback_data='get_qr'),
-                InlineKeyboardButton(messages.BTN_CONTACT, callback_data='contact')
-            ],
-            [InlineKeyboardButton(messages.BTN_LEADERBOARD, callback_data='leaderboard')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = GROUP_MENU_KEYBOARD
         
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "📋 <b>Navigate menu using the buttons below:</b>",
             reply_markup=reply_markup,
             parse_mode='HTML'
         )
     else:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "<b>This command is for use in escrow groups only.</b>",
             parse_mode='HTML'
         )
@@ -245,7 +234,8 @@ def get_explorer_link(network, address):
 async def seller_address_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /seller ADDRESS command"""
     if not context.args:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "<b>Usage: /seller <WALLET_ADDRESS></b>",
             parse_mode='HTML'
         )
@@ -255,7 +245,8 @@ async def seller_address_command(update: Update, context: ContextTypes.DEFAULT_T
     is_valid, coin_type = validators.validate_crypto_address(address)
     
     if not is_valid:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             messages.INVALID_ADDRESS_MESSAGE,
             parse_mode='HTML'
         )
@@ -266,7 +257,7 @@ async def seller_address_command(update: Update, context: ContextTypes.DEFAULT_T
     # If in group, update deal
     if update.effective_chat.type in ['group', 'supergroup']:
         group_id = update.effective_chat.id
-        deal = database.get_deal_by_group(group_id)
+        deal = await database.get_deal_by_group(group_id)
         
         if deal:
             deal_id = deal[0]
@@ -275,13 +266,14 @@ async def seller_address_command(update: Update, context: ContextTypes.DEFAULT_T
             
             # PREVENT SELF-DEALING: Check if user is already Buyer
             if existing_buyer_id and str(existing_buyer_id) == str(user.id):
-                 await update.message.reply_text(
+                 await outbound.reply(
+                    update.message,
                     "❌ <b>You cannot be both Seller and Buyer!</b>",
                     parse_mode='HTML'
                 )
                  return
 
-            database.update_deal_address(deal_id, 'seller', address, user_id=user.id)
+            await database.update_deal_address(deal_id, 'seller', address, user_id=user.id)
             
             # Role Declaration Message
             msg = (
@@ -299,19 +291,21 @@ async def seller_address_command(update: Update, context: ContextTypes.DEFAULT_T
                     f"💡 <i>Replace ADDRESS with your {coin_type} wallet address.</i>"
                 )
             
-            await update.message.reply_text(msg, parse_mode='HTML')
+            await outbound.reply(update.message, msg, parse_mode='HTML')
             
             # Check if both ready
             await check_and_send_transaction_info(update, context, group_id)
         else:
-            await update.message.reply_text(
+            await outbound.reply(
+                update.message,
                 "<b>No active deal found in this group.</b>",
                 parse_mode='HTML'
             )
     else:
         # Store globally
-        database.set_user_role(user.id, "seller", address)
-        await update.message.reply_text(
+        await database.set_user_role(user.id, "seller", address)
+        await outbound.reply(
+            update.message,
             f"✅ <b>Registered as SELLER with address: <code>{address}</code> ({coin_type})</b>",
             parse_mode='HTML'
         )
@@ -320,7 +314,8 @@ async def seller_address_command(update: Update, context: ContextTypes.DEFAULT_T
 async def buyer_address_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /buyer ADDRESS command"""
     if not context.args:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "<b>Usage: /buyer <WALLET_ADDRESS></b>",
             parse_mode='HTML'
         )
@@ -330,7 +325,8 @@ async def buyer_address_command(update: Update, context: ContextTypes.DEFAULT_TY
     is_valid, coin_type = validators.validate_crypto_address(address)
     
     if not is_valid:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             messages.INVALID_ADDRESS_MESSAGE,
             parse_mode='HTML'
         )
@@ -341,7 +337,7 @@ async def buyer_address_command(update: Update, context: ContextTypes.DEFAULT_TY
     # If in group, update deal
     if update.effective_chat.type in ['group', 'supergroup']:
         group_id = update.effective_chat.id
-        deal = database.get_deal_by_group(group_id)
+        deal = await database.get_deal_by_group(group_id)
         
         if deal:
             deal_id = deal[0]
@@ -350,13 +346,14 @@ async def buyer_address_command(update: Update, context: ContextTypes.DEFAULT_TY
             
             # PREVENT SELF-DEALING: Check if user is already Seller
             if existing_seller_id and str(existing_seller_id) == str(user.id):
-                 await update.message.reply_text(
+                 await outbound.reply(
+                    update.message,
                     "❌ <b>You cannot be both Buyer and Seller!</b>",
                     parse_mode='HTML'
                 )
                  return
             
-            database.update_deal_address(deal_id, 'buyer', address, user_id=user.id)
+            await database.update_deal_address(deal_id, 'buyer', address, user_id=user.id)
             
             # Role Declaration Message
             msg = (
@@ -374,77 +371,25 @@ async def buyer_address_command(update: Update, context: ContextTypes.DEFAULT_TY
                     f"💡 <i>Replace ADDRESS with your {coin_type} wallet address.</i>"
                 )
             
-            await update.message.reply_text(msg, parse_mode='HTML')
+            await outbound.reply(update.message, msg, parse_mode='HTML')
 
             # Check if both ready
             await check_and_send_transaction_info(update, context, group_id)
         else:
-            await update.message.reply_text(
+            await outbound.reply(
+                update.message,
                 "<b>No active deal found in this group.</b>",
                 parse_mode='HTML'
             )
     else:
         # Store globally
-        database.set_user_role(user.id, "buyer", address)
-        await update.message.reply_text(
+        await database.set_user_role(user.id, "buyer", address)
+        await outbound.reply(
+            update.message,
             f"✅ <b>Registered as BUYER with address: <code>{address}</code> ({coin_type})</b>",
             parse_mode='HTML'
         )
 
-# ... (Previous code) ...
-
-async def check_and_send_transaction_info(update, context, group_id):
-    """Check if both parties ready and send info"""
-    deal = database.get_deal_by_group(group_id)
-    if not deal:
-        return
-
-    # deal structure: (deal_id, buyer_id, seller_id, buyer_address, seller_address, bot_address, status)
-    
-    buyer_addr = deal[3]
-    seller_addr = deal[4]
-    
-    if buyer_addr and seller_addr:
-        # Both ready! Trigger Info.
-        
-        # 1. Detect Network from BUYER address
-        is_valid, network = validators.validate_crypto_address(buyer_addr)
-        if not network:
-            network = "Unknown"
-        
-        # 2. Fetch Bot Address
-        bot_wallet = database.get_config(f"wallet_{network}")
-        
-        if not bot_wallet:
-             bot_wallet = "NOT_SET_CONTACT_ADMIN"
-        
-        # Construct Message (Without Blockchain Link)
-        msg = (
-            "📍 <b>TRANSACTION INFORMATION</b>\n\n"
-            "⚡️ <b>SELLER</b>\n"
-            f"<a href='tg://user?id={deal[2]}'>Seller</a>\n"
-            f"[{deal[2]}]\n\n"
-            "⚡️ <b>BUYER</b>\n"
-            f"<a href='tg://user?id={deal[1]}'>Buyer</a>\n"
-            f"[{deal[1]}]\n\n"
-            "📝 <b>TRANSACTION ID</b>\n"
-            f"<code>{deal[0]}</code>\n\n"
-            "🟢 <b>ESCROW ADDRESS:</b>\n"
-            f"<code>{bot_wallet}</code> [{network}]\n\n"
-            "⚠️ <b>IMPORTANT: AVOID SCAMS!</b>\n\n"
-            "<b>Useful commands:</b>\n"
-            "🗒 <code>/pay_seller</code> = Always pays the seller.\n"
-            "🗒 <code>/refund_buyer</code> = Always refunds the buyer.\n\n"
-            "Remember, <code>/pay_seller</code> <i>won't refund your money</i> if you're the buyer, regardless of what <i>anyone</i> says."
-        )
-        
-        await context.bot.send_message(
-            chat_id=group_id,
-            text=msg,
-            parse_mode='HTML',
-            disable_web_page_preview=True
-        )
-
 @handle_errors
 async def set_escrow_address_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Set bot's escrow wallet for a specific network (Admin only)"""
@@ -453,7 +398,8 @@ async def set_escrow_address_command(update: Update, context: ContextTypes.DEFAU
         return
 
     if len(context.args) < 2:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "<b>Usage: /setescrow <NETWORK> <ADDRESS></b>\n"
             "Networks: BTC, LTC, BEP20, TRC20, TON",
             parse_mode='HTML'
@@ -490,9 +436,10 @@ async def set_escrow_address_command(update: Update, context: ContextTypes.DEFAU
     # Let's just use a dedicated key in 'config' table or 'crypto_addresses' with strict labels?
     # The user said "in admin panel configure...". 
     # I will use `database.set_config(f"wallet_{network_key}", address)` for simplicity and reliability.
-    database.set_config(f"wallet_{network_key}", address)
+    await database.set_config(f"wallet_{network_key}", address)
     
-    await update.message.reply_text(
+    await outbound.reply(
+        update.message,
         f"✅ <b>Escrow Address Set!</b>\n"
         f"Network: {network_key}\n"
         f"Address: <code>{address}</code>",
@@ -520,7 +467,7 @@ async def show_bot_escrow_addresses_command(update: Update, context: ContextType
     msg = "🔐 <b>Bot Escrow Addresses:</b>\n\n"
     
     for net in networks:
-        addr = database.get_config(f"wallet_{net}")
+        addr = await database.get_config(f"wallet_{net}")
         if not addr:
             addr = "❌ Not Set"
         else:
@@ -528,11 +475,52 @@ async def show_bot_escrow_addresses_command(update: Update, context: ContextType
         
         msg += f"🔹 <b>{net}:</b>\n{addr}\n\n"
     
-    await update.message.reply_text(msg, parse_mode='HTML')
+    await outbound.reply(update.message, msg, parse_mode='HTML')
+
+@handle_errors
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Queue a message to every bot user, or show the latest broadcast's progress (Admin only)"""
+    if update.effective_user.id not in ADMIN_USER_IDS:
+        return
+
+    # text_html keeps the admin's formatting; drop the /broadcast command itself
+    parts = update.message.text_html.split(None, 1)
+    if len(parts) > 1:
+        broadcast_id = await database.create_broadcast(parts[1].strip())
+        if broadcast_id is None:
+            await outbound.reply(update.message, messages.ERROR_BROADCAST_QUEUE, parse_mode='HTML')
+            return
+        broadcast.runner.wake()
+        await outbound.reply(
+            update.message,
+            messages.TEXT_BROADCAST_QUEUED.format(broadcast_id=broadcast_id),
+            parse_mode='HTML'
+        )
+        return
+
+    latest = await database.get_broadcasts(limit=1)
+    if not latest:
+        await outbound.reply(
+            update.message,
+            f"{messages.TEXT_BROADCAST_NONE}\n\n{messages.TEXT_BROADCAST_USAGE}",
+            parse_mode='HTML'
+        )
+        return
+    status = latest[0]
+    # The runner's counters are ahead of the row, which is written once per page
+    live = broadcast.runner.stats()
+    if live and live['id'] == status['id']:
+        status = {**status, **live}
+    done = status['sent'] + status['blocked'] + status['failed']
+    await outbound.reply(
+        update.message,
+        messages.TEXT_BROADCAST_STATUS.format(done=done, **status),
+        parse_mode='HTML'
+    )
 
 async def check_and_send_transaction_info(update, context, group_id):
     """Check if both parties ready and send info"""
-    deal = database.get_deal_by_group(group_id)
+    deal = await database.get_deal_by_group(group_id)
     if not deal:
         return
 
@@ -552,7 +540,7 @@ async def check_and_send_transaction_info(update, context, group_id):
         
         # 2. Fetch Bot Address
         # Use new database helper that checks crypto_addresses table (Admin Panel) FIRST
-        bot_wallet = database.get_bot_wallet_address(network)
+        bot_wallet = await database.get_bot_wallet_address(network)
         
         # Fallback if specific not found (e.g. USDT BEP20 not set)
         if not bot_wallet:
@@ -589,9 +577,11 @@ async def check_and_send_transaction_info(update, context, group_id):
             "Remember, <code>/pay_seller</code> <i>won't refund your money</i> if you're the buyer, regardless of what <i>anyone</i> says."
         )
         
-        await context.bot.send_message(
-            chat_id=group_id,
-            text=msg,
+        await outbound.scheduler.send_message(
+            context.bot,
+            group_id,
+            msg,
+            priority=outbound.PRIORITY_TRANSACTION,
             parse_mode='HTML',
             disable_web_page_preview=True
         )
@@ -609,17 +599,19 @@ async def check_and_send_transaction_info(update, context, group_id):
 async def show_addresses_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show all addresses in the escrow group"""
     if update.effective_chat.type not in ['group', 'supergroup']:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "<b>This command is for use in escrow groups only.</b>",
             parse_mode='HTML'
         )
         return
     
     group_id = update.effective_chat.id
-    deal = database.get_deal_by_group(group_id)
+    deal = await database.get_deal_by_group(group_id)
     
     if not deal:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "<b>No active deal found in this group.</b>",
             parse_mode='HTML'
         )
@@ -632,7 +624,7 @@ async def show_addresses_command(update: Update, context: ContextTypes.DEFAULT_T
     text += f"<b>Seller:</b> <code>{seller_addr if seller_addr else 'Not set'}</code>\n"
     text += f"<b>Bot (Escrow):</b> <code>{bot_addr if bot_addr else 'Not set'}</code>\n"
     
-    await update.message.reply_text(text, parse_mode='HTML')
+    await outbound.reply(update.message, text, parse_mode='HTML')
 
 @handle_errors
 async def set_crypto_address_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -640,15 +632,17 @@ async def set_crypto_address_command(update: Update, context: ContextTypes.DEFAU
     user_id = update.effective_user.id
     
     if user_id not in ADMIN_USER_IDS:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "<b>🚫 This command is admin-only.</b>",
             parse_mode='HTML'
         )
         return
     
     if not context.args:
-        current_addr = database.get_bot_crypto_address()
-        await update.message.reply_text(
+        current_addr = await database.get_bot_crypto_address()
+        await outbound.reply(
+            update.message,
             f"<b>Current bot crypto address:</b> <code>{current_addr if current_addr else 'Not set'}</code>\n\n"
             f"<b>Usage:</b> /setcryptoaddress <ADDRESS>",
             parse_mode='HTML'
@@ -659,14 +653,16 @@ async def set_crypto_address_command(update: Update, context: ContextTypes.DEFAU
     is_valid, coin_type = validators.validate_crypto_address(address)
     
     if not is_valid:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             messages.INVALID_ADDRESS_MESSAGE,
             parse_mode='HTML'
         )
         return
     
-    database.set_global_bot_crypto_address(address)
-    await update.message.reply_text(
+    await database.set_global_bot_crypto_address(address)
+    await outbound.reply(
+        update.message,
         f"✅ <b>Bot crypto address set to: <code>{address}</code> ({coin_type})</b>",
         parse_mode='HTML'
     )
@@ -682,14 +678,16 @@ async def create_escrow_group_command(update: Update, context: ContextTypes.DEFA
     # For now, usage: /creategroup <buyer_id> <seller_id>
     
     if update.effective_chat.type != 'private':
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "<b>This command should be used in private chat.</b>",
             parse_mode='HTML'
         )
         return
     
     if len(context.args) < 2:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "<b>Usage: /creategroup <buyer_id> <seller_id></b>",
             parse_mode='HTML'
         )
@@ -699,13 +697,15 @@ async def create_escrow_group_command(update: Update, context: ContextTypes.DEFA
         buyer_id = int(context.args[0])
         seller_id = int(context.args[1])
     except ValueError:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "<b>Invalid user IDs. Please provide numeric IDs.</b>",
             parse_mode='HTML'
         )
         return
     
-    await update.message.reply_text(
+    await outbound.reply(
+        update.message,
         "<b>Creating escrow group... Please wait.</b>",
         parse_mode='HTML'
     )
@@ -723,13 +723,14 @@ async def create_escrow_group_command(update: Update, context: ContextTypes.DEFA
         )
         
         # Store in database
-        database.create_deal(deal_id, buyer_id, seller_id, group_id)
+        await database.create_deal(deal_id, buyer_id, seller_id, group_id)
         
         
         # NOTE: Welcome message is now sent automatically by track_member_updates
         # when the bot joins the group. We don't need to send it here.
         
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             f"✅ <b>Escrow group created successfully!</b>\n"
             f"<b>Deal ID:</b> <code>{deal_id}</code>",
             parse_mode='HTML'
@@ -737,7 +738,8 @@ async def create_escrow_group_command(update: Update, context: ContextTypes.DEFA
         
     except Exception as e:
         logger.error(f"Error creating group: {e}")
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             f"<b>❌ Error creating group: {str(e)}</b>",
             parse_mode='HTML'
         )
@@ -752,14 +754,16 @@ async def join_deal_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     if user_id not in ADMIN_USER_IDS:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "<b>🚫 This command is admin-only.</b>",
             parse_mode='HTML'
         )
         return
     
     if not context.args:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "<b>Usage: /joindeal <deal_id></b>",
             parse_mode='HTML'
         )
@@ -769,11 +773,55 @@ async def join_deal_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # In a real implementation, you'd look up the group_id from the deal_id
     # For now, assuming you have the group_id
     
-    await update.message.reply_text(
+    await outbound.reply(
+        update.message,
         "<b>Joining deal group...</b>",
         parse_mode='HTML'
     )
 
+@handle_errors
+async def close_deal_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Admin only - close this group's deal and recycle the group for the next deal"""
+    user_id = update.effective_user.id
+    
+    if user_id not in ADMIN_USER_IDS:
+        await outbound.reply(
+            update.message,
+            "<b>🚫 This command is admin-only.</b>",
+            parse_mode='HTML'
+        )
+        return
+    
+    if update.effective_chat.type not in ['group', 'supergroup']:
+        await outbound.reply(update.message, "<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
+        return
+    
+    group_id = update.effective_chat.id
+    deal = await database.get_deal_by_group(group_id)
+    if not deal:
+        await outbound.reply(update.message, "<b>No deal found for this group.</b>", parse_mode='HTML')
+        return
+    
+    await database.close_deal(deal[0])
+    await outbound.reply(
+        update.message,
+        f"✅ <b>Deal #{deal[0]} closed.</b>\n\nThis group will now be reset for a new deal.",
+        parse_mode='HTML'
+    )
+    
+    # Members are removed and history cleared, then the group goes back to the pool
+    result = await group_pool.pool.recycle(group_id)
+    if result['success']:
+        await send_group_welcome(context.bot, group_id)
+        logger.info(f"♻️ Deal #{deal[0]} closed, group {group_id} recycled")
+    else:
+        logger.warning(f"⚠️ Deal #{deal[0]} closed, group {group_id} not recycled: {result.get('error')}")
+        await outbound.reply(
+            update.message,
+            f"⚠️ <b>Could not reset this group:</b> {result.get('error')}",
+            parse_mode='HTML'
+        )
+
 @handle_errors
 @handle_errors
 async def delete_service_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -802,6 +850,18 @@ async def delete_service_messages(update: Update, context: ContextTypes.DEFAULT_
         except Exception:
             pass
 
+async def send_group_welcome(bot, chat_id):
+    """Post the group welcome message with the escrow menu"""
+    welcome_text = await render_cache.group_welcome_text()
+    await outbound.scheduler.send_message(
+        bot,
+        chat_id,
+        welcome_text,
+        priority=outbound.PRIORITY_ANNOUNCEMENT,
+        reply_markup=get_group_keyboard(),
+        parse_mode='HTML'
+    )
+
 @handle_errors
 async def track_member_updates(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Track when members join the group - send admin announcement"""
@@ -813,19 +873,7 @@ async def track_member_updates(update: Update, context: ContextTypes.DEFAULT_TYP
             # Bot joined/added to a group
             logger.info("🤖 Bot joined a new group via MY_CHAT_MEMBER! Sending welcome message...")
             try:
-                stats = database.get_statistics()
-                welcome_text = messages.GROUP_WELCOME_TEXT.format(
-                    total_deals=stats.get('total_deals', 5542),
-                    disputes_resolved=stats.get('disputes_resolved', 158)
-                )
-                keyboard = get_group_keyboard()
-                
-                await context.bot.send_message(
-                    chat_id=update.effective_chat.id,
-                    text=welcome_text,
-                    reply_markup=keyboard,
-                    parse_mode='HTML'
-                )
+                await send_group_welcome(context.bot, update.effective_chat.id)
             except Exception as e:
                 logger.error(f"Error sending auto-welcome (my_chat_member): {e}")
             return
@@ -845,9 +893,11 @@ async def track_member_updates(update: Update, context: ContextTypes.DEFAULT_TYP
             # Check if ADMIN joined
             if user_id in ADMIN_USER_IDS:
                 # Send admin join announcement
-                await context.bot.send_message(
-                    chat_id=update.effective_chat.id,
-                    text=messages.ADMIN_JOIN_MESSAGE,
+                await outbound.scheduler.send_message(
+                    context.bot,
+                    update.effective_chat.id,
+                    messages.ADMIN_JOIN_MESSAGE,
+                    priority=outbound.PRIORITY_ANNOUNCEMENT,
                     parse_mode='HTML'
                 )
 
@@ -859,20 +909,20 @@ async def track_member_updates(update: Update, context: ContextTypes.DEFAULT_TYP
 async def contact_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /contact command - group only"""
     if update.effective_chat.type in ['group', 'supergroup']:
-        await update.message.reply_text(f"<b>{messages.TEXT_CONTACT_ADMIN}</b>", parse_mode='HTML')
+        await outbound.reply(update.effective_message, render_cache.CONTACT_ADMIN_HTML, parse_mode='HTML')
     else:
-        await update.message.reply_text(messages.GROUP_ONLY_COMMAND, parse_mode='HTML')
+        await outbound.reply(update.effective_message, messages.GROUP_ONLY_COMMAND, parse_mode='HTML')
 
 @handle_errors
 async def blockchain_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /blockchain command - group only"""
     if update.effective_chat.type in ['group', 'supergroup']:
         group_id = update.effective_chat.id
-        deal = database.get_deal_by_group(group_id)
+        deal = await database.get_deal_by_group(group_id)
         
         if deal:
             # Show ALL available addresses (as requested)
-            addresses = database.get_crypto_addresses()
+            addresses = await database.get_crypto_addresses()
             
             # Format addresses
             addr_text = ""
@@ -887,7 +937,8 @@ async def blockchain_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
                  # Fallback if DB empty (should not happen due to init_db)
                  addr_text = "No addresses configured."
 
-            await update.message.reply_text(
+            await outbound.reply(
+                update.message,
                 f"<b>OFFICIAL ESCROW ADDRESSES</b>\n"
                 f"{addr_text}\n"
                 "⚠️ <b>IMPORTANT: Always verify the address before sending!</b>",
@@ -895,76 +946,41 @@ async def blockchain_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 disable_web_page_preview=True
             )
         else:
-            await update.message.reply_text(
+            await outbound.reply(
+                update.message,
                 "<b>No active deal found. Escrow address not available.</b>",
                 parse_mode='HTML'
             )
     else:
-        await update.message.reply_text(messages.GROUP_ONLY_COMMAND, parse_mode='HTML')
-
-@handle_errors
-async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /balance command - group only"""
-    if update.effective_chat.type in ['group', 'supergroup']:
-        await update.message.reply_text(
-            "📊 <b>Current Balance:</b>\n\n"
-            "Escrow Balance: 0.00 USDT\n"
-            "Pending: 0.00 USDT",
-            parse_mode='HTML'
-        )
-    else:
-        await update.message.reply_text("<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
-
-@handle_errors
-async def pay_seller_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /pay_seller command - group only"""
-    if update.effective_chat.type in ['group', 'supergroup']:
-        await update.message.reply_text(
-            "💸 <b>Initiating payment to Seller...</b>\n\n"
-            "Admin will verify and process the payment.",
-            parse_mode='HTML'
-        )
-    else:
-        await update.message.reply_text("<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
-
-@handle_errors
-async def refund_buyer_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /refund_buyer command - group only"""
-    if update.effective_chat.type in ['group', 'supergroup']:
-        await update.message.reply_text(
-            "💸 <b>Initiating refund to Buyer...</b>\n\n"
-            "Admin will verify and process the refund.",
-            parse_mode='HTML'
-        )
-    else:
-        await update.message.reply_text("<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
+        await outbound.reply(update.message, messages.GROUP_ONLY_COMMAND, parse_mode='HTML')
 
 @handle_errors
 async def qr_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /qr command - group only"""
     if update.effective_chat.type in ['group', 'supergroup']:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.effective_message,
             "📱 <b>QR Code</b>\n\n"
             "QR code generation feature coming soon!",
             parse_mode='HTML'
         )
     else:
-        await update.message.reply_text("<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
+        await outbound.reply(update.effective_message, "<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
 
 @handle_errors
 async def leaderboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /leaderboard command - works everywhere"""
     try:
-        await update.message.reply_text(messages.LEADERBOARD_TEXT, parse_mode='HTML')
+        await outbound.reply(update.effective_message, messages.LEADERBOARD_TEXT, parse_mode='HTML')
     except Exception as e:
         logger.error(f"Error showing leaderboard: {e}")
-        await update.message.reply_text("<b>Error loading leaderboard. Please try again.</b>", parse_mode='HTML')
+        await outbound.reply(update.effective_message, "<b>Error loading leaderboard. Please try again.</b>", parse_mode='HTML')
 
 
 
 @handle_errors
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("<b>Type /start to see the main menu.</b>", parse_mode='HTML')
+    await outbound.reply(update.message, "<b>Type /start to see the main menu.</b>", parse_mode='HTML')
 
 @handle_errors
 async def userinfo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -979,19 +995,21 @@ async def userinfo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 <b>User ID:</b> <code>{user.id}</code>
 <b>Is Bot:</b> {'Yes' if user.is_bot else 'No'}"""
         
-        await update.message.reply_text(user_info, parse_mode='HTML')
+        await outbound.reply(update.message, user_info, parse_mode='HTML')
     
     # Check if username provided
     elif context.args and len(context.args) > 0:
         username = context.args[0].replace('@', '')
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             f"🔍 <b>Looking up user:</b> @{username}\n\n"
             f"<i>Note: Full user details are only available when replying to their message.</i>",
             parse_mode='HTML'
         )
     
     else:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "⚠️ <b>Use this command either with username or reply to a message!</b>",
             parse_mode='HTML'
         )
@@ -1000,14 +1018,15 @@ async def userinfo_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def real_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /real - verify if user is real admin"""
     if not update.message.reply_to_message:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "🚫 <b>This command must be used in reply to another message.</b>",
             parse_mode='HTML'
         )
         return
     
     user = update.message.reply_to_message.from_user
-    admin_username = database.get_config("admin_username") or "MiddleCryptoSupport"
+    admin_username = await database.get_config("admin_username") or "MiddleCryptoSupport"
     
     # Check if user is the real admin
     is_real_admin = (
@@ -1016,14 +1035,16 @@ async def real_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     
     if is_real_admin:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             f"✅ <b>Verified!</b>\n\n"
             f"@{user.username} is the <b>REAL</b> admin/support account.\n\n"
             f"🔐 <b>Official Support:</b> @{admin_username}",
             parse_mode='HTML'
         )
     else:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             f"⚠️ <b>Warning!</b>\n\n"
             f"@{user.username if user.username else user.full_name} is <b>NOT</b> the official admin.\n\n"
             f"🔐 <b>Real Support:</b> @{admin_username}",
@@ -1033,27 +1054,25 @@ async def real_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 @handle_errors
 async def whatisescrow_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(f"<b>{messages.TEXT_WHAT_IS_ESCROW}</b>", parse_mode='HTML')
+    await outbound.reply(update.effective_message, render_cache.WHAT_IS_ESCROW_HTML, parse_mode='HTML')
 
 @handle_errors
 async def video_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    import os
-    if os.path.exists("video.mp4"):
-        await update.message.reply_video(
-            video=open("video.mp4", "rb"),
-            caption=f"<b>{messages.TEXT_VIDEO_CAPTION}</b>",
-            parse_mode='HTML'
-        )
-    else:
-        await update.message.reply_text("<b>Video not found on server.</b>", parse_mode='HTML')
+    sent = await media_delivery.send_video(
+        outbound.scheduled(update.effective_message.reply_video, update.effective_message.chat_id),
+        caption=render_cache.VIDEO_CAPTION_HTML,
+        parse_mode='HTML'
+    )
+    if not sent:
+        await outbound.reply(update.effective_message, "<b>Video not found on server.</b>", parse_mode='HTML')
 
 @handle_errors
 async def terms_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(f"<b>{messages.TEXT_TERMS}</b>", parse_mode='HTML')
+    await outbound.reply(update.effective_message, render_cache.TERMS_HTML, parse_mode='HTML')
 
 @handle_errors
 async def instructions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(f"<b>{messages.TEXT_INSTRUCTIONS}</b>", parse_mode='HTML')
+    await outbound.reply(update.effective_message, render_cache.INSTRUCTIONS_HTML, parse_mode='HTML')
 
 @handle_errors
 async def setpin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1061,7 +1080,8 @@ async def setpin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     if not context.args:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "Usage: /setpin 6-digit-pin (example: /setpin 123456)",
             parse_mode='HTML'
         )
@@ -1071,7 +1091,8 @@ async def setpin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Validate PIN
     if len(pin) != 6 or not pin.isdigit():
-        await update.message.reply_text(
+        await outbound.reply(
+            update.message,
             "❌ <b>Invalid PIN!</b>\n\n"
             "Your PIN must be exactly 6 digits (0-9).\n\n"
             "<b>Example:</b> /setpin <code>123456</code>",
@@ -1080,9 +1101,10 @@ async def setpin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Store PIN in database
-    database.set_config(f"user_pin_{user_id}", pin)
+    await database.set_config(f"user_pin_{user_id}", pin)
     
-    await update.message.reply_text(
+    await outbound.reply(
+        update.message,
         "✅ Transaction PIN has been set successfully.",
         parse_mode='HTML'
     )
@@ -1091,30 +1113,32 @@ async def setpin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def pay_seller_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /pay_seller command"""
     if update.effective_chat.type in ['group', 'supergroup']:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.effective_message,
             "🚫 <b>NO BALANCE available in escrow address. Seller should NOT PROVIDE the buyer with product/service before balance is visible. Type /balance after 1 confirmation.</b>",
             parse_mode='HTML'
         )
     else:
-        await update.message.reply_text(messages.GROUP_ONLY_COMMAND, parse_mode='HTML')
+        await outbound.reply(update.effective_message, messages.GROUP_ONLY_COMMAND, parse_mode='HTML')
 
 @handle_errors
 async def refund_buyer_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /refund_buyer command"""
     if update.effective_chat.type in ['group', 'supergroup']:
-        await update.message.reply_text(
+        await outbound.reply(
+            update.effective_message,
             "🚫 <b>NO BALANCE available in escrow address. Seller should NOT PROVIDE the buyer with product/service before balance is visible. Type /balance after 1 confirmation.</b>",
             parse_mode='HTML'
         )
     else:
-        await update.message.reply_text(messages.GROUP_ONLY_COMMAND, parse_mode='HTML')
+        await outbound.reply(update.effective_message, messages.GROUP_ONLY_COMMAND, parse_mode='HTML')
 
 @handle_errors
 async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /balance command"""
     if update.effective_chat.type in ['group', 'supergroup']:
         group_id = update.effective_chat.id
-        deal = database.get_deal_by_group(group_id)
+        deal = await database.get_deal_by_group(group_id)
         
         # Default currency text
         currency_display = "0.0 USDT (TRC20) [$0.0]"
@@ -1134,7 +1158,8 @@ async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             elif network == "USDT (ERC20)":
                 currency_display = "0.0 USDT (ERC20) [$0.0]"
         
-        await update.message.reply_text(
+        await outbound.reply(
+            update.effective_message,
             "📍 <b>ESCROW WALLET</b>\n\n"
             "💬 Wait for the balance to show up here, then continue with the deal. The funds will show up after 1 blockchain confirmation.\n\n"
             f"💰 <b>BALANCE:</b> {currency_display}\n\n"
@@ -1142,206 +1167,165 @@ async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             parse_mode='HTML'
         )
     else:
-        await update.message.reply_text(messages.GROUP_ONLY_COMMAND, parse_mode='HTML')
+        await outbound.reply(update.effective_message, messages.GROUP_ONLY_COMMAND, parse_mode='HTML')
 # ====================
 # CALLBACK HANDLERS
 # ====================
 
+# Buttons reuse the matching command handlers where the behaviour is the same
+
+@handle_errors
+async def reset_roles_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Reset Roles button - group only"""
+    if update.effective_chat.type in ['group', 'supergroup']:
+        await outbound.reply(
+            update.effective_message,
+            "🔄 <b>Roles have been reset.</b>\n\n"
+            "Use /seller or /buyer to register again.",
+            parse_mode='HTML'
+        )
+    else:
+        await outbound.reply(update.effective_message, messages.GROUP_ONLY_COMMAND, parse_mode='HTML')
+
+@handle_errors
+async def blockchain_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Blockchain button - explorer link (/blockchain lists the escrow addresses)"""
+    if update.effective_chat.type in ['group', 'supergroup']:
+        await outbound.reply(
+            update.effective_message,
+            "🌐 <b>Blockchain Explorer</b>\n\n"
+            "View transaction on blockchain:\n"
+            "https://blockchain.info",
+            parse_mode='HTML'
+        )
+    else:
+        await outbound.reply(update.effective_message, messages.GROUP_ONLY_COMMAND, parse_mode='HTML')
+
 @handle_errors
-async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle inline button clicks"""
+async def create_group_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Create Escrow Group button - creates a group for the user"""
     query = update.callback_query
-    await query.answer()
-    
-    if query.data == 'what_is_escrow':
-        await query.message.reply_text(f"<b>{messages.TEXT_WHAT_IS_ESCROW}</b>", parse_mode='HTML')
-    elif query.data == 'instructions':
-        await query.message.reply_text(f"<b>{messages.TEXT_INSTRUCTIONS}</b>", parse_mode='HTML')
-    elif query.data == 'terms':
-        await query.message.reply_text(f"<b>{messages.TEXT_TERMS}</b>", parse_mode='HTML')
-    elif query.data == 'video':
-        import os
-        if os.path.exists("video.mp4"):
-            await query.message.reply_video(
-                video=open("video.mp4", "rb"),
-                caption=f"<b>{messages.TEXT_VIDEO_CAPTION}</b>",
-                parse_mode='HTML'
-            )
-        else:
-            await query.message.reply_text("<b>Video not found.</b>", parse_mode='HTML')
-    
-    
-    # Group menu button handlers - check if in group
-    elif query.data == 'pay_seller':
-        if query.message.chat.type in ['group', 'supergroup']:
-            await query.message.reply_text(
-                "� <b>NO BALANCE available in escrow address. Seller should NOT PROVIDE the buyer with product/service before balance is visible. Type /balance after 1 confirmation.</b>",
-                parse_mode='HTML'
-            )
-        else:
-            await query.message.reply_text("<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
-    
-    elif query.data == 'refund_buyer':
-        if query.message.chat.type in ['group', 'supergroup']:
-            await query.message.reply_text(
-                "� <b>NO BALANCE available in escrow address. Seller should NOT PROVIDE the buyer with product/service before balance is visible. Type /balance after 1 confirmation.</b>",
-                parse_mode='HTML'
-            )
-        else:
-            await query.message.reply_text("<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
-    
-    elif query.data == 'reset_roles':
-        if query.message.chat.type in ['group', 'supergroup']:
-            await query.message.reply_text(
-                "🔄 <b>Roles have been reset.</b>\n\n"
-                "Use /seller or /buyer to register again.",
-                parse_mode='HTML'
-            )
-        else:
-            await query.message.reply_text("<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
-    
-    elif query.data == 'balance':
-        if query.message.chat.type in ['group', 'supergroup']:
-            group_id = query.message.chat.id
-            deal = database.get_deal_by_group(group_id)
-            
-            # Default currency text
-            currency_display = "0.0 USDT (TRC20) [$0.0]"
-            
-            if deal:
-                # Determine relevant currency from deal (buyer address)
-                # deal[3] is buyer_address
-                buyer_addr = deal[3]
-                is_valid, network = validators.validate_crypto_address(buyer_addr)
-                
-                if network == "BTC":
-                    currency_display = "0.00000000 BTC [$0.0]"
-                elif network == "LTC":
-                    currency_display = "0.00000000 LTC [$0.0]"
-                elif network == "USDT (TRC20)":
-                    currency_display = "0.0 USDT (TRC20) [$0.0]"
-                elif network == "USDT (BEP20)":
-                    currency_display = "0.0 USDT (BEP20) [$0.0]"
-                elif network == "USDT (ERC20)":
-                    currency_display = "0.0 USDT (ERC20) [$0.0]"
-            
-            await query.message.reply_text(
-                "📍 <b>ESCROW WALLET</b>\n\n"
-                "💬 Wait for the balance to show up here, then continue with the deal. The funds will show up after 1 blockchain confirmation.\n\n"
-                f"💰 <b>BALANCE:</b> {currency_display}\n\n"
-                "💡 <b>Type /blockchain for escrow addresses</b>",
-                parse_mode='HTML'
-            )
-        else:
-            await query.message.reply_text("<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
-    
-    elif query.data == 'blockchain':
-        if query.message.chat.type in ['group', 'supergroup']:
-            await query.message.reply_text(
-                "🌐 <b>Blockchain Explorer</b>\n\n"
-                "View transaction on blockchain:\n"
-                "https://blockchain.info",
-                parse_mode='HTML'
-            )
-        else:
-            await query.message.reply_text("<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
-    
-    elif query.data == 'get_qr':
-        if query.message.chat.type in ['group', 'supergroup']:
-            await query.message.reply_text(
-                "📱 <b>QR Code</b>\n\n"
-                "QR code generation feature coming soon!",
-                parse_mode='HTML'
-            )
-        else:
-            await query.message.reply_text("<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
+    user_id = query.from_user.id
+    user_name = query.from_user.first_name or "User"
     
-    elif query.data == 'contact':
-        if query.message.chat.type in ['group', 'supergroup']:
-            await query.message.reply_text(f"<b>{messages.TEXT_CONTACT_ADMIN}</b>", parse_mode='HTML')
-        else:
-            await query.message.reply_text("<b>This command is for use in escrow groups only.</b>", parse_mode='HTML')
+    # Send "Creating..." message
+    creating_msg = await outbound.reply(
+        query.message,
+        "🏗️ <b>Creating Escrow Group. Please Wait...</b>",
+        parse_mode='HTML'
+    )
     
-    elif query.data == 'create_group':
-        # User clicked Create Escrow Group button
-        user_id = query.from_user.id
-        user_name = query.from_user.first_name or "User"
+    try:
+        import uuid
+        import requests
+        import string
+        import random
         
-        # Send "Creating..." message
-        creating_msg = await query.message.reply_text(
-            "🏗️ <b>Creating Escrow Group. Please Wait...</b>",
-            parse_mode='HTML'
-        )
+        # Generate a unique deal ID (Format: ABCDE-12345-FGHIJ)
+        def generate_segment(length=5, chars=string.ascii_uppercase + string.digits):
+            return ''.join(random.choices(chars, k=length))
         
-        try:
-            import uuid
-            import requests
-            import string
-            import random
-            
-            # Generate a unique deal ID (Format: ABCDE-12345-FGHIJ)
-            def generate_segment(length=5, chars=string.ascii_uppercase + string.digits):
-                return ''.join(random.choices(chars, k=length))
-            
-            deal_id = f"{generate_segment()}-{generate_segment()}-{generate_segment()}"
-            
-            # For demo/testing, we'll create a group with the user as both buyer and seller
-            buyer_id = user_id
-            seller_id = 0  # Use 0 for seller (to avoid constraint error if buyer==seller is not allowed)
-            bot_username = context.bot.username
-            
-            # Call Telethon microservice to create group
-            # Call Telethon directly to create group (No HTTP request needed)
+        deal_id = f"{generate_segment()}-{generate_segment()}-{generate_segment()}"
+        
+        # For demo/testing, we'll create a group with the user as both buyer and seller
+        buyer_id = user_id
+        seller_id = 0  # Use 0 for seller (to avoid constraint error if buyer==seller is not allowed)
+        bot_username = context.bot.username
+        
+        async def show_progress(text):
+            await creating_msg.edit_text(text, parse_mode='HTML')
+
+        async def finish(result):
             try:
-                result = await telegram_group_manager.create_escrow_group(
-                    deal_id=deal_id,
-                    bot_username=bot_username
-                )
+                if not result['success']:
+                    logger.error(f"Error creating group via button: {result.get('error')}")
+                    raise Exception(f"Failed to create group: {result.get('error', 'Unknown error')}")
+                group_id = result['group_id']
+                invite_link = result['invite_link']
+                
+                # Store in database
+                await database.create_deal(deal_id, buyer_id, seller_id, group_id)
                 
-                if result['success']:
-                    group_id = result['group_id']
-                    invite_link = result['invite_link']
-                else:
-                    raise Exception(result.get('error', 'Unknown error'))
-                    
+                # NOTE: Welcome message is now sent automatically by track_member_updates
+                # when the bot joins the group. We don't need to send it here.
+                
+                # Send success message with invite link
+                await creating_msg.edit_text(
+                    f"✅ <b>Created Escrow Group #{deal_id}</b>\n\n"
+                    f"<b>Group Link:</b> {invite_link}\n\n"
+                    f"Now Join this escrow group & Forward this message to buyer/seller.\n\n"
+                    f"Enjoy Safe Escrow 🤝",
+                    parse_mode='HTML'
+                )
             except Exception as e:
-                logger.error(f"Error creating group via button: {e}")
-                raise Exception(f"Failed to create group: {str(e)}")
-            
-            # Store in database
-            database.create_deal(deal_id, buyer_id, seller_id, group_id)
-            
-            # NOTE: Welcome message is now sent automatically by track_member_updates
-            # when the bot joins the group. We don't need to send it here.
-            
-            # Send success message with invite link
-            
-            # Send success message with invite link
-            await creating_msg.edit_text(
-                f"✅ <b>Created Escrow Group #{deal_id}</b>\n\n"
-                f"<b>Group Link:</b> {invite_link}\n\n"
-                f"Now Join this escrow group & Forward this message to buyer/seller.\n\n"
-                f"Enjoy Safe Escrow 🤝",
-                parse_mode='HTML'
-            )
-            
-        except Exception as e:
-            logger.error(f"Error creating group from button: {e}")
-            import traceback
-            traceback.print_exc()
-            await creating_msg.edit_text(
-                f"❌ <b>Error creating group:</b> {str(e)}\n\n"
-                f"Please try again or contact support.",
-                parse_mode='HTML'
-            )
-    
-    elif query.data == 'leaderboard':
-        # Leaderboard works in both private and group
-        try:
-            await query.message.reply_text(messages.LEADERBOARD_TEXT, parse_mode='HTML')
-        except Exception as e:
-            logger.error(f"Error showing leaderboard: {e}")
-            await query.message.reply_text("<b>Error loading leaderboard. Please try again.</b>", parse_mode='HTML')
+                logger.error(f"Error creating group from button: {e}")
+                await creating_msg.edit_text(
+                    f"❌ <b>Error creating group:</b> {str(e)}\n\n"
+                    f"Please try again or contact support.",
+                    parse_mode='HTML'
+                )
+        
+        # Call Telethon directly to create group (queued with other requests).
+        # The handler returns now; finish() reports once the group is ready.
+        group_queue.queue.submit_detached(
+            deal_id=deal_id,
+            bot_username=bot_username,
+            progress=show_progress,
+            on_result=finish
+        )
+        
+    except Exception as e:
+        logger.error(f"Error creating group from button: {e}")
+        import traceback
+        traceback.print_exc()
+        await creating_msg.edit_text(
+            f"❌ <b>Error creating group:</b> {str(e)}\n\n"
+            f"Please try again or contact support.",
+            parse_mode='HTML'
+        )
+
+router.register('what_is_escrow', whatisescrow_command)
+router.register('instructions', instructions_command)
+router.register('terms', terms_command)
+router.register('video', video_command)
+router.register('pay_seller', pay_seller_command)
+router.register('refund_buyer', refund_buyer_command)
+router.register('reset_roles', reset_roles_button)
+router.register('balance', balance_command)
+router.register('blockchain', blockchain_button)
+router.register('get_qr', qr_command)
+router.register('contact', contact_command)
+router.register('create_group', create_group_button)
+router.register('leaderboard', leaderboard_command)
+
+# Keyboards are built once; every message reuses the same markup objects
+GROUP_KEYBOARD = router.keyboard([
+    [(messages.BTN_WHAT_IS_ESCROW, 'what_is_escrow')],
+    [(messages.BTN_INSTRUCTIONS, 'instructions')],
+    [(messages.BTN_TERMS, 'terms')],
+    [(messages.BTN_VIDEO_TUTORIAL, 'video')]
+])
+
+PRIVATE_KEYBOARD_ROWS = [
+    [(messages.BTN_WHAT_IS_ESCROW, 'what_is_escrow')],
+    [(messages.BTN_INSTRUCTIONS, 'instructions')],
+    [(messages.BTN_TERMS, 'terms')],
+    [(messages.BTN_CREATE_GROUP, 'create_group')]
+]
+PRIVATE_KEYBOARD = router.keyboard(PRIVATE_KEYBOARD_ROWS)
+# Admin Panel button (Telegram Web App) on top for the admin
+PRIVATE_ADMIN_KEYBOARD = router.keyboard(
+    [[InlineKeyboardButton("🛡️ Admin Panel", web_app={'url': ADMIN_PANEL_URL})]] + PRIVATE_KEYBOARD_ROWS
+) if ADMIN_USER_ID > 0 else PRIVATE_KEYBOARD
+
+GROUP_MENU_KEYBOARD = router.keyboard([
+    [(messages.BTN_INSTRUCTIONS, 'instructions')],
+    [(messages.BTN_PAY_SELLER, 'pay_seller'), (messages.BTN_REFUND_BUYER, 'refund_buyer')],
+    [(messages.BTN_RESET_ROLES, 'reset_roles')],
+    [(messages.BTN_BALANCE, 'balance'), (messages.BTN_BLOCKCHAIN, 'blockchain')],
+    [(messages.BTN_GET_QR, 'get_qr'), (messages.BTN_CONTACT, 'contact')],
+    [(messages.BTN_LEADERBOARD, 'leaderboard')]
+])
 
 
 # ====================
@@ -1350,11 +1334,16 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 def main():
     """Start the bot"""
-    # Initialize database
-    database.init_db()
-    
-    # Create application
-    app = ApplicationBuilder().token(BOT_TOKEN).post_init(post_init).build()
+    # Create application (database is initialized in post_init, inside the bot's event loop)
+    # Updates run concurrently; each chat's updates stay in order
+    app = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PerChatUpdateProcessor())
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Add handlers
     app.add_handler(CommandHandler("start", start))
@@ -1371,11 +1360,13 @@ def main():
     # ADMIN: Set Bot Escrow Wallet
     app.add_handler(CommandHandler("setescrow", set_escrow_address_command))
     app.add_handler(CommandHandler("showescrow", show_bot_escrow_addresses_command))
+    app.add_handler(CommandHandler("broadcast", broadcast_command))
     
     # Group creation
     app.add_handler(CommandHandler("create", create_command))  # NEW: Simple /create command
     app.add_handler(CommandHandler("creategroup", create_escrow_group_command))
     app.add_handler(CommandHandler("joindeal", join_deal_command))
+    app.add_handler(CommandHandler("closedeal", close_deal_command))
     
     # Other commands
     app.add_handler(CommandHandler("whatisescrow", whatisescrow_command))
@@ -1402,7 +1393,7 @@ def main():
     app.add_handler(CommandHandler("qr", qr_command))
     
     # Callback query handler
-    app.add_handler(CallbackQueryHandler(button_callback))
+    app.add_handler(CallbackQueryHandler(router.dispatch))
     
     # Chat member updates (for admin join detection)
     app.add_handler(ChatMemberHandler(track_member_updates, ChatMemberHandler.CHAT_MEMBER))
@@ -1412,9 +1403,15 @@ def main():
     app.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS | filters.StatusUpdate.LEFT_CHAT_MEMBER, delete_service_messages))
     
     # Start bot
-    # Start bot with conflict handling
     logger.info("Bot started! (Version: Auto-Group-Creation)")
     
+    if WEBHOOK_URL:
+        # Webhook mode: no single-poller Conflict; several replicas need chat-affinity routing (config.py)
+        register_webhook_route(app)
+        asyncio.run(run_webhook(app))
+        return
+    
+    # Polling mode, with conflict handling
     import time
     from telegram.error import Conflict
     
@@ -1436,5 +1433,35 @@ def main():
             time.sleep(5)
             raise e
 
+async def run_webhook(app):
+    """Run the application fed by the webhook route until SIGINT/SIGTERM"""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    await app.initialize()
+    try:
+        # post_init also starts the HTTP server that receives the updates
+        await post_init(app)
+        await app.start()
+        # Keep updates queued during a deploy; every replica registers the same URL
+        await app.bot.set_webhook(
+            url=f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"✅ Webhook set: {WEBHOOK_URL}{WEBHOOK_PATH}")
+        await stop.wait()
+    finally:
+        await http_server.stop()
+        if app.running:
+            await app.stop()
+        await app.shutdown()
+        await post_shutdown(app)
+
 if __name__ == '__main__':
     main()
@@ -6,6 +6,7 @@ import logging
 from functools import wraps
 from telegram import Update
 from telegram.ext import ContextTypes
+import outbound
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +21,8 @@ def handle_errors(func):
             try:
                 # Try to send error message to user
                 if update.message:
-                    await update.message.reply_text(
+                    await outbound.reply(
+                        update.message,
                         "⚠️ An error occurred. Please try again later.",
                         parse_mode='HTML'
                     )
@@ -44,3 +46,14 @@ def safe_call(func):
             logger.error(f"Error in {func.__name__}: {e}", exc_info=True)
             return None
     return wrapper
+
+def safe_async_call(func):
+    """Decorator for async non-handler functions (async counterpart of safe_call)"""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Error in {func.__name__}: {e}", exc_info=True)
+            return None
+    return wrapper
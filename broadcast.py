@@ -0,0 +1,259 @@
+"""
+Broadcasts
+Sends admin broadcasts (queued in the broadcasts table by the admin panel
+or /broadcast) to every bot user. Users are read in keyset pages, and the
+next page is queued on the outbound scheduler while the previous one is
+still going out, so delivery runs at the scheduler's global rate for the
+whole broadcast. Each page's outcomes and the cursor after it are saved
+before moving on: progress is visible while it runs, and a restart
+resumes from the last saved page.
+
+With several replicas, each broadcast is claimed by one process at a
+time: the claim is a lease the owner keeps renewing, so a broadcast
+whose owner crashed is taken over once the lease runs out.
+"""
+import os
+import uuid
+import socket
+import asyncio
+import logging
+import functools
+from datetime import datetime
+from telegram.error import Forbidden
+import async_database as database
+import outbound
+
+logger = logging.getLogger(__name__)
+
+# Users read and queued per page
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "500"))
+# Seconds between checks for broadcasts queued from the admin panel
+BROADCAST_POLL_INTERVAL = float(os.getenv("BROADCAST_POLL_INTERVAL", "30"))
+# Seconds a claimed broadcast stays with its process without a renewal
+BROADCAST_LEASE = int(os.getenv("BROADCAST_LEASE", "120"))
+
+# Failed reads are retried this many times, 1s, 2s, 4s... apart, before the
+# broadcast is set aside ('running', resumed on the next poll)
+READ_RETRIES = 5
+
+class BroadcastRunner:
+    """Sends queued broadcasts one at a time, oldest first"""
+
+    def __init__(self, page_size=BROADCAST_PAGE_SIZE, poll_interval=BROADCAST_POLL_INTERVAL,
+                 lease_seconds=BROADCAST_LEASE):
+        self.page_size = page_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        # Identifies this process as the owner of the broadcasts it claims
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._bot = None
+        self._task = None
+        self._wakeup = None
+        # Counters of the broadcast being sent (None when idle)
+        self.current = None
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self, bot):
+        """Start looking for queued broadcasts (must be called inside the event loop)"""
+        if self._task:
+            return
+        self._bot = bot
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+        logger.info("✅ Broadcast runner started")
+
+    async def stop(self):
+        """Stop sending; an unfinished broadcast stays 'running' and resumes on the next start"""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        self.current = None
+
+    def wake(self):
+        """Check for queued broadcasts now instead of at the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _loop(self):
+        while True:
+            broadcast = await database.claim_broadcast(self.owner, self.lease_seconds)
+            if broadcast:
+                try:
+                    await self._run(broadcast)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"❌ Broadcast #{broadcast['id']} stopped: {e}")
+                    await asyncio.sleep(self.poll_interval)
+                finally:
+                    self.current = None
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, broadcast):
+        broadcast_id = broadcast['id']
+        # Claimed broadcasts are always 'running'; one that was started before
+        # (by this process or a crashed one) has started_at
+        resuming = broadcast.get('started_at') is not None
+        total = broadcast.get('total') if resuming else None
+        if not total:
+            total = await database.count_bot_users()
+        progress = self.current = {
+            'id': broadcast_id,
+            'total': total,
+            'sent': broadcast.get('sent') or 0,
+            'blocked': broadcast.get('blocked') or 0,
+            'failed': broadcast.get('failed') or 0
+        }
+        if not resuming:
+            await database.update_broadcast(broadcast_id, total=total,
+                                            started_at=datetime.now().isoformat())
+        logger.info(f"📣 {'Resuming' if resuming else 'Starting'} broadcast #{broadcast_id} to {total} users")
+
+        cursor = broadcast.get('next_cursor')
+        # Pages queued but not recorded yet: [(user_ids, futures, next_cursor)]
+        pages = []
+        heartbeat = asyncio.create_task(self._heartbeat(broadcast_id))
+        try:
+            while True:
+                if not await self._read(database.renew_broadcast_lease, broadcast_id, self.owner, self.lease_seconds):
+                    logger.info(f"📣 Broadcast #{broadcast_id} was cancelled or taken over")
+                    self._cancel_unsent(pages)
+                    await self._record_partial(progress, pages)
+                    return
+
+                users, next_cursor = await self._read(database.get_bot_users_page, cursor, page_size=self.page_size)
+                user_ids = [user[0] for user in users]
+                if resuming and user_ids:
+                    # Users reached before the restart (recorded when the bot stopped)
+                    delivered = await self._read(database.get_delivered_user_ids, broadcast_id, user_ids)
+                    user_ids = [user_id for user_id in user_ids if user_id not in delivered]
+
+                pages.append((user_ids, [self._enqueue(user_id, broadcast['message']) for user_id in user_ids], next_cursor))
+                if len(pages) > 1:
+                    await self._finish_page(progress, *pages[0])
+                    pages.pop(0)
+                if not next_cursor:
+                    break
+                cursor = next_cursor
+
+            await self._finish_page(progress, *pages[0])
+            pages.pop(0)
+        except BaseException:
+            # Bot stopping or a read kept failing: record the sends that already
+            # went out so the resumed run skips them, and let any process resume it
+            self._cancel_unsent(pages)
+            await self._record_partial(progress, pages)
+            await database.release_broadcast(broadcast_id, self.owner)
+            raise
+        finally:
+            heartbeat.cancel()
+            # Nothing may stay queued that no one will record
+            self._cancel_unsent(pages)
+
+        if not await self._read(database.finish_broadcast, broadcast_id, self.owner):
+            logger.info(f"📣 Broadcast #{broadcast_id} was cancelled or taken over")
+            return
+        logger.info(
+            f"📣 Broadcast #{broadcast_id} done: {progress['sent']} sent, "
+            f"{progress['blocked']} blocked, {progress['failed']} failed"
+        )
+
+    async def _read(self, read, *args, **kwargs):
+        """
+        await read(*args, **kwargs), retrying with back-off while it returns
+        None (database error); raises once READ_RETRIES retries have failed
+        """
+        for attempt in range(READ_RETRIES + 1):
+            result = await read(*args, **kwargs)
+            if result is not None:
+                return result
+            if attempt < READ_RETRIES:
+                logger.warning(f"⚠️ {read.__name__} failed, retrying in {2 ** attempt}s")
+                await asyncio.sleep(2 ** attempt)
+        raise RuntimeError(f"{read.__name__} kept failing")
+
+    async def _heartbeat(self, broadcast_id):
+        """Keep the lease while a page takes long (e.g. during a RetryAfter pause)"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await database.renew_broadcast_lease(broadcast_id, self.owner, self.lease_seconds)
+
+    def _enqueue(self, user_id, message):
+        send = functools.partial(
+            self._bot.send_message,
+            chat_id=user_id,
+            text=message,
+            parse_mode='HTML',
+            disable_web_page_preview=True
+        )
+        return outbound.scheduler.enqueue(user_id, send, outbound.PRIORITY_BROADCAST)
+
+    async def _finish_page(self, progress, user_ids, futures, next_cursor):
+        """Wait for a page's sends, then save its outcomes and the cursor after it"""
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        await self._record(progress, zip(user_ids, results))
+        await database.update_broadcast(
+            progress['id'],
+            sent=progress['sent'],
+            blocked=progress['blocked'],
+            failed=progress['failed'],
+            next_cursor=next_cursor
+        )
+
+    @staticmethod
+    def _cancel_unsent(pages):
+        """Drop the queued sends of unrecorded pages (the scheduler skips cancelled ones)"""
+        for _, futures, _ in pages:
+            for future in futures:
+                future.cancel()
+
+    async def _record_partial(self, progress, pages):
+        """Save the outcomes of finished sends in unrecorded pages (the cursor stays put)"""
+        outcomes = [
+            (user_id, future.exception() or future.result())
+            for user_ids, futures, _ in pages
+            for user_id, future in zip(user_ids, futures)
+            if future.done() and not future.cancelled()
+        ]
+        if outcomes:
+            await self._record(progress, outcomes)
+            await database.update_broadcast(
+                progress['id'],
+                sent=progress['sent'],
+                blocked=progress['blocked'],
+                failed=progress['failed']
+            )
+
+    async def _record(self, progress, outcomes):
+        """Count and save (user_id, result or exception) outcomes"""
+        rows = []
+        for user_id, result in outcomes:
+            error = None
+            if isinstance(result, Forbidden):
+                # Blocked the bot or deleted their account
+                status, error = 'blocked', str(result)
+            elif isinstance(result, BaseException):
+                status, error = 'failed', str(result)
+            else:
+                status = 'sent'
+            progress[status] += 1
+            rows.append({'broadcast_id': progress['id'], 'user_id': user_id, 'status': status, 'error': error})
+        await database.save_broadcast_deliveries(rows)
+
+    def stats(self):
+        """Counters of the broadcast being sent, or None"""
+        return dict(self.current) if self.current else None
+
+# Shared runner for this process
+runner = BroadcastRunner()
@@ -0,0 +1,232 @@
+"""
+In-process caches shared by database.py and async_database.py
+Keeps hot, rarely-changing rows in memory so reads skip the network.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Marker for "not in cache" (None is a valid cached value, e.g. unset config key)
+MISSING = object()
+
+class TTLCache:
+    """
+    Read-through key/value cache with per-key expiry and hit/miss counters.
+
+    ttl_overrides maps a key or key prefix to its own TTL in seconds,
+    e.g. {'wallet_': 600}. Keys without an override use default_ttl.
+    """
+
+    def __init__(self, default_ttl, ttl_overrides=None):
+        self.default_ttl = default_ttl
+        self.ttl_overrides = ttl_overrides or {}
+        self._data = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _ttl_for(self, key):
+        if key in self.ttl_overrides:
+            return self.ttl_overrides[key]
+        for prefix, ttl in self.ttl_overrides.items():
+            if str(key).startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    def get(self, key):
+        """Return cached value or MISSING (expired entries count as misses)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value, ttl=None):
+        """Store value; ttl overrides the configured TTL for this entry"""
+        if ttl is None:
+            ttl = self._ttl_for(key)
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+
+    def invalidate(self, key):
+        """Drop a single key"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Drop every key"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+# Config values change rarely (admin panel edits); other processes'
+# writes become visible here after at most one TTL.
+CONFIG_CACHE_TTL = int(os.getenv("CONFIG_CACHE_TTL", "300"))
+
+config_cache = TTLCache(
+    default_ttl=CONFIG_CACHE_TTL,
+    ttl_overrides={
+        # Credentials edited from the admin panel should be picked up quickly
+        'admin_password': 30,
+        'telegram_api_': 60
+    }
+)
+
+# Rows loaded by the startup snapshot: whole tables ('statistics',
+# 'crypto_addresses') and per-key rows ('content:<key>', 'media:<file_type>')
+table_cache = TTLCache(
+    default_ttl=CONFIG_CACHE_TTL,
+    ttl_overrides={
+        # Counters move with every deal; keep the displayed numbers fresh
+        'statistics': 60
+    }
+)
+
+# Field order of the deal tuple returned by get_deal_by_group
+DEAL_FIELDS = ('deal_id', 'buyer_id', 'seller_id', 'buyer_address',
+               'seller_address', 'bot_address', 'status')
+
+def normalize_group_id(group_id):
+    """
+    Canonical key for a group: Bot API supergroup IDs (-100123) and
+    Telethon channel IDs (123) map to the same value.
+    """
+    text = str(group_id)
+    if text.startswith('-100'):
+        return int(text[4:])
+    return int(text)
+
+def group_id_variants(group_id):
+    """Every stored form a group ID may have in the deals table"""
+    key = normalize_group_id(group_id)
+    variants = {int(group_id), key}
+    if key > 0:
+        variants.add(int(f"-100{key}"))
+    return list(variants)
+
+class DealCache:
+    """
+    LRU cache of deal tuples keyed by normalized group ID.
+
+    Active deals are only evicted once the cache exceeds max_size;
+    closed deals are evicted first, keeping at most max_closed of them.
+    Active deals are re-read after active_ttl seconds, so changes written
+    by another replica (roles, addresses, status) show up within that time.
+    """
+
+    def __init__(self, max_size=10000, max_closed=500, active_ttl=30):
+        self.max_size = max_size
+        self.max_closed = max_closed
+        self.active_ttl = active_ttl
+        self._deals = OrderedDict()
+        # group key -> when the cached deal was read from the database
+        self._loaded = {}
+        self._group_by_deal = {}
+        self._closed = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, group_id):
+        """Return the cached deal tuple or None"""
+        key = normalize_group_id(group_id)
+        with self._lock:
+            deal = self._deals.get(key)
+            if deal is not None and self._is_active(deal) and \
+                    time.monotonic() - self._loaded[key] > self.active_ttl:
+                self._remove(key)
+                deal = None
+            if deal is None:
+                self.misses += 1
+                return None
+            self._deals.move_to_end(key)
+            self.hits += 1
+            return deal
+
+    def put(self, group_id, deal):
+        """Cache a deal tuple (deal_id, buyer_id, seller_id, buyer_address, seller_address, bot_address, status)"""
+        key = normalize_group_id(group_id)
+        with self._lock:
+            self._remove(key)
+            self._deals[key] = tuple(deal)
+            self._loaded[key] = time.monotonic()
+            self._group_by_deal[deal[0]] = key
+            if not self._is_active(deal):
+                self._closed += 1
+            self._evict()
+
+    def update(self, deal_id, **fields):
+        """Write-through patch of a cached deal (no-op if the deal is not cached)"""
+        with self._lock:
+            key = self._group_by_deal.get(deal_id)
+            if key is None or key not in self._deals:
+                return
+            deal = list(self._deals[key])
+            was_active = self._is_active(deal)
+            for name, value in fields.items():
+                deal[DEAL_FIELDS.index(name)] = value
+            self._deals[key] = tuple(deal)
+            self._closed += int(was_active) - int(self._is_active(deal))
+            self._evict()
+
+    def invalidate(self, group_id):
+        """Drop a group's deal"""
+        with self._lock:
+            self._remove(normalize_group_id(group_id))
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._deals),
+                'closed': self._closed,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+    @staticmethod
+    def _is_active(deal):
+        return deal[DEAL_FIELDS.index('status')] == 'active'
+
+    def _remove(self, key):
+        deal = self._deals.pop(key, None)
+        if deal is None:
+            return
+        del self._loaded[key]
+        self._group_by_deal.pop(deal[0], None)
+        if not self._is_active(deal):
+            self._closed -= 1
+
+    def _evict(self):
+        # Closed deals go first, least recently used first
+        if self._closed > self.max_closed:
+            for key in [k for k, d in self._deals.items() if not self._is_active(d)]:
+                if self._closed <= self.max_closed:
+                    break
+                self._remove(key)
+        # Hard cap: fall back to plain LRU
+        while len(self._deals) > self.max_size:
+            self._remove(next(iter(self._deals)))
+
+deal_cache = DealCache(
+    max_size=int(os.getenv("DEAL_CACHE_SIZE", "10000")),
+    max_closed=int(os.getenv("DEAL_CACHE_CLOSED_SIZE", "500")),
+    active_ttl=int(os.getenv("DEAL_CACHE_TTL", "30"))
+)
@@ -0,0 +1,73 @@
+"""
+Callback Router
+Dispatches inline button presses with one dictionary lookup instead of an
+if/elif chain over query.data. callback_data is "action" or
+"action:arg[:arg...]"; the handler registered for "action" runs with
+context.args set to the args, so buttons can reuse command handlers.
+"""
+import logging
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+logger = logging.getLogger(__name__)
+
+# Telegram's limit for callback_data (bytes)
+MAX_CALLBACK_DATA = 64
+
+class CallbackRouter:
+    """action -> handler(update, context), plus keyboard builders that only accept registered actions"""
+
+    def __init__(self):
+        self._handlers = {}
+        self.unknown = 0
+
+    def register(self, action, handler):
+        if ':' in action:
+            raise ValueError(f"Callback action may not contain ':' ({action})")
+        self._handlers[action] = handler
+        return handler
+
+    def route(self, action):
+        """Decorator form of register()"""
+        def decorator(handler):
+            return self.register(action, handler)
+        return decorator
+
+    @staticmethod
+    def payload(action, *args):
+        """callback_data for action with optional args"""
+        data = ':'.join([action, *(str(arg) for arg in args)])
+        if len(data.encode()) > MAX_CALLBACK_DATA:
+            raise ValueError(f"callback_data longer than {MAX_CALLBACK_DATA} bytes: {data}")
+        return data
+
+    def button(self, text, action, *args):
+        """InlineKeyboardButton for a registered action"""
+        if action not in self._handlers:
+            raise KeyError(f"No callback handler registered for '{action}'")
+        return InlineKeyboardButton(text, callback_data=self.payload(action, *args))
+
+    def keyboard(self, rows):
+        """
+        InlineKeyboardMarkup from rows of (text, action, *args) tuples;
+        ready-made InlineKeyboardButtons (e.g. web_app) are passed through
+        """
+        return InlineKeyboardMarkup([
+            [self.button(*item) if isinstance(item, tuple) else item for item in row]
+            for row in rows
+        ])
+
+    async def dispatch(self, update, context):
+        """CallbackQueryHandler callback: answer the query and run the action's handler"""
+        query = update.callback_query
+        await query.answer()
+        action, *args = (query.data or '').split(':')
+        handler = self._handlers.get(action)
+        if handler is None:
+            self.unknown += 1
+            logger.warning(f"⚠️ No handler for callback data '{query.data}'")
+            return
+        context.args = args
+        await handler(update, context)
+
+# Shared router for this process
+router = CallbackRouter()
@@ -1,5 +1,6 @@
 # Config.py
 import os
+import hashlib
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -8,6 +9,17 @@ load_dotenv()
 # Replace with your actual bot token
 BOT_TOKEN = os.getenv("BOT_TOKEN", "8470449689:AAEHH4KZJi2TCqcWOxpVO0MtHDcTukaEN0k")
 
+# Webhook mode (optional): set WEBHOOK_URL to the bot's public base URL, e.g.
+# https://your-app.koyeb.app, to receive updates on PORT instead of polling.
+# Every replica must share the same secret (derived from the token by default).
+# Per-chat ordering (update_processor.py) and the in-memory caches are per
+# process: with several replicas, updates of one chat must be routed to the
+# same replica (chat-affinity load balancing), otherwise /seller and /buyer
+# can race across replicas. Without such routing, run a single replica.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = "/" + os.getenv("WEBHOOK_PATH", "/telegram").strip("/")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or hashlib.sha256(BOT_TOKEN.encode()).hexdigest()
+
 # Telethon User Account Credentials (for creating groups)
 # Get these from https://my.telegram.org
 API_ID = int(os.getenv("API_ID", "0"))  # e.g., 12345678 - must be integer
@@ -1,19 +1,29 @@
 import os
-from supabase import create_client, Client
 from datetime import datetime
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Storage backend: "supabase" (default) or "sqlite" (local file, see sqlite_backend.py)
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "supabase").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "escrow.db")
+
 # Supabase configuration
 SUPABASE_URL = os.getenv("SUPABASE_URL", "YOUR_SUPABASE_URL_HERE")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "YOUR_SUPABASE_KEY_HERE")
 
-# Initialize Supabase client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Initialize storage client
+if DATABASE_BACKEND == 'sqlite':
+    import sqlite_backend
+    supabase = sqlite_backend.create_client(SQLITE_PATH)
+else:
+    from supabase import create_client, Client
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 from bot_error_wrapper import safe_call
+from cache import config_cache, deal_cache, group_id_variants, MISSING
+from wallet_resolver import wallet_resolver, legacy_wallets_from_rows
 
 @safe_call
 def init_db():
@@ -96,20 +106,33 @@ def set_config(key, value):
         supabase.table('config').upsert({'key': key, 'value': value}).execute()
     except Exception as e:
         print(f"Error setting config: {e}")
+    finally:
+        config_cache.invalidate(key)
+        if str(key).startswith('wallet_'):
+            wallet_resolver.invalidate()
 
 # Alias for compatibility
 update_config = set_config
 
 @safe_call
 def get_config(key):
-    """Get configuration value"""
+    """Get configuration value (served from the in-process config cache when fresh)"""
+    cached = config_cache.get(key)
+    if cached is not MISSING:
+        return cached
     try:
         result = supabase.table('config').select('value').eq('key', key).execute()
-        return result.data[0]['value'] if result.data else None
+        value = result.data[0]['value'] if result.data else None
+        config_cache.set(key, value)
+        return value
     except Exception as e:
         print(f"Error getting config: {e}")
         return None
 
+def get_cache_stats():
+    """Hit/miss counters for the in-process caches"""
+    return {'config': config_cache.stats(), 'deals': deal_cache.stats()}
+
 @safe_call
 def create_deal(deal_id, buyer_id, seller_id, group_id):
     """Create a new escrow deal"""
@@ -121,6 +144,7 @@ def create_deal(deal_id, buyer_id, seller_id, group_id):
             'group_id': group_id,
             'status': 'active'
         }).execute()
+        deal_cache.put(group_id, (deal_id, buyer_id, seller_id, None, None, None, 'active'))
     except Exception as e:
         print(f"Error creating deal: {e}")
 
@@ -139,26 +163,27 @@ def update_deal_address(deal_id, role, address, user_id=None):
             if user_id:
                 data['seller_id'] = user_id
             supabase.table('deals').update(data).eq('deal_id', deal_id).execute()
+        if data:
+            deal_cache.update(deal_id, **data)
     except Exception as e:
         print(f"Error updating deal address: {e}")
 
 @safe_call
 def get_deal_by_group(group_id):
-    """Get deal information by group ID (Flexible check)"""
+    """Get deal information by group ID (Flexible check, cached per group)"""
+    cached = deal_cache.get(group_id)
+    if cached is not None:
+        return cached
     try:
-        # Try finding by exact group_id
-        result = supabase.table('deals').select('*').eq('group_id', group_id).execute()
-        
-        # If not found, try alternative format (e.g. without -100 prefix)
-        if not result.data:
-            alt_id = int(str(group_id).replace('-100', ''))  # e.g. -100123 -> 123
-            if alt_id != group_id:
-                result = supabase.table('deals').select('*').eq('group_id', alt_id).execute()
-                
+        # One query covering every stored form (e.g. -100123 and 123)
+        result = supabase.table('deals').select('*').in_('group_id', group_id_variants(group_id)).order('created_at', desc=True).limit(1).execute()
+
         if result.data:
             d = result.data[0]
-            return (d['deal_id'], d['buyer_id'], d['seller_id'], d['buyer_address'], 
-                   d['seller_address'], d['bot_address'], d['status'])
+            deal = (d['deal_id'], d['buyer_id'], d['seller_id'], d['buyer_address'],
+                    d['seller_address'], d['bot_address'], d['status'])
+            deal_cache.put(group_id, deal)
+            return deal
         return None
     except Exception as e:
         print(f"Error getting deal: {e}")
@@ -201,6 +226,45 @@ def get_all_users():
 # Alias for compatibility
 get_all_bot_users = get_all_users
 
+# Default page size of the admin users list
+USERS_PAGE_SIZE = 50
+
+@safe_call
+def get_bot_users_page(cursor=None, page_size=USERS_PAGE_SIZE):
+    """
+    One page of users, newest first, using a (started_at, user_id) keyset.
+
+    cursor is the next_cursor returned for the previous page (None for the
+    first page). Returns (users, next_cursor); next_cursor is None on the last
+    page. Returns None if the read failed, so callers can tell an error from
+    the end of the list.
+    """
+    try:
+        params = {'page_size': page_size}
+        if cursor:
+            started_at, user_id = cursor.rsplit('|', 1)
+            params.update(after_started_at=started_at, after_user_id=int(user_id))
+        result = supabase.rpc('bot_users_page', params).execute()
+        users = [(u['user_id'], u['username'], u['first_name'], u['last_name'], u['started_at'])
+                 for u in result.data]
+        next_cursor = None
+        if len(users) == page_size:
+            next_cursor = f"{users[-1][4]}|{users[-1][0]}"
+        return users, next_cursor
+    except Exception as e:
+        print(f"Error getting users page: {e}")
+        return None
+
+@safe_call
+def count_bot_users():
+    """Number of users who started the bot (trigger-maintained counter, no table scan)"""
+    try:
+        result = supabase.table('row_counts').select('total').eq('table_name', 'bot_users').execute()
+        return result.data[0]['total'] if result.data else 0
+    except Exception as e:
+        print(f"Error counting users: {e}")
+        return 0
+
 @safe_call
 def save_media_file(file_type, file_path, description=""):
     """Save media file info"""
@@ -260,13 +324,10 @@ def get_all_media():
         return []
 
 @safe_call
-def increment_stat(key):
-    """Increment a statistic"""
+def increment_stat(key, amount=1):
+    """Increment a statistic atomically (increment_stat SQL function, see supabase_schema.sql)"""
     try:
-        result = supabase.table('statistics').select('value').eq('key', key).execute()
-        if result.data:
-            new_value = result.data[0]['value'] + 1
-            supabase.table('statistics').update({'value': new_value}).eq('key', key).execute()
+        supabase.rpc('increment_stat', {'stat_key': key, 'amount': amount}).execute()
     except Exception as e:
         print(f"Error incrementing stat: {e}")
 
@@ -335,6 +396,7 @@ def add_crypto_address(currency, address, network='', label=''):
             'network': network,
             'label': label
         }).execute()
+        wallet_resolver.invalidate()
         return True
     except Exception as e:
         print(f"Error adding crypto address: {e}")
@@ -345,6 +407,7 @@ def delete_crypto_address(address_id):
     """Delete a crypto address"""
     try:
         supabase.table('crypto_addresses').delete().eq('id', address_id).execute()
+        wallet_resolver.invalidate()
         return True
     except Exception as e:
         print(f"Error deleting crypto address: {e}")
@@ -360,6 +423,7 @@ def update_crypto_address(address_id, currency, address, network='', label=''):
             'network': network,
             'label': label
         }).eq('id', address_id).execute()
+        wallet_resolver.invalidate()
         return True
     except Exception as e:
         print(f"Error updating crypto address: {e}")
@@ -370,45 +434,20 @@ def get_bot_wallet_address(network_string):
     """
     Get bot address by network string (e.g. BTC, USDT (BEP20))
     Prioritizes crypto_addresses table, then falls back to config.
+    Answered from the in-memory wallet index; the DB is only read to (re)build it.
     """
+    if not wallet_resolver.ready:
+        _build_wallet_index()
+    return wallet_resolver.resolve(network_string)
+
+def _build_wallet_index():
+    """Load crypto_addresses and legacy wallet_* config keys into the wallet index"""
     try:
-        # 1. Try crypto_addresses table
-        # We fetch all because complex matching is easier in Python 
-        # (given network strings vary)
         addrs = get_crypto_addresses()
-        net_upper = network_string.upper()
-        
-        for a in addrs:
-            # a = (id, currency, address, network, label, created_at)
-            # Try matching Currency (e.g. BTC == BTC)
-            currency = (a[1] or "").upper()
-            network_field = (a[3] or "").upper()
-            label = (a[4] or "").upper()
-            
-            # Simple Match: Currency matches exact string (e.g. BTC)
-            if currency == net_upper:
-                return a[2]
-            
-            # Complex Match: Currency inside string (e.g. USDT in USDT (BEP20))
-            if currency and currency in net_upper:
-                # If network specified in DB, must match (e.g. BEP20)
-                if network_field and network_field in net_upper:
-                    return a[2]
-                # If no network specified in DB, generic match
-                if not network_field and not any(x in net_upper for x in ['BEP20', 'ERC20', 'TRC20']):
-                     # Only match if input string also has no specific network?
-                     # Or just return generic USDT.
-                     return a[2]
-
-            # Label Match (e.g. "Main Wallet")
-            if label and label == net_upper:
-                return a[2]
-                
-    except Exception as e:
-        print(f"Error finding crypto address in table: {e}")
-
-    # 2. Fallback to Config (Legacy)
-    return get_config(f"wallet_{network_string}")
+        result = supabase.table('config').select('key, value').like('key', 'wallet_%').execute()
+        wallet_resolver.build(addrs or [], legacy_wallets_from_rows(result.data))
+    except Exception as e:
+        print(f"Error building wallet index: {e}")
 
 # -------------------------------------------------------------------------
 # Telegram Session Management (for Admin Panel group creation)
@@ -471,3 +510,43 @@ def delete_telegram_session(phone):
         print(f"Error deleting Telegram session: {e}")
         return False
 
+
+# -------------------------------------------------------------------------
+# Broadcasts (queued here by the admin panel, sent by the bot's broadcast.py)
+# -------------------------------------------------------------------------
+
+@safe_call
+def create_broadcast(message):
+    """Queue a broadcast to every bot user. Returns: the new broadcast id, or None"""
+    try:
+        result = supabase.table('broadcasts').insert({
+            'message': message,
+            'status': 'pending'
+        }).execute()
+        return result.data[0]['id'] if result.data else None
+    except Exception as e:
+        print(f"Error creating broadcast: {e}")
+        return None
+
+@safe_call
+def get_broadcasts(limit=10):
+    """Most recent broadcasts (row dicts), newest first"""
+    try:
+        result = supabase.table('broadcasts').select('*').order('id', desc=True).limit(limit).execute()
+        return result.data
+    except Exception as e:
+        print(f"Error getting broadcasts: {e}")
+        return []
+
+@safe_call
+def cancel_broadcast(broadcast_id):
+    """Stop a pending or running broadcast (the bot notices before its next page)"""
+    try:
+        result = supabase.table('broadcasts').update({
+            'status': 'cancelled',
+            'updated_at': datetime.now().isoformat()
+        }).eq('id', broadcast_id).in_('status', ['pending', 'running']).execute()
+        return bool(result.data)
+    except Exception as e:
+        print(f"Error cancelling broadcast: {e}")
+        return False
@@ -0,0 +1,57 @@
+"""
+Telethon Entity Cache
+Input peers an admin account has already resolved (e.g. the bot), kept in
+telegram_sessions.entity_cache so they survive restarts. A StringSession
+forgets every entity on restart, and resolving a username costs a
+ResolveUsername round-trip.
+
+Access hashes are only valid for the account that fetched them, so each
+account has its own cache.
+"""
+from telethon.tl.types import InputPeerUser
+
+class EntityCache:
+    """username -> (user_id, access_hash) for one admin account"""
+
+    def __init__(self, user_id, data=None):
+        self.user_id = user_id
+        self.users = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        # Ignore a cache written by a different account (same phone, new login)
+        if data and data.get('user_id') == user_id:
+            self.users = {name: tuple(peer) for name, peer in data.get('users', {}).items()}
+
+    @staticmethod
+    def _key(username):
+        return username.lstrip('@').lower()
+
+    def get_user(self, username):
+        """Cached InputPeerUser for username, or None"""
+        peer = self.users.get(self._key(username))
+        if peer is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return InputPeerUser(user_id=peer[0], access_hash=peer[1])
+
+    def put_user(self, username, input_peer):
+        """Remember a resolved InputPeerUser"""
+        peer = (input_peer.user_id, input_peer.access_hash)
+        key = self._key(username)
+        if self.users.get(key) != peer:
+            self.users[key] = peer
+            self.dirty = True
+
+    def invalidate_user(self, username):
+        """Forget a peer (e.g. the access hash was rejected)"""
+        if self.users.pop(self._key(username), None) is not None:
+            self.dirty = True
+
+    def to_dict(self):
+        """JSON-serialisable form stored in telegram_sessions.entity_cache"""
+        return {
+            'user_id': self.user_id,
+            'users': {name: list(peer) for name, peer in self.users.items()}
+        }
@@ -0,0 +1,198 @@
+"""
+Escrow Group Pool
+Keeps GROUP_POOL_SIZE fully provisioned groups (bot added and promoted,
+creator anonymous, invite link exported) in the group_pool table, so
+creating a deal only has to claim one and rename it. Groups of closed
+deals are recycled back into the pool instead of being abandoned.
+"""
+import os
+import asyncio
+import logging
+import telegram_group_manager
+import async_database as database
+
+logger = logging.getLogger(__name__)
+
+# Ready groups to keep per bot (0 disables the pool)
+GROUP_POOL_SIZE = int(os.getenv("GROUP_POOL_SIZE", "3"))
+# Seconds to wait before retrying after a failed refill (e.g. no admin session)
+GROUP_POOL_RETRY_DELAY = int(os.getenv("GROUP_POOL_RETRY_DELAY", "60"))
+
+# Placeholder title/about until the group is claimed and renamed
+POOL_GROUP_TITLE = "Escrow Group"
+POOL_GROUP_ABOUT = "Escrow transaction"
+
+class GroupPool:
+    """Background refiller plus claim() for pre-created escrow groups"""
+
+    def __init__(self, size=GROUP_POOL_SIZE, retry_delay=GROUP_POOL_RETRY_DELAY):
+        self.size = size
+        self.retry_delay = retry_delay
+        self.bot_username = None
+        self._wake = None
+        self._task = None
+        self._backoff = retry_delay
+        self.claimed = 0
+        self.misses = 0
+        self.provisioned = 0
+        self.recycled = 0
+        self.failures = 0
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self, bot_username):
+        """Start refilling for bot_username (must be called inside the event loop)"""
+        # Claims work even without the refiller (recycled groups)
+        self.bot_username = bot_username
+        if self.size <= 0 or self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"✅ Group pool started (target {self.size} ready groups)")
+
+    async def stop(self):
+        """Stop refilling (a group being provisioned right now is abandoned)"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def claim(self, deal_id):
+        """
+        Take a ready group for deal_id and rename it to "Escrow #{deal_id}"
+        Returns: same dict as telegram_group_manager.create_escrow_group, or None if the pool is empty
+        """
+        if self.bot_username is None:
+            return None
+        row = await database.claim_pool_group(deal_id, self.bot_username)
+        # Top the pool back up in the background
+        if self.running:
+            self._wake.set()
+        if not row:
+            self.misses += 1
+            logger.warning(f"⚠️ Group pool empty, creating group for deal #{deal_id} inline")
+            return None
+        self.claimed += 1
+
+        rename = await telegram_group_manager.rename_group(row['group_id'], row['access_hash'],
+                                                           f"Escrow #{deal_id}", creator_id=row.get('creator_id'))
+        if not rename['success']:
+            # Still a working escrow group, just with the placeholder title
+            logger.warning(f"⚠️ Pooled group {row['group_id']} keeps its placeholder title")
+
+        logger.info(f"✅ Deal #{deal_id} got pooled group {row['group_id']}")
+        return {
+            'success': True,
+            'group_id': row['group_id'],
+            'access_hash': row['access_hash'],
+            'invite_link': row['invite_link'],
+            'creator_id': row.get('creator_id')
+        }
+
+    async def recycle(self, group_id):
+        """
+        Reset a closed deal's group and return it to the pool as ready
+        Returns: telegram_group_manager.recycle_group result
+        """
+        row = await database.get_pool_group(group_id)
+        if not row or not row.get('access_hash'):
+            return {'success': False, 'error': 'This group was not created by the group pool and cannot be recycled.'}
+
+        result = await telegram_group_manager.recycle_group(
+            row['group_id'],
+            row['access_hash'],
+            creator_id=row.get('creator_id'),
+            bot_username=row.get('bot_username'),
+            title=POOL_GROUP_TITLE
+        )
+        if not result['success']:
+            self.failures += 1
+            return result
+        if not await database.release_pool_group(row['group_id'], result['invite_link']):
+            self.failures += 1
+            return {'success': False, 'error': 'Group was reset but could not be returned to the pool.'}
+
+        self.recycled += 1
+        logger.info(f"♻️ Group {row['group_id']} is back in the pool")
+        return result
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            self._backoff = self.retry_delay
+            try:
+                filled = await self._fill()
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ Group pool refill error: {e}")
+                filled = False
+            if filled:
+                await self._wake.wait()
+            else:
+                await asyncio.sleep(self._backoff)
+
+    async def _fill(self):
+        """Provision groups until the pool is full; returns False on failure"""
+        ready = await database.count_pool_groups(self.bot_username)
+        if ready is None:
+            return False
+        while ready < self.size:
+            result = await telegram_group_manager.provision_group(
+                title=POOL_GROUP_TITLE,
+                about=POOL_GROUP_ABOUT,
+                bot_username=self.bot_username
+            )
+            if not result['success'] and result.get('flood_wait') == 0:
+                # That account is cooling down, another one is free
+                continue
+            if not result['success']:
+                self.failures += 1
+                logger.error(f"❌ Group pool refill failed: {result.get('error')}")
+                # Honour Telegram's rate limit before trying again
+                self._backoff = max(self.retry_delay, result.get('flood_wait', 0))
+                return False
+            if not await database.add_pool_group(result['group_id'], result['access_hash'],
+                                                 result['invite_link'], self.bot_username,
+                                                 creator_id=result.get('creator_id')):
+                self.failures += 1
+                logger.error(f"❌ Group pool: could not store provisioned group {result['group_id']}")
+                return False
+            ready += 1
+            self.provisioned += 1
+            logger.info(f"🏊 Group pool: {ready}/{self.size} ready")
+        return True
+
+    def stats(self):
+        """Claim and refill counters"""
+        return {
+            'claimed': self.claimed,
+            'misses': self.misses,
+            'provisioned': self.provisioned,
+            'recycled': self.recycled,
+            'failures': self.failures
+        }
+
+# Shared pool for this process
+pool = GroupPool()
+
+async def create_escrow_group(deal_id, bot_username=None):
+    """Hand out a pooled group, or create one inline if the pool is empty"""
+    try:
+        result = await pool.claim(deal_id)
+        if result:
+            return result
+    except Exception as e:
+        logger.error(f"❌ Error claiming pooled group: {e}")
+    result = await telegram_group_manager.create_escrow_group(deal_id=deal_id, bot_username=bot_username)
+    if result['success']:
+        # Remember which admin account owns the group (needed to manage it later)
+        await database.add_pool_group(result['group_id'], result['access_hash'], result['invite_link'],
+                                      bot_username, creator_id=result.get('creator_id'),
+                                      status='claimed', deal_id=deal_id)
+    return result
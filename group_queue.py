@@ -0,0 +1,242 @@
+"""
+Group Creation Queue
+Runs escrow group creation on a fixed number of workers so bursts of
+/create share the admin account instead of tripping FloodWait, and keeps
+the user's "Creating..." message updated with queue position and progress.
+"""
+import os
+import math
+import asyncio
+import logging
+from collections import deque
+import messages
+import group_pool
+
+logger = logging.getLogger(__name__)
+
+# Groups created at the same time through the admin account
+GROUP_CREATION_WORKERS = int(os.getenv("GROUP_CREATION_WORKERS", "2"))
+# Requests allowed to wait for a worker before new ones are turned away
+GROUP_CREATION_QUEUE_SIZE = int(os.getenv("GROUP_CREATION_QUEUE_SIZE", "20"))
+# FloodWait retries per request, and the longest wait worth retrying after (seconds)
+GROUP_CREATION_MAX_RETRIES = int(os.getenv("GROUP_CREATION_MAX_RETRIES", "3"))
+GROUP_CREATION_MAX_FLOOD_WAIT = int(os.getenv("GROUP_CREATION_MAX_FLOOD_WAIT", "300"))
+
+# Seconds between retries when another admin account was free (FloodWait of 0)
+ZERO_WAIT_RETRY_DELAY = 1
+
+def format_wait(seconds):
+    """'45 seconds', '1 minute', '5 minutes'"""
+    if seconds < 60:
+        return f"{seconds} second{'' if seconds == 1 else 's'}"
+    minutes = math.ceil(seconds / 60)
+    return f"{minutes} minute{'' if minutes == 1 else 's'}"
+
+class _Job:
+    """One pending group creation and the status message it reports to"""
+
+    def __init__(self, deal_id, bot_username, progress):
+        self.deal_id = deal_id
+        self.bot_username = bot_username
+        self.progress = progress
+        self.future = asyncio.get_running_loop().create_future()
+        self._last_text = None
+
+    async def notify(self, text):
+        """Edit the user's status message (errors and unchanged text are ignored)"""
+        if self.progress is None or text == self._last_text:
+            return
+        self._last_text = text
+        try:
+            await self.progress(text)
+        except Exception as e:
+            logger.debug(f"Could not update progress for deal #{self.deal_id}: {e}")
+
+    def finish(self, result):
+        if not self.future.done():
+            self.future.set_result(result)
+
+class GroupCreationQueue:
+    """
+    Bounded FIFO of group creation requests served by `workers` tasks.
+
+    A FloodWait is retried right away on another admin account if one is
+    free; once every account is cooling down the whole queue pauses until
+    the first one is ready, as long as that is no longer than max_flood_wait.
+    """
+
+    def __init__(self, workers=GROUP_CREATION_WORKERS, max_pending=GROUP_CREATION_QUEUE_SIZE,
+                 max_retries=GROUP_CREATION_MAX_RETRIES, max_flood_wait=GROUP_CREATION_MAX_FLOOD_WAIT):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.max_flood_wait = max_flood_wait
+        self._waiting = deque()
+        self._available = None
+        self._tasks = []
+        self._detached = set()
+        self._busy = 0
+        self._resume_at = 0
+        self.completed = 0
+        self.failed = 0
+        self.flood_waits = 0
+        self.rejected = 0
+
+    @property
+    def running(self):
+        return bool(self._tasks)
+
+    @property
+    def depth(self):
+        """Requests waiting for a worker"""
+        return len(self._waiting)
+
+    def start(self):
+        """Start the workers (must be called inside the event loop)"""
+        if self._tasks:
+            return
+        self._available = asyncio.Semaphore(0)
+        self._resume_at = 0
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"✅ Group creation queue started ({self.workers} workers)")
+
+    async def stop(self):
+        """Stop the workers and fail whatever is still waiting"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while self._waiting:
+            self._waiting.popleft().finish({'success': False, 'error': 'Bot is restarting. Please try again.'})
+        # Let detached requests tell their users
+        await asyncio.gather(*self._detached, return_exceptions=True)
+
+    async def submit(self, deal_id, bot_username=None, progress=None):
+        """
+        Create (or claim from the pool) a group for deal_id and wait for the result.
+
+        progress is an optional coroutine function progress(text) used to
+        edit the user's "Creating..." message. Returns the same dict as
+        group_pool.create_escrow_group.
+        """
+        job = _Job(deal_id, bot_username, progress)
+        if not self.running:
+            return await self._create(job)
+        if len(self._waiting) >= self.max_pending:
+            self.rejected += 1
+            return {'success': False, 'error': messages.ERROR_GROUP_QUEUE_FULL}
+
+        self._waiting.append(job)
+        self._available.release()
+        if self._busy >= self.workers:
+            await job.notify(messages.TEXT_GROUP_QUEUED.format(position=len(self._waiting)))
+        return await job.future
+
+    def submit_detached(self, deal_id, bot_username=None, progress=None, on_result=None):
+        """
+        submit() without waiting: on_result(result) runs once the group is ready.
+
+        Handlers use this so they return right away; an update waiting in the
+        queue would otherwise hold one of the bot's update workers (and its
+        chat) for as long as the queue takes.
+        """
+        task = asyncio.create_task(self._run_detached(deal_id, bot_username, progress, on_result))
+        self._detached.add(task)
+        task.add_done_callback(self._detached.discard)
+        return task
+
+    async def _run_detached(self, deal_id, bot_username, progress, on_result):
+        try:
+            result = await self.submit(deal_id, bot_username=bot_username, progress=progress)
+        except Exception as e:
+            logger.error(f"❌ Group creation for deal #{deal_id} crashed: {e}")
+            result = {'success': False, 'error': str(e)}
+        if on_result is None:
+            return
+        try:
+            await on_result(result)
+        except Exception as e:
+            logger.error(f"❌ Could not report group creation for deal #{deal_id}: {e}")
+
+    async def _worker(self):
+        while True:
+            await self._available.acquire()
+            job = self._waiting.popleft()
+            self._busy += 1
+            self._announce_positions()
+            try:
+                result = await self._create(job)
+            except asyncio.CancelledError:
+                job.finish({'success': False, 'error': 'Bot is restarting. Please try again.'})
+                raise
+            except Exception as e:
+                logger.error(f"❌ Group creation job for deal #{job.deal_id} crashed: {e}")
+                result = {'success': False, 'error': str(e)}
+            finally:
+                self._busy -= 1
+            if result['success']:
+                self.completed += 1
+            else:
+                self.failed += 1
+            job.finish(result)
+
+    def _announce_positions(self):
+        """Tell everyone still waiting that they moved up"""
+        for job in self._waiting:
+            asyncio.create_task(self._announce_position(job))
+
+    async def _announce_position(self, job):
+        # Position is read when the edit runs, the job may have moved again
+        if job in self._waiting:
+            position = self._waiting.index(job) + 1
+            await job.notify(messages.TEXT_GROUP_QUEUED.format(position=position))
+
+    async def _create(self, job):
+        loop = asyncio.get_running_loop()
+        wait = 0
+        for attempt in range(self.max_retries + 1):
+            # Another worker may have hit the rate limit meanwhile
+            delay = self._resume_at - loop.time()
+            if delay > 0:
+                await job.notify(messages.TEXT_GROUP_RATE_LIMITED.format(seconds=math.ceil(delay)))
+                await asyncio.sleep(delay)
+            await job.notify(messages.TEXT_GROUP_CREATING)
+
+            result = await group_pool.create_escrow_group(deal_id=job.deal_id, bot_username=job.bot_username)
+            wait = result.get('flood_wait')
+            if result['success'] or wait is None:
+                return result
+
+            self.flood_waits += 1
+            logger.warning(f"⏳ FloodWait {wait}s creating group for deal #{job.deal_id} (attempt {attempt + 1})")
+            if wait > self.max_flood_wait:
+                break
+            if wait:
+                self._resume_at = max(self._resume_at, loop.time() + wait)
+            elif attempt < self.max_retries:
+                # Another account is free, but don't hammer Telegram
+                await asyncio.sleep(ZERO_WAIT_RETRY_DELAY)
+
+        if not wait:
+            # Every retry had a free account: the problem is not a rate limit
+            return result
+        return {
+            'success': False,
+            'error': messages.ERROR_GROUP_RATE_LIMITED.format(wait=format_wait(wait)),
+            'flood_wait': wait
+        }
+
+    def stats(self):
+        """Queue depth and job counters"""
+        return {
+            'depth': self.depth,
+            'busy': self._busy,
+            'detached': len(self._detached),
+            'completed': self.completed,
+            'failed': self.failed,
+            'flood_waits': self.flood_waits,
+            'rejected': self.rejected
+        }
+
+# Shared queue for this process
+queue = GroupCreationQueue()
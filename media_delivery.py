@@ -0,0 +1,113 @@
+"""
+Media Delivery
+Sends bot assets (the tutorial video) by Telegram file_id. Each file is
+uploaded once; the file_id Telegram returns is stored in media_file_ids
+keyed by the file's SHA-256, so later sends cost a few hundred bytes instead of
+re-uploading megabytes. Replacing the file on disk changes its hash, which
+triggers a fresh upload.
+"""
+import os
+import asyncio
+import hashlib
+import logging
+from telegram.error import BadRequest
+import async_database as database
+
+logger = logging.getLogger(__name__)
+
+# Bundled tutorial video (used when media_files has no usable path)
+DEFAULT_VIDEO_PATH = "video.mp4"
+
+class MediaDelivery:
+    """Content hashes of local files and the upload-once send path"""
+
+    def __init__(self):
+        # path -> ((mtime, size), sha256); rehashed only when the file changes
+        self._hashes = {}
+        self._upload_locks = {}
+        self.uploads = 0
+        self.cached_sends = 0
+
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _read_file(path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    async def content_hash(self, path):
+        """SHA-256 of path, recomputed only when its mtime or size changes"""
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._hashes.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        content_hash = await asyncio.get_running_loop().run_in_executor(None, self._hash_file, path)
+        self._hashes[path] = (signature, content_hash)
+        return content_hash
+
+    async def resolve_path(self, file_type):
+        """Local file for file_type: the admin panel's upload if present here, else the bundled one"""
+        path = await database.get_media_file(file_type)
+        if path and os.path.exists(path):
+            return path
+        if file_type == 'video' and os.path.exists(DEFAULT_VIDEO_PATH):
+            return DEFAULT_VIDEO_PATH
+        return None
+
+    async def send_video(self, send, file_type='video', **kwargs):
+        """
+        Send a video through send (e.g. message.reply_video) by file_id when possible
+        kwargs are passed through (caption, reply_markup, parse_mode...).
+        Returns: the sent Message, or None if there is no video file
+        """
+        path = await self.resolve_path(file_type)
+        if path is None:
+            return None
+        content_hash = await self.content_hash(path)
+
+        file_id = await database.get_media_file_id(content_hash)
+        if file_id:
+            try:
+                message = await send(video=file_id, **kwargs)
+                self.cached_sends += 1
+                return message
+            except BadRequest as e:
+                # file_ids belong to the bot that uploaded them (e.g. token changed)
+                logger.warning(f"⚠️ Stored file_id for {path} rejected ({e}), uploading again")
+                await database.forget_media_file_id(content_hash)
+
+        lock = self._upload_locks.setdefault(content_hash, asyncio.Lock())
+        async with lock:
+            # Someone else may have uploaded it while we waited
+            file_id = await database.get_media_file_id(content_hash)
+            if file_id:
+                self.cached_sends += 1
+                return await send(video=file_id, **kwargs)
+
+            # Bytes rather than the open file: a send retried after RetryAfter
+            # (outbound.py) must upload the whole file again
+            video = await asyncio.get_running_loop().run_in_executor(None, self._read_file, path)
+            message = await send(video=video, filename=os.path.basename(path), **kwargs)
+            self.uploads += 1
+            if message and message.video:
+                await database.save_media_file_id(file_type, path, content_hash, message.video.file_id)
+                logger.info(f"📤 Uploaded {path} once, later sends use its file_id")
+            return message
+
+    def stats(self):
+        """Upload vs. file_id send counters"""
+        return {'uploads': self.uploads, 'cached_sends': self.cached_sends}
+
+# Shared delivery for this process
+media = MediaDelivery()
+
+async def send_video(send, file_type='video', **kwargs):
+    """Shortcut for media.send_video"""
+    return await media.send_video(send, file_type=file_type, **kwargs)
@@ -334,3 +334,23 @@ TEXT_REFER = (
 TEXT_PIN = "🔐 PIN Security\n\nPlease enter your new 6-digit PIN to secure transactions."
 
 ERROR_GROUP_ONLY = "🚫 Please use /start to initialize the bot."
+
+# Group creation queue (group_queue.py)
+TEXT_GROUP_QUEUED = "⏳ <b>Creating Escrow Group. Please Wait...</b>\n\nYou are <b>#{position}</b> in the queue."
+TEXT_GROUP_CREATING = "🏗️ <b>Creating Escrow Group. Please Wait...</b>"
+TEXT_GROUP_RATE_LIMITED = "⏳ <b>Creating Escrow Group. Please Wait...</b>\n\nTelegram is rate limiting us, retrying in {seconds} seconds."
+ERROR_GROUP_QUEUE_FULL = "Too many escrow groups are being created right now. Please try again in a minute."
+ERROR_GROUP_RATE_LIMITED = "Telegram is rate limiting group creation. Please try again in {wait}."
+
+# Admin broadcasts (broadcast.py)
+TEXT_BROADCAST_USAGE = "<b>Usage: /broadcast &lt;message&gt;</b>\nFormatting in your message is kept. Send /broadcast without a message to see progress."
+TEXT_BROADCAST_QUEUED = "📣 <b>Broadcast #{broadcast_id} queued.</b>\nSend /broadcast to follow its progress."
+TEXT_BROADCAST_STATUS = (
+    "📣 <b>Broadcast #{id}</b> - {status}\n\n"
+    "✅ Sent: {sent}\n"
+    "🚫 Blocked: {blocked}\n"
+    "⚠️ Failed: {failed}\n"
+    "📊 Progress: {done}/{total}"
+)
+TEXT_BROADCAST_NONE = "<b>No broadcasts yet.</b>"
+ERROR_BROADCAST_QUEUE = "<b>Could not queue the broadcast. Please try again.</b>"
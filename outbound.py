@@ -0,0 +1,365 @@
+"""
+Outbound Message Scheduler
+Every send (bot-initiated messages and handler replies) goes through one
+scheduler that keeps under Telegram's flood limits (about 30 messages/s overall, about 1/s in a
+private chat and 20/min in a group) with token buckets, sends the most
+important messages first and backs off on RetryAfter instead of failing,
+so bursts go out as fast as Telegram allows without 429s.
+"""
+import os
+import heapq
+import asyncio
+import logging
+import itertools
+import functools
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Messages per second across all chats
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+# Messages per second in one private chat, and per minute in one group
+OUTBOUND_CHAT_RATE = float(os.getenv("OUTBOUND_CHAT_RATE", "1"))
+OUTBOUND_GROUP_RATE_PER_MINUTE = float(os.getenv("OUTBOUND_GROUP_RATE_PER_MINUTE", "20"))
+# RetryAfter retries per message before its send fails
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "5"))
+
+# Messages a chat may send back to back before its rate applies
+CHAT_BURST = 3
+GROUP_BURST = 5
+
+# Seconds between sweeps of idle per-chat state
+SWEEP_INTERVAL = 60
+
+# Priority classes (lower goes first)
+PRIORITY_TRANSACTION = 0   # deal information the parties are waiting for
+PRIORITY_REPLY = 1         # answers to commands
+PRIORITY_ANNOUNCEMENT = 2  # welcome and join announcements
+PRIORITY_BROADCAST = 3     # admin broadcasts / promotional text
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `capacity`"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+class _Job:
+    """One queued Bot API call and the future its caller waits on"""
+
+    __slots__ = ('send', 'priority', 'seq', 'attempts', 'future')
+
+    def __init__(self, send, priority, seq):
+        self.send = send
+        self.priority = priority
+        self.seq = seq
+        self.attempts = 0
+        self.future = asyncio.get_running_loop().create_future()
+
+class _Chat:
+    """Queued jobs and rate state of one chat"""
+
+    __slots__ = ('bucket', 'jobs', 'busy', 'key', 'timer', 'resume_at')
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.jobs = []      # heap of (priority, seq, job)
+        self.busy = False   # a send to this chat is in flight
+        self.key = None     # (priority, seq) of this chat's live entry in the ready heap
+        self.timer = None   # when this chat's timer entry fires
+        self.resume_at = 0  # RetryAfter pause for this chat
+
+class OutboundScheduler:
+    """
+    Sends queued Bot API calls within global and per-chat rate limits.
+
+    Chats whose bucket has a token sit in a ready heap ordered by their
+    most urgent message; chats waiting for a token (or a RetryAfter pause)
+    sit in a timer heap. One dispatcher task takes the most urgent ready
+    chat whenever the global bucket has a token, so a rate-limited group
+    never holds up other chats. A chat has at most one send in flight,
+    which keeps its messages in order.
+
+    RetryAfter in a group pauses that group (its 20/min limit was hit);
+    in a private chat it means the global limit was hit and pauses
+    everything. The message keeps its place and is retried after the pause.
+    """
+
+    def __init__(self, global_rate=OUTBOUND_GLOBAL_RATE, chat_rate=OUTBOUND_CHAT_RATE,
+                 group_rate_per_minute=OUTBOUND_GROUP_RATE_PER_MINUTE, max_retries=OUTBOUND_MAX_RETRIES):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate_per_minute / 60
+        self.max_retries = max_retries
+        self._seq = itertools.count()
+        self._chats = {}
+        self._ready = []    # (priority, seq, chat_id)
+        self._timers = []   # (fire_at, seq, chat_id)
+        self._bucket = None
+        self._paused_until = 0
+        self._wakeup = None
+        self._task = None
+        self._inflight = set()
+        self._next_sweep = 0
+        self.sent = 0
+        self.failed = 0
+        self.retry_afters = 0
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    @property
+    def depth(self):
+        """Messages waiting to be sent"""
+        return sum(len(chat.jobs) for chat in self._chats.values())
+
+    def start(self):
+        """Start the dispatcher (must be called inside the event loop)"""
+        if self._task:
+            return
+        loop = asyncio.get_running_loop()
+        self._bucket = TokenBucket(self.global_rate, self.global_rate, loop.time())
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._dispatch())
+        logger.info(f"✅ Outbound scheduler started ({self.global_rate:g} msg/s)")
+
+    async def stop(self):
+        """Stop dispatching and fail whatever is still queued"""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        inflight = list(self._inflight)
+        for pending in inflight:
+            pending.cancel()
+        await asyncio.gather(task, *inflight, return_exceptions=True)
+        for chat in self._chats.values():
+            for _, _, job in chat.jobs:
+                if not job.future.done():
+                    job.future.set_exception(RuntimeError("Bot is shutting down"))
+        self._chats.clear()
+        self._ready.clear()
+        self._timers.clear()
+
+    def enqueue(self, chat_id, send, priority=PRIORITY_REPLY):
+        """
+        Queue send, a coroutine function making one Bot API call to chat_id.
+        Returns: a future with send()'s result (or its exception)
+        """
+        job = _Job(send, priority, next(self._seq))
+        if not self.running:
+            asyncio.ensure_future(self._run_unscheduled(job))
+            return job.future
+
+        now = asyncio.get_running_loop().time()
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(self._chat_bucket(chat_id, now))
+        heapq.heappush(chat.jobs, (priority, job.seq, job))
+        self._schedule(chat_id, chat, now)
+        self._wakeup.set()
+        return job.future
+
+    async def send(self, chat_id, send, priority=PRIORITY_REPLY):
+        """enqueue() and wait for the result"""
+        return await self.enqueue(chat_id, send, priority)
+
+    async def send_message(self, bot, chat_id, text, priority=PRIORITY_REPLY, **kwargs):
+        """bot.send_message through the scheduler"""
+        return await self.send(
+            chat_id,
+            functools.partial(bot.send_message, chat_id=chat_id, text=text, **kwargs),
+            priority
+        )
+
+    async def _run_unscheduled(self, job):
+        # Before start() / after stop(): send right away
+        try:
+            result = await job.send()
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _chat_bucket(self, chat_id, now):
+        # Group and channel ids are negative
+        if chat_id < 0:
+            return TokenBucket(self.group_rate, GROUP_BURST, now)
+        return TokenBucket(self.chat_rate, CHAT_BURST, now)
+
+    def _schedule(self, chat_id, chat, now):
+        """Put chat in the ready heap or on a timer if it has something to send"""
+        if chat.busy or not chat.jobs:
+            return
+        wait = max(chat.bucket.wait_time(now), chat.resume_at - now)
+        if wait > 0:
+            if chat.timer is None:
+                chat.timer = now + wait
+                heapq.heappush(self._timers, (chat.timer, next(self._seq), chat_id))
+            return
+        priority, seq, _ = chat.jobs[0]
+        if chat.key != (priority, seq):
+            # A more urgent message arrived: the older entry goes stale and is skipped
+            chat.key = (priority, seq)
+            heapq.heappush(self._ready, (priority, seq, chat_id))
+
+    def _release_timers(self, now):
+        while self._timers and self._timers[0][0] <= now:
+            _, _, chat_id = heapq.heappop(self._timers)
+            chat = self._chats.get(chat_id)
+            if chat is not None:
+                chat.timer = None
+                self._schedule(chat_id, chat, now)
+
+    def _pop_ready(self):
+        """Most urgent ready chat, skipping stale entries"""
+        while self._ready:
+            priority, seq, chat_id = heapq.heappop(self._ready)
+            chat = self._chats.get(chat_id)
+            if chat is not None and chat.key == (priority, seq):
+                chat.key = None
+                return chat_id, chat
+        return None, None
+
+    def _sweep(self, now):
+        """Forget chats with nothing queued whose bucket has refilled"""
+        idle = [chat_id for chat_id, chat in self._chats.items()
+                if not chat.jobs and not chat.busy and chat.bucket.full(now)]
+        for chat_id in idle:
+            del self._chats[chat_id]
+        self._next_sweep = now + SWEEP_INTERVAL
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if now >= self._next_sweep:
+                self._sweep(now)
+            self._release_timers(now)
+
+            if not self._ready:
+                timeout = self._timers[0][0] - now if self._timers else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = max(self._bucket.wait_time(now), self._paused_until - now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            chat_id, chat = self._pop_ready()
+            if chat is None:
+                continue
+            _, _, job = heapq.heappop(chat.jobs)
+            if job.future.cancelled():
+                # The caller gave up waiting (e.g. its handler was cancelled)
+                self._schedule(chat_id, chat, now)
+                continue
+            chat.busy = True
+            chat.bucket.take(now)
+            self._bucket.take(now)
+            task = asyncio.create_task(self._deliver(chat_id, chat, job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _deliver(self, chat_id, chat, job):
+        loop = asyncio.get_running_loop()
+        try:
+            if job.future.cancelled():
+                # Given up on between dispatch and now: nothing was sent
+                return
+            result = await job.send()
+        except RetryAfter as e:
+            self.retry_afters += 1
+            job.attempts += 1
+            wait = e.retry_after
+            wait = wait.total_seconds() if hasattr(wait, 'total_seconds') else float(wait)
+            if job.attempts > self.max_retries:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                logger.warning(f"⏳ RetryAfter {wait:g}s sending to {chat_id}, retrying (attempt {job.attempts})")
+                resume_at = loop.time() + wait
+                if chat_id < 0:
+                    chat.resume_at = max(chat.resume_at, resume_at)
+                else:
+                    self._paused_until = max(self._paused_until, resume_at)
+                # Same (priority, seq): the message keeps its place in the chat
+                heapq.heappush(chat.jobs, (job.priority, job.seq, job))
+        except asyncio.CancelledError:
+            if not job.future.done():
+                job.future.set_exception(RuntimeError("Bot is shutting down"))
+            raise
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self.sent += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            chat.busy = False
+            if self._task is not None:
+                self._schedule(chat_id, chat, loop.time())
+                self._wakeup.set()
+
+    def stats(self):
+        """Queue depth and delivery counters"""
+        return {
+            'depth': self.depth,
+            'chats': len(self._chats),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retry_afters': self.retry_afters
+        }
+
+# Shared scheduler for this process
+scheduler = OutboundScheduler()
+
+async def reply(message, text, priority=PRIORITY_REPLY, **kwargs):
+    """message.reply_text through the shared scheduler (handlers answer with this)"""
+    return await scheduler.send(
+        message.chat_id,
+        functools.partial(message.reply_text, text, **kwargs),
+        priority
+    )
+
+def scheduled(send, chat_id, priority=PRIORITY_REPLY):
+    """
+    send (a Bot API coroutine function such as message.reply_video) wrapped
+    so each call goes through the shared scheduler
+    """
+    async def call(*args, **kwargs):
+        return await scheduler.send(chat_id, functools.partial(send, *args, **kwargs), priority)
+    return call
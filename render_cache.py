@@ -0,0 +1,79 @@
+"""
+Render Cache
+Message bodies the bot sends over and over, rendered once. Static texts
+are built at import; bodies built from data (the group welcome with its
+deal statistics) are memoized by their inputs and rebuilt only when
+async_database.data_versions shows those inputs changed, so the hot
+/start and welcome paths do no DB reads or formatting.
+"""
+import functools
+import messages
+import async_database as database
+from cache import TTLCache, MISSING
+
+# Changes made by other processes (admin panel) show up after this long;
+# matches table_cache's TTL for 'statistics'
+RENDER_TTL = 60
+
+# Static HTML bodies
+WELCOME_HTML = f"<b>{messages.WELCOME_TEXT}</b>"
+VIDEO_CAPTION_HTML = f"<b>{messages.TEXT_VIDEO_CAPTION}</b>"
+WHAT_IS_ESCROW_HTML = f"<b>{messages.TEXT_WHAT_IS_ESCROW}</b>"
+TERMS_HTML = f"<b>{messages.TEXT_TERMS}</b>"
+INSTRUCTIONS_HTML = f"<b>{messages.TEXT_INSTRUCTIONS}</b>"
+CONTACT_ADMIN_HTML = f"<b>{messages.TEXT_CONTACT_ADMIN}</b>"
+
+@functools.lru_cache(maxsize=128)
+def format_group_welcome(total_deals, disputes_resolved):
+    """GROUP_WELCOME_TEXT for one stats tuple"""
+    return messages.GROUP_WELCOME_TEXT.format(
+        total_deals=total_deals,
+        disputes_resolved=disputes_resolved
+    )
+
+class RenderCache:
+    """name -> rendered body, valid while the data_versions of its topics are unchanged"""
+
+    def __init__(self, ttl=RENDER_TTL):
+        self._rendered = TTLCache(default_ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, name, topics, build):
+        """
+        Rendered body for name, calling build() (a coroutine function) on a miss
+        topics: data_versions keys the body is made from ('statistics', 'content:<key>')
+        """
+        versions = tuple(database.data_versions[topic] for topic in topics)
+        cached = self._rendered.get(name)
+        if cached is not MISSING and cached[0] == versions:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        body = await build()
+        self._rendered.set(name, (versions, body))
+        return body
+
+    def invalidate(self, name=None):
+        """Drop one rendered body, or all of them"""
+        if name is None:
+            self._rendered.clear()
+        else:
+            self._rendered.invalidate(name)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+# Shared cache for this process
+render_cache = RenderCache()
+
+async def _build_group_welcome():
+    stats = await database.get_statistics()
+    return format_group_welcome(
+        stats.get('total_deals', 5542),
+        stats.get('disputes_resolved', 158)
+    )
+
+async def group_welcome_text():
+    """GROUP_WELCOME_TEXT with the current deal statistics"""
+    return await render_cache.get('group_welcome', ('statistics',), _build_group_welcome)
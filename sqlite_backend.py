@@ -0,0 +1,539 @@
+"""
+SQLite Storage Backend
+Local stand-in for Supabase, selected with DATABASE_BACKEND=sqlite.
+
+database.py and async_database.py only talk to storage through the
+PostgREST query-builder calls (table().select().eq().execute(), rpc(), ...).
+This module implements that same subset on top of a local SQLite file in
+WAL mode, so every database function works unchanged - offline, for load
+tests, or as a low-latency single-node production store.
+
+The schema is translated from supabase_schema.sql at connect time; the
+Postgres functions in that file are provided as Python RPC functions below.
+"""
+import json
+import os
+import re
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'supabase_schema.sql')
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Postgres -> SQLite column type rewrites (applied in order)
+TYPE_REWRITES = [
+    (re.compile(r'\b(?:BIG)?SERIAL\s+PRIMARY\s+KEY\b', re.I), 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    (re.compile(r'\bTIMESTAMP\s+WITH\s+TIME\s+ZONE\b|\bTIMESTAMPTZ\b|\bTIMESTAMP\b', re.I), 'TEXT'),
+    (re.compile(r'\bDEFAULT\s+NOW\(\)', re.I), "DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))"),
+    (re.compile(r'\bJSONB?\b', re.I), 'TEXT'),
+    (re.compile(r'::\w+'), ''),
+]
+
+# Postgres type casts (e.g. '{}'::jsonb) also appear in INSERT statements
+CAST = TYPE_REWRITES[-1][0]
+
+# INSERT INTO <table> seed rows of the schema
+INSERT_INTO = re.compile(r'INSERT INTO (\w+)', re.I)
+
+# ALTER TABLE <table> ADD COLUMN [IF NOT EXISTS] <column definition>
+ADD_COLUMN = re.compile(r'ALTER TABLE (\w+)\s+ADD COLUMN\s+(?:IF NOT EXISTS\s+)?(\w+)(.*)$', re.S | re.I)
+
+class SQLiteError(Exception):
+    """Raised for queries the SQLite backend cannot express"""
+
+class Response:
+    """Mirror of postgrest's APIResponse (only .data and .count are used)"""
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+# -------------------------------------------------------------------------
+# Schema translation
+# -------------------------------------------------------------------------
+
+def _split_statements(sql):
+    """Split SQL into statements, ignoring comments and ; inside $$ bodies"""
+    sql = re.sub(r'--[^\n]*', '', sql)
+    statements, current, in_body = [], [], False
+    for part in re.split(r'(\$\$|;)', sql):
+        if part == '$$':
+            in_body = not in_body
+            current.append(part)
+        elif part == ';' and not in_body:
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(part)
+    return statements
+
+def _split_columns(body):
+    """Split a CREATE TABLE body on top-level commas"""
+    columns, depth, current = [], 0, []
+    for char in body:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == ',' and depth == 0:
+            columns.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    if ''.join(current).strip():
+        columns.append(''.join(current).strip())
+    return columns
+
+def translate_schema(sql):
+    """
+    Translate supabase_schema.sql into SQLite DDL.
+
+    Returns (statements, tables) where tables maps each table name to
+    {'primary_key': [...], 'json_columns': {...}}. ALTER TABLE ... ADD COLUMN
+    becomes a plain ADD COLUMN (SQLite has no IF NOT EXISTS there; the
+    client skips it when the column exists). Functions, triggers and
+    policies are Postgres-only and skipped.
+    """
+    statements, tables = [], {}
+    for statement in _split_statements(sql):
+        head = ' '.join(statement.split()[:3]).upper()
+        if head.startswith('CREATE TABLE'):
+            match = re.match(r'CREATE TABLE IF NOT EXISTS (\w+)\s*\((.*)\)\s*$', statement, re.S | re.I)
+            if not match:
+                raise SQLiteError(f"Cannot translate: {statement[:60]}")
+            name, body = match.groups()
+            info = {'primary_key': [], 'json_columns': set()}
+            columns = []
+            for column in _split_columns(body):
+                table_pk = re.match(r'PRIMARY KEY\s*\((.*)\)', column, re.I)
+                if table_pk:
+                    info['primary_key'] = [c.strip() for c in table_pk.group(1).split(',')]
+                elif not re.match(r'(UNIQUE|CONSTRAINT|CHECK|FOREIGN)\b', column, re.I):
+                    column_name = column.split()[0]
+                    if re.search(r'\bJSONB?\b', column, re.I):
+                        info['json_columns'].add(column_name)
+                    if re.search(r'\bPRIMARY KEY\b', column, re.I):
+                        info['primary_key'] = [column_name]
+                for pattern, replacement in TYPE_REWRITES:
+                    column = pattern.sub(replacement, column)
+                columns.append(column)
+            tables[name] = info
+            statements.append(f"CREATE TABLE IF NOT EXISTS {name} (\n    " + ',\n    '.join(columns) + "\n)")
+        elif head.startswith(('CREATE INDEX', 'CREATE UNIQUE INDEX', 'INSERT INTO')):
+            statements.append(CAST.sub('', statement))
+        elif head.startswith('ALTER TABLE'):
+            match = ADD_COLUMN.match(statement)
+            if not match:
+                continue
+            name, column_name, definition = match.groups()
+            if re.search(r'\bJSONB?\b', definition, re.I) and name in tables:
+                tables[name]['json_columns'].add(column_name)
+            for pattern, replacement in TYPE_REWRITES:
+                definition = pattern.sub(replacement, definition)
+            statements.append(f"ALTER TABLE {name} ADD COLUMN {column_name}{definition}")
+    return statements, tables
+
+# -------------------------------------------------------------------------
+# RPC functions (SQLite versions of the SQL functions in supabase_schema.sql)
+# -------------------------------------------------------------------------
+
+RPC_FUNCTIONS = {}
+
+def rpc_function(name):
+    """Register a Python implementation of a Postgres function"""
+    def decorator(func):
+        RPC_FUNCTIONS[name] = func
+        return func
+    return decorator
+
+@rpc_function('increment_stat')
+def _increment_stat(conn, stat_key, amount=1):
+    row = conn.execute(
+        "INSERT INTO statistics (key, value) VALUES (?, ?) "
+        "ON CONFLICT (key) DO UPDATE SET value = statistics.value + excluded.value, "
+        "updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') RETURNING value",
+        (stat_key, amount)
+    ).fetchone()
+    return row[0]
+
+@rpc_function('increment_stats')
+def _increment_stats(conn, deltas):
+    for key, amount in deltas.items():
+        _increment_stat(conn, key, int(amount))
+    return None
+
+@rpc_function('bot_users_page')
+def _bot_users_page(conn, after_started_at=None, after_user_id=None, page_size=50):
+    rows = conn.execute(
+        "SELECT * FROM bot_users WHERE ? IS NULL OR (started_at, user_id) < (?, ?) "
+        "ORDER BY started_at DESC, user_id DESC LIMIT ?",
+        (after_started_at, after_started_at, after_user_id, page_size)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+@rpc_function('claim_pool_group')
+def _claim_pool_group(conn, claim_deal_id, claim_bot_username):
+    # BEGIN IMMEDIATE already serializes claims, so no SKIP LOCKED needed
+    rows = conn.execute(
+        "UPDATE group_pool SET status = 'claimed', deal_id = ?, "
+        "claimed_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') "
+        "WHERE id = (SELECT id FROM group_pool WHERE status = 'ready' AND bot_username = ? "
+        "ORDER BY id LIMIT 1) RETURNING *",
+        (claim_deal_id, claim_bot_username)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+@rpc_function('claim_broadcast')
+def _claim_broadcast(conn, claim_owner, lease_seconds):
+    rows = conn.execute(
+        "UPDATE broadcasts SET status = 'running', owner = ?, "
+        "lease_until = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now', ? || ' seconds'), "
+        "updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') "
+        "WHERE id = (SELECT id FROM broadcasts WHERE status = 'pending' "
+        "OR (status = 'running' AND (owner = ? OR lease_until IS NULL "
+        "OR lease_until < strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))) "
+        "ORDER BY id LIMIT 1) RETURNING *",
+        (claim_owner, f"+{int(lease_seconds)}", claim_owner)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+@rpc_function('renew_broadcast_lease')
+def _renew_broadcast_lease(conn, renew_id, renew_owner, lease_seconds):
+    rows = conn.execute(
+        "UPDATE broadcasts SET "
+        "lease_until = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now', ? || ' seconds'), "
+        "updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') "
+        "WHERE id = ? AND owner = ? AND status = 'running' RETURNING *",
+        (f"+{int(lease_seconds)}", renew_id, renew_owner)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+# SQLite versions of the plpgsql triggers in supabase_schema.sql
+TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS bot_users_count_insert AFTER INSERT ON bot_users
+    BEGIN UPDATE row_counts SET total = total + 1 WHERE table_name = 'bot_users'; END""",
+    """CREATE TRIGGER IF NOT EXISTS bot_users_count_delete AFTER DELETE ON bot_users
+    BEGIN UPDATE row_counts SET total = total - 1 WHERE table_name = 'bot_users'; END""",
+]
+
+# -------------------------------------------------------------------------
+# Query builder (PostgREST subset)
+# -------------------------------------------------------------------------
+
+def _identifier(name):
+    name = name.strip()
+    if not IDENTIFIER.match(name):
+        raise SQLiteError(f"Invalid identifier: {name!r}")
+    return f'"{name}"'
+
+def _to_sql_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+class _Query:
+    """Chainable query mirroring postgrest's request builders"""
+
+    def __init__(self, client, table):
+        _identifier(table)
+        self._client = client
+        self.table = table
+        self.operation = 'select'
+        self.columns = ['*']
+        self.payload = None
+        self.filters = []
+        self.ordering = []
+        self.limit_value = None
+        self.offset_value = None
+        self.ignore_duplicates = False
+        self.on_conflict = None
+
+    # Operations
+    def select(self, *columns, count=None):
+        self.operation = 'select'
+        joined = ','.join(columns) or '*'
+        self.columns = [c.strip() for c in joined.split(',') if c.strip()]
+        return self
+
+    def insert(self, json, **kwargs):
+        self.operation = 'insert'
+        self.payload = json if isinstance(json, list) else [json]
+        return self
+
+    def upsert(self, json, ignore_duplicates=False, on_conflict='', **kwargs):
+        self.operation = 'upsert'
+        self.payload = json if isinstance(json, list) else [json]
+        self.ignore_duplicates = ignore_duplicates
+        self.on_conflict = [c.strip() for c in on_conflict.split(',')] if on_conflict else None
+        return self
+
+    def update(self, json, **kwargs):
+        self.operation = 'update'
+        self.payload = json
+        return self
+
+    def delete(self, **kwargs):
+        self.operation = 'delete'
+        return self
+
+    # Filters
+    def _filter(self, column, operator, value):
+        self.filters.append((f"{_identifier(column)} {operator} ?", [_to_sql_value(value)]))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, '=', value)
+
+    def neq(self, column, value):
+        return self._filter(column, '!=', value)
+
+    def gt(self, column, value):
+        return self._filter(column, '>', value)
+
+    def gte(self, column, value):
+        return self._filter(column, '>=', value)
+
+    def lt(self, column, value):
+        return self._filter(column, '<', value)
+
+    def lte(self, column, value):
+        return self._filter(column, '<=', value)
+
+    def like(self, column, pattern):
+        return self._filter(column, 'LIKE', pattern.replace('*', '%'))
+
+    def in_(self, column, values):
+        values = list(values)
+        if not values:
+            self.filters.append(("0", []))
+            return self
+        placeholders = ', '.join('?' for _ in values)
+        self.filters.append((f"{_identifier(column)} IN ({placeholders})", [_to_sql_value(v) for v in values]))
+        return self
+
+    def is_(self, column, value):
+        if value in (None, 'null'):
+            self.filters.append((f"{_identifier(column)} IS NULL", []))
+        else:
+            self._filter(column, 'IS', value)
+        return self
+
+    # Modifiers
+    def order(self, column, desc=False, nullsfirst=False):
+        self.ordering.append(f"{_identifier(column)} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, size):
+        self.limit_value = int(size)
+        return self
+
+    def range(self, start, end):
+        self.offset_value = int(start)
+        self.limit_value = int(end) - int(start) + 1
+        return self
+
+    def execute(self):
+        return self._client._execute_query(self)
+
+class _AsyncQuery(_Query):
+    """
+    Awaitable variant, run on the client's worker thread: a write lock held
+    by another process (busy_timeout) must not freeze the event loop
+    """
+
+    async def execute(self):
+        return await self._client._run(self._client._execute_query, self)
+
+class _RPC:
+    def __init__(self, client, name, params):
+        self._client = client
+        self.name = name
+        self.params = params or {}
+
+    def execute(self):
+        return self._client._execute_rpc(self)
+
+class _AsyncRPC(_RPC):
+    async def execute(self):
+        return await self._client._run(self._client._execute_rpc, self)
+
+# -------------------------------------------------------------------------
+# Clients
+# -------------------------------------------------------------------------
+
+class SQLiteClient:
+    """Synchronous client (drop-in for supabase.Client in database.py)"""
+
+    query_class = _Query
+    rpc_class = _RPC
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute("PRAGMA case_sensitive_like=ON")
+        with open(SCHEMA_FILE, encoding='utf-8') as f:
+            statements, self.tables = translate_schema(f.read())
+        with self._transaction() as conn:
+            existing = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for statement in statements + TRIGGERS:
+                match = ADD_COLUMN.match(statement)
+                if match and self._has_column(conn, match.group(1), match.group(2)):
+                    continue
+                match = INSERT_INTO.match(statement)
+                if match and match.group(1) in existing:
+                    # Seed rows go into new tables only, like running the schema
+                    # once on Supabase: deleted rows (e.g. admin_password) stay deleted
+                    continue
+                conn.execute(statement)
+
+    @staticmethod
+    def _has_column(conn, table, column):
+        return any(row['name'] == column for row in conn.execute(f"PRAGMA table_info({_identifier(table)})"))
+
+    def table(self, name):
+        return self.query_class(self, name)
+
+    from_ = table
+
+    def rpc(self, fn, params=None):
+        return self.rpc_class(self, fn, params)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _decode(self, table, rows):
+        json_columns = self.tables.get(table, {}).get('json_columns', ())
+        result = []
+        for row in rows:
+            row = dict(row)
+            for column in json_columns:
+                if isinstance(row.get(column), str):
+                    row[column] = json.loads(row[column])
+            result.append(row)
+        return result
+
+    def _where(self, query):
+        if not query.filters:
+            return '', []
+        clauses = ' AND '.join(clause for clause, _ in query.filters)
+        params = [p for _, values in query.filters for p in values]
+        return f" WHERE {clauses}", params
+
+    def _execute_query(self, query):
+        table = _identifier(query.table)
+        where, params = self._where(query)
+
+        if query.operation == 'select':
+            columns = ', '.join('*' if c == '*' else _identifier(c) for c in query.columns)
+            sql = f"SELECT {columns} FROM {table}{where}"
+            if query.ordering:
+                sql += " ORDER BY " + ', '.join(query.ordering)
+            if query.limit_value is not None:
+                sql += f" LIMIT {query.limit_value}"
+                if query.offset_value:
+                    sql += f" OFFSET {query.offset_value}"
+            with self._lock:
+                rows = self._conn.execute(sql, params).fetchall()
+            return Response(self._decode(query.table, rows))
+
+        if query.operation in ('insert', 'upsert'):
+            data = []
+            with self._transaction() as conn:
+                for row in query.payload:
+                    columns = list(row)
+                    sql = (f"INSERT INTO {table} ({', '.join(_identifier(c) for c in columns)}) "
+                           f"VALUES ({', '.join('?' for _ in columns)})")
+                    if query.operation == 'upsert':
+                        conflict = query.on_conflict or self.tables.get(query.table, {}).get('primary_key')
+                        if not conflict:
+                            raise SQLiteError(f"No conflict target for upsert into {query.table}")
+                        updates = [c for c in columns if c not in conflict]
+                        sql += f" ON CONFLICT ({', '.join(_identifier(c) for c in conflict)})"
+                        if query.ignore_duplicates or not updates:
+                            sql += " DO NOTHING"
+                        else:
+                            sql += " DO UPDATE SET " + ', '.join(
+                                f"{_identifier(c)} = excluded.{_identifier(c)}" for c in updates
+                            )
+                    sql += " RETURNING *"
+                    data.extend(conn.execute(sql, [_to_sql_value(row[c]) for c in columns]).fetchall())
+            return Response(self._decode(query.table, data))
+
+        if query.operation == 'update':
+            columns = list(query.payload)
+            assignments = ', '.join(f"{_identifier(c)} = ?" for c in columns)
+            values = [_to_sql_value(query.payload[c]) for c in columns]
+            with self._transaction() as conn:
+                rows = conn.execute(f"UPDATE {table} SET {assignments}{where} RETURNING *", values + params).fetchall()
+            return Response(self._decode(query.table, rows))
+
+        if query.operation == 'delete':
+            with self._transaction() as conn:
+                rows = conn.execute(f"DELETE FROM {table}{where} RETURNING *", params).fetchall()
+            return Response(self._decode(query.table, rows))
+
+        raise SQLiteError(f"Unsupported operation: {query.operation}")
+
+    def _execute_rpc(self, call):
+        func = RPC_FUNCTIONS.get(call.name)
+        if func is None:
+            raise SQLiteError(f"Unknown RPC function: {call.name}")
+        with self._transaction() as conn:
+            return Response(func(conn, **call.params))
+
+class AsyncSQLiteClient(SQLiteClient):
+    """Awaitable client (drop-in for AsyncPostgrestClient in async_database.py)"""
+
+    query_class = _AsyncQuery
+    rpc_class = _AsyncRPC
+
+    def __init__(self, path):
+        super().__init__(path)
+        # One thread owns this client's connection; queries run in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+
+    async def _run(self, func, call):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, call)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        super().close()
+
+    async def aclose(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+def create_client(path):
+    """Sync client for database.py"""
+    return SQLiteClient(path)
+
+def create_async_client(path):
+    """Async client for async_database.py"""
+    return AsyncSQLiteClient(path)
@@ -55,6 +55,17 @@ CREATE TABLE IF NOT EXISTS media_files (
     uploaded_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Telegram file_id of each uploaded asset, keyed by the SHA-256 of its
+-- content (media_delivery.py). Kept apart from media_files so the bot never
+-- changes which file the admin panel made current.
+CREATE TABLE IF NOT EXISTS media_file_ids (
+    content_hash TEXT PRIMARY KEY,
+    file_id TEXT NOT NULL,
+    file_type TEXT,
+    file_path TEXT,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
 -- Editable content table
 CREATE TABLE IF NOT EXISTS editable_content (
     key TEXT PRIMARY KEY,
@@ -62,6 +73,34 @@ CREATE TABLE IF NOT EXISTS editable_content (
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Crypto addresses table (escrow wallets managed from the admin panel)
+CREATE TABLE IF NOT EXISTS crypto_addresses (
+    id SERIAL PRIMARY KEY,
+    currency TEXT NOT NULL,
+    address TEXT NOT NULL,
+    network TEXT DEFAULT '',
+    label TEXT DEFAULT '',
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Telegram sessions table (admin accounts used for group creation)
+CREATE TABLE IF NOT EXISTS telegram_sessions (
+    id SERIAL PRIMARY KEY,
+    session_string TEXT NOT NULL,
+    phone TEXT UNIQUE NOT NULL,
+    user_id BIGINT,
+    username TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    -- Input peers resolved by this account (entity_cache.py)
+    entity_cache JSONB,
+    created_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Existing installs created telegram_sessions before entity_cache was added
+ALTER TABLE telegram_sessions ADD COLUMN IF NOT EXISTS entity_cache JSONB;
+
 -- Insert default config
 INSERT INTO config (key, value) VALUES 
     ('admin_username', 'MiddleCryptoSupport'),
@@ -74,8 +113,169 @@ INSERT INTO statistics (key, value) VALUES
     ('disputes_resolved', 158)
 ON CONFLICT (key) DO NOTHING;
 
+-- Atomic statistic increment (database.increment_stat)
+-- Single statement, so concurrent increments never overwrite each other
+CREATE OR REPLACE FUNCTION increment_stat(stat_key TEXT, amount INTEGER DEFAULT 1)
+RETURNS INTEGER AS $$
+    INSERT INTO statistics (key, value) VALUES (stat_key, amount)
+    ON CONFLICT (key) DO UPDATE
+        SET value = statistics.value + EXCLUDED.value, updated_at = NOW()
+    RETURNING value;
+$$ LANGUAGE sql;
+
+-- Batched increments flushed by async_database.flush_stats, e.g. {"total_deals": 3}
+CREATE OR REPLACE FUNCTION increment_stats(deltas JSONB)
+RETURNS VOID AS $$
+    INSERT INTO statistics (key, value)
+    SELECT d.key, d.value::INTEGER FROM jsonb_each_text(deltas) AS d
+    ON CONFLICT (key) DO UPDATE
+        SET value = statistics.value + EXCLUDED.value, updated_at = NOW();
+$$ LANGUAGE sql;
+
+-- Pre-created escrow groups waiting for a deal (group_pool.py)
+CREATE TABLE IF NOT EXISTS group_pool (
+    id SERIAL PRIMARY KEY,
+    group_id BIGINT UNIQUE NOT NULL,
+    access_hash BIGINT,
+    creator_id BIGINT,
+    invite_link TEXT,
+    bot_username TEXT,
+    status TEXT DEFAULT 'ready',
+    deal_id TEXT,
+    created_at TIMESTAMP DEFAULT NOW(),
+    claimed_at TIMESTAMP
+);
+
+-- Admin broadcasts to every bot user, queued by the admin panel and sent by
+-- the bot (broadcast.py). status: pending -> running -> done, or cancelled.
+-- next_cursor is the bot_users_page keyset after the last finished page,
+-- so an interrupted broadcast resumes where it stopped.
+-- owner is the bot process sending it; it holds the broadcast until
+-- lease_until and keeps extending that while it runs (claim_broadcast)
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id SERIAL PRIMARY KEY,
+    message TEXT NOT NULL,
+    status TEXT DEFAULT 'pending',
+    total INTEGER DEFAULT 0,
+    sent INTEGER DEFAULT 0,
+    blocked INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    next_cursor TEXT,
+    owner TEXT,
+    lease_until TIMESTAMP,
+    created_at TIMESTAMP DEFAULT NOW(),
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Existing installs created broadcasts before leases were added
+ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS owner TEXT;
+ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS lease_until TIMESTAMP;
+
+-- Outcome per user and broadcast: 'sent', 'blocked' (user blocked the bot or
+-- deleted their account) or 'failed'
+CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+    broadcast_id INTEGER NOT NULL,
+    user_id BIGINT NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    delivered_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (broadcast_id, user_id)
+);
+
+-- Maintained row counts (database.count_bot_users reads this instead of COUNT(*))
+CREATE TABLE IF NOT EXISTS row_counts (
+    table_name TEXT PRIMARY KEY,
+    total BIGINT DEFAULT 0
+);
+
+-- Backfill once from the existing rows; the trigger below keeps it current
+INSERT INTO row_counts (table_name, total)
+SELECT 'bot_users', COUNT(*) FROM bot_users WHERE true
+ON CONFLICT (table_name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION count_bot_users_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE row_counts
+    SET total = total + (CASE WHEN TG_OP = 'INSERT' THEN 1 ELSE -1 END)
+    WHERE table_name = 'bot_users';
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bot_users_count ON bot_users;
+CREATE TRIGGER bot_users_count AFTER INSERT OR DELETE ON bot_users
+    FOR EACH ROW EXECUTE FUNCTION count_bot_users_change();
+
+-- Keyset page of bot users, newest first (database.get_bot_users_page)
+-- Pass the (started_at, user_id) of the last row seen; NULL for the first page
+CREATE OR REPLACE FUNCTION bot_users_page(
+    after_started_at TIMESTAMP DEFAULT NULL,
+    after_user_id BIGINT DEFAULT NULL,
+    page_size INTEGER DEFAULT 50
+)
+RETURNS SETOF bot_users AS $$
+    SELECT * FROM bot_users
+    WHERE after_started_at IS NULL
+       OR (started_at, user_id) < (after_started_at, after_user_id)
+    ORDER BY started_at DESC, user_id DESC
+    LIMIT page_size;
+$$ LANGUAGE sql STABLE;
+
+-- Hand the oldest ready pool group to a deal in one statement
+-- SKIP LOCKED lets concurrent claims take different groups instead of waiting
+CREATE OR REPLACE FUNCTION claim_pool_group(claim_deal_id TEXT, claim_bot_username TEXT)
+RETURNS SETOF group_pool AS $$
+    UPDATE group_pool
+    SET status = 'claimed', deal_id = claim_deal_id, claimed_at = NOW()
+    WHERE id = (
+        SELECT id FROM group_pool
+        WHERE status = 'ready' AND bot_username = claim_bot_username
+        ORDER BY id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- Take the oldest broadcast to send: a pending one, one this owner already
+-- holds, or a running one whose owner stopped renewing its lease (crashed).
+-- SKIP LOCKED lets replicas polling at the same time take different rows.
+CREATE OR REPLACE FUNCTION claim_broadcast(claim_owner TEXT, lease_seconds INTEGER)
+RETURNS SETOF broadcasts AS $$
+    UPDATE broadcasts
+    SET status = 'running', owner = claim_owner,
+        lease_until = NOW() + make_interval(secs => lease_seconds), updated_at = NOW()
+    WHERE id = (
+        SELECT id FROM broadcasts
+        WHERE status = 'pending'
+           OR (status = 'running' AND (owner = claim_owner OR lease_until IS NULL OR lease_until < NOW()))
+        ORDER BY id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- Extend the owner's lease; no row back means the broadcast was cancelled
+-- or another process took it over
+CREATE OR REPLACE FUNCTION renew_broadcast_lease(renew_id INTEGER, renew_owner TEXT, lease_seconds INTEGER)
+RETURNS SETOF broadcasts AS $$
+    UPDATE broadcasts
+    SET lease_until = NOW() + make_interval(secs => lease_seconds), updated_at = NOW()
+    WHERE id = renew_id AND owner = renew_owner AND status = 'running'
+    RETURNING *;
+$$ LANGUAGE sql;
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_users_user_id ON users(user_id);
 CREATE INDEX IF NOT EXISTS idx_deals_group_id ON deals(group_id);
 CREATE INDEX IF NOT EXISTS idx_bot_users_username ON bot_users(username);
+CREATE INDEX IF NOT EXISTS idx_bot_users_started_at ON bot_users(started_at DESC, user_id DESC);
 CREATE INDEX IF NOT EXISTS idx_media_files_type ON media_files(file_type);
+CREATE INDEX IF NOT EXISTS idx_crypto_addresses_currency ON crypto_addresses(currency);
+CREATE INDEX IF NOT EXISTS idx_telegram_sessions_updated_at ON telegram_sessions(updated_at);
+CREATE INDEX IF NOT EXISTS idx_group_pool_status ON group_pool(bot_username, status);
+CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts(status, id);
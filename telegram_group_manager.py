@@ -3,16 +3,23 @@ Telegram Group Manager
 Creates escrow groups using admin session from Supabase database
 """
 import os
+import math
+import time
+import asyncio
 import logging
 from telethon import TelegramClient
 from telethon.sessions import StringSession
-from telethon.tl.functions.channels import CreateChannelRequest, InviteToChannelRequest
-from telethon.tl.types import InputPeerUser
-import database
+from telethon.errors import FloodWaitError
+from telethon.tl.functions.channels import CreateChannelRequest, InviteToChannelRequest, EditAdminRequest, EditTitleRequest, DeleteHistoryRequest
+from telethon.tl.functions.messages import ExportChatInviteRequest
+from telethon.tl.types import InputPeerUser, InputChannel, InputPeerChannel, InputUserSelf, ChatAdminRights
+import async_database as database
+from cache import normalize_group_id
+from entity_cache import EntityCache
 
 logger = logging.getLogger(__name__)
 
-def get_credentials():
+async def get_credentials():
     """
     Get Telethon credentials from environment or database
     Returns: (api_id, api_hash) or (None, None)
@@ -24,8 +31,8 @@ def get_credentials():
     # If not in env, try database
     if not api_id or not api_hash:
         try:
-            api_id = database.get_config('telegram_api_id')
-            api_hash = database.get_config('telegram_api_hash')
+            api_id = await database.get_config('telegram_api_id')
+            api_hash = await database.get_config('telegram_api_hash')
         except Exception as e:
             logger.error(f"Error fetching API credentials from DB: {e}")
             
@@ -39,13 +46,13 @@ def get_credentials():
     logger.warning("API_ID or API_HASH not found in env or DB")
     return None, None
 
-def get_admin_session():
+async def get_admin_session():
     """
     Fetch the most recent admin Telegram session from Supabase
     Returns: session_string or None
     """
     try:
-        session_data = database.get_telegram_admin_session()
+        session_data = await database.get_telegram_admin_session()
         if session_data and session_data.get('session_string'):
             logger.info(f"✅ Found admin session for User ID: {session_data.get('user_id')}")
             return session_data['session_string']
@@ -56,151 +63,448 @@ def get_admin_session():
         logger.error(f"❌ Error fetching admin session: {e}")
         return None
 
-async def create_escrow_group(deal_id, bot_username=None):
+# Seconds between checks for new or changed admin sessions / API credentials
+ADMIN_SESSION_CHECK_INTERVAL = int(os.getenv("ADMIN_SESSION_CHECK_INTERVAL", "60"))
+
+class AdminClientError(Exception):
     """
-    Create a Telegram escrow group using admin session
+    No admin account can serve the call; the message is safe to show to the user.
+    flood_wait is set when every account is in a FloodWait cooldown.
     """
-    # Get credentials dynamically
-    api_id, api_hash = get_credentials()
-    
-    if not api_id or not api_hash:
+
+    def __init__(self, message, flood_wait=None):
+        super().__init__(message)
+        self.flood_wait = flood_wait
+
+class AdminCredentials:
+    """
+    API credentials and admin session rows, resolved once and kept in memory.
+
+    refresh() is a no-op for check_interval seconds. After that it only
+    reads the (id, updated_at) watermark of telegram_sessions and reloads
+    the full rows when it moved (a session was saved or deleted). A save or
+    delete made through this process, or invalidate(), forces a reload.
+    """
+
+    def __init__(self, check_interval=ADMIN_SESSION_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self.api_id = None
+        self.api_hash = None
+        self.sessions = []
+        self.watermark = None
+        self._checked_at = None
+        self._version = None
+
+    @property
+    def stale(self):
+        return (
+            self._checked_at is None
+            or self._version != database.telegram_sessions_version
+            or time.monotonic() - self._checked_at >= self.check_interval
+        )
+
+    def invalidate(self):
+        """Reload everything on the next refresh()"""
+        self._checked_at = None
+        self.watermark = None
+
+    async def refresh(self, force=False):
+        """
+        Re-check credentials and sessions if due (or forced)
+        Returns: True if either changed (raises AdminClientError if missing)
+        """
+        if force:
+            self.invalidate()
+        if not self.stale:
+            return False
+
+        version = database.telegram_sessions_version
+        api_id, api_hash = await get_credentials()
+        if not api_id or not api_hash:
+            raise AdminClientError('Configuration Error: API ID or Hash is missing. Please set them in the Admin Dashboard > Settings > Telegram.')
+        changed = (api_id, api_hash) != (self.api_id, self.api_hash)
+        self.api_id, self.api_hash = api_id, api_hash
+
+        watermark = await database.get_telegram_session_versions()
+        if watermark is None or watermark != self.watermark:
+            rows = await database.get_telegram_sessions() or []
+            self.sessions = [row for row in rows if row.get('session_string')]
+            self.watermark = watermark
+            changed = True
+
+        self._checked_at = time.monotonic()
+        self._version = version
+        if not self.sessions:
+            raise AdminClientError('No admin session found. Please login via admin panel first.')
+        return changed
+
+class AdminAccount:
+    """One logged-in admin account: its client, FloodWait cooldown and health counters"""
+
+    def __init__(self, session_row, api_id, api_hash):
+        self.session_string = session_row['session_string']
+        self.user_id = session_row.get('user_id')
+        self.username = session_row.get('username') or session_row.get('phone')
+        self.session_id = session_row.get('id')
+        self.client = TelegramClient(StringSession(self.session_string), api_id, api_hash)
+        self._stored_entities = session_row.get('entity_cache')
+        self.entities = EntityCache(self.user_id, self._stored_entities)
+        self.authorized = True
+        self.last_used = 0.0
+        self.cooldown_until = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.flood_waits = 0
+        self.last_error = None
+
+    @property
+    def available(self):
+        """Authorized and not cooling down after a FloodWait"""
+        return self.authorized and time.monotonic() >= self.cooldown_until
+
+    async def ensure_connected(self):
+        """Connect if needed; returns False (and retires the account) if the session is no longer authorized"""
+        if self.client.is_connected():
+            return True
+        await self.client.connect()
+        if not await self.client.is_user_authorized():
+            self.authorized = False
+            self.last_error = 'Session expired'
+            await self.disconnect()
+            logger.warning(f"⚠️ Admin session for {self.username or self.user_id} expired")
+            return False
+        if self.user_id is None:
+            self.user_id = (await self.client.get_me()).id
+            self.entities = EntityCache(self.user_id, self._stored_entities)
+        logger.info(f"✅ Admin Telegram client connected as {self.user_id}")
+        return True
+
+    async def resolve_user(self, username):
+        """InputPeerUser for username, from the entity cache when possible"""
+        peer = self.entities.get_user(username)
+        if peer is None:
+            peer = await self.client.get_input_entity(username)
+            self.entities.put_user(username, peer)
+        return peer
+
+    async def save_entities(self):
+        """Persist newly resolved peers alongside the session"""
+        if not self.entities.dirty or self.session_id is None:
+            return
+        self.entities.dirty = False
+        if not await database.save_entity_cache(self.session_id, self.entities.to_dict()):
+            self.entities.dirty = True
+
+    def record_success(self):
+        self.successes += 1
+
+    def record_failure(self, error):
+        self.failures += 1
+        self.last_error = str(error)
+
+    def record_flood_wait(self, seconds):
+        """Skip this account until Telegram's wait is over"""
+        self.flood_waits += 1
+        self.cooldown_until = time.monotonic() + seconds
+        self.last_error = f"FloodWait {seconds}s"
+
+    async def disconnect(self):
+        if self.client.is_connected():
+            await self.client.disconnect()
+
+    def stats(self):
+        """Health snapshot"""
         return {
-            'success': False,
-            'error': 'Configuration Error: API ID or Hash is missing. Please set them in the Admin Dashboard > Settings > Telegram.'
+            'user_id': self.user_id,
+            'username': self.username,
+            'authorized': self.authorized,
+            'connected': self.client.is_connected(),
+            'cooldown': max(0, round(self.cooldown_until - time.monotonic())),
+            'successes': self.successes,
+            'failures': self.failures,
+            'flood_waits': self.flood_waits,
+            'last_error': self.last_error
         }
-    client = None
+
+class AdminSessionPool:
+    """
+    Every logged-in admin account from telegram_sessions, each with one
+    long-lived client.
+
+    acquire() hands out the least recently used account that is not in a
+    FloodWait cooldown, so group creation is spread over all accounts.
+    Accounts follow AdminCredentials: new sessions are added, removed ones
+    disconnected. Clients connect on first use and reconnect after a drop.
+    """
+
+    def __init__(self, check_interval=ADMIN_SESSION_CHECK_INTERVAL):
+        self.credentials = AdminCredentials(check_interval)
+        self._accounts = {}
+        self._api = None
+        self._lock = None
+
+    async def acquire(self):
+        """Least recently used usable account, connected (raises AdminClientError)"""
+        async with self._get_lock():
+            await self._refresh()
+            account = await self._pick()
+            if account is None and self.next_available_in() is None:
+                # Every session expired: the admin may have just logged in again
+                await self._refresh(force=True)
+                account = await self._pick()
+            if account is not None:
+                account.last_used = time.monotonic()
+                return account
+
+            wait = self.next_available_in()
+            if wait:
+                raise AdminClientError(
+                    f'All admin accounts are rate limited by Telegram. Please try again in {wait} seconds.',
+                    flood_wait=wait
+                )
+            raise AdminClientError('Admin session expired. Please re-login via admin panel.')
+
+    async def get_account(self, user_id):
+        """The account of a specific admin user (e.g. a group's creator), connected"""
+        async with self._get_lock():
+            await self._refresh()
+            for account in self._accounts.values():
+                if account.user_id == user_id and account.authorized:
+                    if await account.ensure_connected():
+                        return account
+            raise AdminClientError('The admin account that created this group is no longer logged in.')
+
+    def invalidate(self):
+        """Re-read sessions and credentials on next use (e.g. after a session was saved)"""
+        self.credentials.invalidate()
+
+    async def _pick(self):
+        for account in sorted(self._accounts.values(), key=lambda a: a.last_used):
+            if not account.available:
+                continue
+            try:
+                if await account.ensure_connected():
+                    return account
+            except Exception as e:
+                account.record_failure(e)
+                logger.error(f"❌ Could not connect admin account {account.username or account.user_id}: {e}")
+        return None
+
+    def next_available_in(self):
+        """Seconds until an authorized account is out of cooldown (0 = one is ready, None = none authorized)"""
+        now = time.monotonic()
+        waits = [max(0, a.cooldown_until - now) for a in self._accounts.values() if a.authorized]
+        return math.ceil(min(waits)) if waits else None
+
+    def stats(self):
+        """Per-account health"""
+        return [account.stats() for account in self._accounts.values()]
+
+    def _get_lock(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def _refresh(self, force=False):
+        """Sync the accounts with the stored sessions and credentials"""
+        try:
+            changed = await self.credentials.refresh(force=force)
+        except AdminClientError:
+            await self._drop_all()
+            self._api = None
+            raise
+        if not changed:
+            return
+
+        api = (self.credentials.api_id, self.credentials.api_hash)
+        if api != self._api:
+            await self._drop_all()
+            self._api = api
+
+        current = {row['session_string']: row for row in self.credentials.sessions}
+        for session_string in [s for s in self._accounts if s not in current]:
+            await self._accounts.pop(session_string).disconnect()
+        for session_string, row in current.items():
+            if session_string not in self._accounts:
+                self._accounts[session_string] = AdminAccount(row, *api)
+                logger.info(f"➕ Admin account added to pool: {row.get('username') or row.get('user_id')}")
+
+    async def _drop_all(self):
+        accounts, self._accounts = self._accounts, {}
+        for account in accounts.values():
+            await account.disconnect()
+
+    async def close(self):
+        """Disconnect every account (they are rebuilt on next use)"""
+        await self._drop_all()
+        self._api = None
+        self.credentials = AdminCredentials(self.credentials.check_interval)
+        self._lock = None
+
+# Shared admin account pool for this process
+admin_client = AdminSessionPool()
+
+async def create_escrow_group(deal_id, bot_username=None):
+    """
+    Create a Telegram escrow group using admin session
+    """
+    return await provision_group(
+        title=f"Escrow #{deal_id}",
+        about=f"Escrow transaction #{deal_id}",
+        bot_username=bot_username
+    )
+
+class StepTimer:
+    """Wall-clock seconds spent in each provisioning step"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.steps = {}
+
+    async def run(self, name, awaitable):
+        started = time.monotonic()
+        try:
+            return await awaitable
+        finally:
+            self.steps[name] = round(time.monotonic() - started, 3)
+
+    def summary(self):
+        """{'total': seconds, 'steps': {name: seconds}}; total follows the critical path"""
+        return {'total': round(time.monotonic() - self.started, 3), 'steps': dict(self.steps)}
+
+async def _resolve_bot(account, bot_username):
+    """Bot input peer, or None (no bot requested or it could not be resolved)"""
+    if not bot_username:
+        return None
     try:
-        # Get admin session from database
-        session_string = get_admin_session()
-        if not session_string:
-            return {
-                'success': False,
-                'error': 'No admin session found. Please login via admin panel first.'
-            }
+        return await account.resolve_user(bot_username)
+    except Exception as e:
+        logger.error(f"⚠️ Failed to resolve bot @{bot_username}: {e}")
+        account.entities.invalidate_user(bot_username)
+        return None
+
+async def _add_bot(account, channel, bot_username, bot_peer, timer):
+    """Invite the bot and promote it to admin (failures are logged, the group is still usable)"""
+    try:
+        logger.info(f"🤖 Adding bot @{bot_username} to group...")
+        await timer.run('invite_bot', account.client(InviteToChannelRequest(channel, [bot_peer])))
         
-        # Create Telethon client from session
-        client = TelegramClient(
-            StringSession(session_string),
-            api_id,
-            api_hash
+        # Give full rights (delete msgs, pin, invite, etc)
+        rights = ChatAdminRights(
+            change_info=True,
+            post_messages=True,
+            edit_messages=True,
+            delete_messages=True,
+            ban_users=True,
+            invite_users=True,
+            pin_messages=True,
+            add_admins=False,
+            anonymous=False,
+            manage_call=False,
+            other=True
         )
         
-        await client.connect()
+        logger.info(f"👑 Promoting bot @{bot_username} to Admin...")
+        await timer.run('promote_bot', account.client(EditAdminRequest(
+            channel=channel,
+            user_id=bot_peer,
+            admin_rights=rights,
+            rank="Escrow Bot"
+        )))
+        logger.info("✅ Bot added and promoted successfully!")
+    except Exception as bot_err:
+        logger.error(f"⚠️ Failed to add/promote bot: {bot_err}")
+        # The cached bot peer may be stale; resolve it again next time
+        account.entities.invalidate_user(bot_username)
+
+async def _make_creator_anonymous(account, channel, timer):
+    """Hide the creating account from the member list (failures are logged)"""
+    try:
+        logger.info(f"🕵️ Making Creator (ID: {account.user_id}) Anonymous...")
         
-        if not await client.is_user_authorized():
-            return {
-                'success': False,
-                'error': 'Admin session expired. Please re-login via admin panel.'
-            }
+        creator_rights = ChatAdminRights(
+            change_info=True,
+            post_messages=True,
+            edit_messages=True,
+            delete_messages=True,
+            ban_users=True,
+            invite_users=True,
+            pin_messages=True,
+            add_admins=True,
+            anonymous=True, # <--- KEY: Hides from member list
+            manage_call=True,
+            other=True
+        )
         
-        # Create the escrow group
-        logger.info(f"🔨 Creating escrow group for deal #{deal_id}...")
+        await timer.run('anonymize_creator', account.client(EditAdminRequest(
+            channel=channel,
+            user_id=InputUserSelf(),
+            admin_rights=creator_rights,
+            rank="System"
+        )))
+        logger.info("✅ Creator is now Anonymous")
+    except Exception as anon_err:
+        logger.error(f"⚠️ Failed to make creator anonymous: {anon_err}")
+
+async def provision_group(title, about, bot_username=None):
+    """
+    Create a supergroup, add and promote the bot, make the creator anonymous
+    and export an invite link.
+    Uses the least recently used admin account that is not rate limited.
+    Steps that only need the new group run concurrently, so the total is the
+    slowest chain (invite -> promote bot) rather than the sum of all steps.
+    Returns: {'success', 'group_id', 'access_hash', 'invite_link', 'creator_id', 'timings'}
+    or {'success': False, 'error'} ('flood_wait' seconds if rate limited)
+    """
+    try:
+        account = await admin_client.acquire()
+    except AdminClientError as e:
+        result = {
+            'success': False,
+            'error': str(e)
+        }
+        if e.flood_wait:
+            result['flood_wait'] = e.flood_wait
+        return result
+    client = account.client
+    timer = StepTimer()
+
+    try:
+        # Create the escrow group while the bot peer is resolved
+        logger.info(f"🔨 Creating escrow group '{title}'...")
         
-        result = await client(CreateChannelRequest(
-            title=f"Escrow #{deal_id}",
-            about=f"Escrow transaction #{deal_id}",
-            megagroup=True  # Create as supergroup
-        ))
+        result, bot_peer = await asyncio.gather(
+            timer.run('create_group', client(CreateChannelRequest(
+                title=title,
+                about=about,
+                megagroup=True  # Create as supergroup
+            ))),
+            timer.run('resolve_bot', _resolve_bot(account, bot_username))
+        )
         
         # Get the created group
         group = result.chats[0]
         group_id = group.id
+        # Address the new group by its access hash from here on (no entity lookups)
+        channel = InputChannel(group.id, group.access_hash)
+        peer = InputPeerChannel(group.id, group.access_hash)
         
         logger.info(f"✅ Group created! ID: {group_id}")
 
-        # ------------------------------------------------------------------
-        # ADD BOT AND PROMOTE TO ADMIN
-        # ------------------------------------------------------------------
-        if bot_username:
-            try:
-                # 1. Invite Bot
-                from telethon.tl.functions.channels import InviteToChannelRequest, EditAdminRequest
-                from telethon.tl.types import ChatAdminRights
-                
-                logger.info(f"🤖 Adding bot @{bot_username} to group...")
-                await client(InviteToChannelRequest(group_id, [bot_username]))
-                
-                # 2. Promote Bot to Admin
-                # Give full rights (delete msgs, pin, invite, etc)
-                rights = ChatAdminRights(
-                    change_info=True,
-                    post_messages=True,
-                    edit_messages=True,
-                    delete_messages=True,
-                    ban_users=True,
-                    invite_users=True,
-                    pin_messages=True,
-                    add_admins=False,
-                    anonymous=False,
-                    manage_call=False,
-                    other=True
-                )
-                
-                logger.info(f"👑 Promoting bot @{bot_username} to Admin...")
-                await client(EditAdminRequest(
-                    channel=group_id,
-                    user_id=bot_username,
-                    admin_rights=rights,
-                    rank="Escrow Bot"
-                ))
-                logger.info("✅ Bot added and promoted successfully!")
-
-                # 3. Make Creator Anonymous (so they don't show in member list)
-                try:
-                    me = await client.get_me()
-                    logger.info(f"🕵️ Making Creator (ID: {me.id}) Anonymous...")
-                    
-                    creator_rights = ChatAdminRights(
-                        change_info=True,
-                        post_messages=True,
-                        edit_messages=True,
-                        delete_messages=True,
-                        ban_users=True,
-                        invite_users=True,
-                        pin_messages=True,
-                        add_admins=True,
-                        anonymous=True, # <--- KEY: Hides from member list
-                        manage_call=True,
-                        other=True
-                    )
-                    
-                    await client(EditAdminRequest(
-                        channel=group_id,
-                        user_id=me,
-                        admin_rights=creator_rights,
-                        rank="System"
-                    ))
-                    logger.info("✅ Creator is now Anonymous")
-                except Exception as anon_err:
-                     logger.error(f"⚠️ Failed to make creator anonymous: {anon_err}")
-
-            except Exception as bot_err:
-                logger.error(f"⚠️ Failed to add/promote bot: {bot_err}")
-                # Continue execution, don't fail the whole process
-        # ------------------------------------------------------------------
-        
-        # Get invite link
-        try:
-            full_channel = await client.get_entity(group_id)
-            if hasattr(full_channel, 'username') and full_channel.username:
-                invite_link = f"https://t.me/{full_channel.username}"
-            else:
-                # Create invite link
-                from telethon.tl.functions.messages import ExportChatInviteRequest
-                invite_result = await client(ExportChatInviteRequest(peer=group_id))
-                invite_link = invite_result.link
-        except Exception as link_error:
-            # Fallback: try to export invite
-            logger.warning(f"Could not get channel entity, exporting invite: {link_error}")
-            from telethon.tl.functions.messages import ExportChatInviteRequest
-            invite_result = await client(ExportChatInviteRequest(peer=group_id))
-            invite_link = invite_result.link
+        # Everything else only needs the group: add/promote the bot, make the
+        # creator anonymous and export the invite link side by side
+        steps = [
+            # A group created just now never has a public username
+            timer.run('export_invite', client(ExportChatInviteRequest(peer=peer))),
+            _make_creator_anonymous(account, channel, timer)
+        ]
+        if bot_peer is not None:
+            steps.append(_add_bot(account, channel, bot_username, bot_peer, timer))
+        invite_result = (await asyncio.gather(*steps))[0]
+        invite_link = invite_result.link
         
         logger.info(f"🔗 Invite link: {invite_link}")
         
-        
-        await client.disconnect()
-        
         # Normalize Group ID for Bot API (Supergroups need -100 prefix)
         # Telethon returns positive ID for channels/supergroups (e.g. 12345)
         # Bot API sees them as -10012345
@@ -211,47 +515,68 @@ async def create_escrow_group(deal_id, bot_username=None):
             final_group_id = int(f"-100{group_id}")
             logger.info(f"Converted Telethon ID {group_id} to Bot API ID {final_group_id}")
         
+        await account.save_entities()
+        account.record_success()
+        timings = timer.summary()
+        logger.info(f"⏱️ Group {group_id} provisioned in {timings['total']}s {timings['steps']}")
         return {
             'success': True,
             'group_id': final_group_id,
-            'invite_link': invite_link
+            'access_hash': group.access_hash,
+            'invite_link': invite_link,
+            'creator_id': account.user_id,
+            'timings': timings
         }
         
+    except FloodWaitError as e:
+        logger.warning(f"⏳ Telegram rate limit on admin {account.user_id} while creating group: wait {e.seconds}s")
+        account.record_flood_wait(e.seconds)
+        return {
+            'success': False,
+            'error': str(e),
+            # 0 when another account can take the retry right away
+            'flood_wait': admin_client.next_available_in() or 0
+        }
     except Exception as e:
         logger.error(f"❌ Error creating escrow group: {e}")
-        if client and client.is_connected():
-            await client.disconnect()
-        
+        account.record_failure(e)
         return {
             'success': False,
             'error': str(e)
         }
 
+async def rename_group(group_id, access_hash, title, creator_id=None):
+    """
+    Change a group's title (e.g. a pooled group handed to a new deal)
+    group_id may be in Bot API (-100...) or Telethon form; creator_id is the
+    admin account that created the group (None = any account)
+    """
+    try:
+        account = await (admin_client.get_account(creator_id) if creator_id else admin_client.acquire())
+        channel = InputChannel(normalize_group_id(group_id), access_hash)
+        await account.client(EditTitleRequest(channel=channel, title=title))
+        return {'success': True}
+    except Exception as e:
+        logger.error(f"Error renaming group {group_id}: {e}")
+        return {'success': False, 'error': str(e)}
+
 async def revoke_group_invites(group_id):
     """
     Revoke all invite links for a group to close it to new members
     """
-    api_id, api_hash = get_credentials()
-    if not api_id or not api_hash:
-        return {'success': False, 'error': 'Missing API credentials'}
-        
-    client = None
     try:
-        session_string = get_admin_session()
-        if not session_string:
-            return {'success': False, 'error': 'No admin session found'}
-            
-        client = TelegramClient(StringSession(session_string), api_id, api_hash)
-        await client.connect()
-        
-        if not await client.is_user_authorized():
-            return {'success': False, 'error': 'Admin session expired'}
-            
-        # Telethon uses positive IDs (usually) but sometimes handles -100
-        # If DB passed -100 ID, we need to convert it back?
-        # get_entity usually handles it if input is int
-        # But if it's -100123... Telethon expects 123... (channel id) or -100123... (chat_id)
-        # Let's try direct use first.
+        # Use the account that created the group (only it has admin rights there)
+        pool_row = await database.get_pool_group(group_id)
+        if pool_row and pool_row.get('creator_id'):
+            account = await admin_client.get_account(pool_row['creator_id'])
+        else:
+            account = await admin_client.acquire()
+        client = account.client
+
+        # Known groups are addressed directly; others rely on Telethon resolving the -100 ID
+        peer = group_id
+        if pool_row and pool_row.get('access_hash'):
+            peer = InputPeerChannel(normalize_group_id(group_id), pool_row['access_hash'])
         
         try:
             # 1. Get Exported Invites
@@ -259,8 +584,8 @@ async def revoke_group_invites(group_id):
             
             # Fetch existing invites
             result = await client(GetExportedChatInvitesRequest(
-                peer=group_id,
-                admin_id=await client.get_me(), # Invites created by admin
+                peer=peer,
+                admin_id=InputUserSelf(), # Invites created by admin
                 limit=10
             ))
             
@@ -269,7 +594,7 @@ async def revoke_group_invites(group_id):
                 if not invite.revoked:
                     # Revoke it
                     await client(EditExportedChatInviteRequest(
-                        peer=group_id,
+                        peer=peer,
                         link=invite.link,
                         revoked=True
                     ))
@@ -285,9 +610,55 @@ async def revoke_group_invites(group_id):
     except Exception as e:
         logger.error(f"Error in revoke_group_invites: {e}")
         return {'success': False, 'error': str(e)}
-    finally:
-        if client:
-            await client.disconnect()
+
+async def recycle_group(group_id, access_hash, creator_id=None, bot_username=None, title="Escrow Group"):
+    """
+    Reset a finished deal's group so it can serve another deal: revoke the
+    old invite links, remove every member except the admin account and the
+    bot, clear the history, export a fresh invite link and reset the title.
+    Returns: {'success', 'invite_link', 'removed'} or {'success': False, 'error'}
+    """
+    # Close the door first so nobody joins while the group is being emptied
+    revoke = await revoke_group_invites(group_id)
+    if not revoke['success']:
+        return revoke
+
+    account = None
+    try:
+        account = await (admin_client.get_account(creator_id) if creator_id else admin_client.acquire())
+        client = account.client
+        channel = InputChannel(normalize_group_id(group_id), access_hash)
+        peer = InputPeerChannel(normalize_group_id(group_id), access_hash)
+        bot_name = (bot_username or '').lstrip('@').lower()
+
+        removed = 0
+        async for user in client.iter_participants(channel):
+            if user.is_self or (bot_name and (user.username or '').lower() == bot_name):
+                continue
+            try:
+                await client.kick_participant(channel, user)
+                removed += 1
+            except FloodWaitError:
+                raise
+            except Exception as kick_err:
+                logger.warning(f"⚠️ Could not remove {user.id} from group {group_id}: {kick_err}")
+
+        await client(DeleteHistoryRequest(channel=channel, max_id=0, for_everyone=True))
+
+        invite_result = await client(ExportChatInviteRequest(peer=peer))
+        await client(EditTitleRequest(channel=channel, title=title))
+
+        logger.info(f"♻️ Recycled group {group_id} (removed {removed} members)")
+        return {'success': True, 'invite_link': invite_result.link, 'removed': removed}
+
+    except FloodWaitError as e:
+        logger.warning(f"⏳ Telegram rate limit while recycling group {group_id}: wait {e.seconds}s")
+        if account:
+            account.record_flood_wait(e.seconds)
+        return {'success': False, 'error': str(e), 'flood_wait': e.seconds}
+    except Exception as e:
+        logger.error(f"❌ Error recycling group {group_id}: {e}")
+        return {'success': False, 'error': str(e)}
 
 def format_group_created_message(deal_id, invite_link):
     """
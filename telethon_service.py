@@ -1,17 +1,19 @@
 """
 Telethon Microservice for Telegram Group Creation
-Runs as a separate Flask service to avoid event loop conflicts with main bot
+Runs as a separate asyncio HTTP service to avoid event loop conflicts with main bot
 """
 import os
+import time
+import uuid
+import asyncio
 import logging
-from flask import Flask, request, jsonify
-from telethon import TelegramClient
+from telethon import TelegramClient, events
+from telethon.errors import FloodWaitError
 from telethon.tl.functions.channels import CreateChannelRequest, InviteToChannelRequest, EditAdminRequest
 from telethon.tl.functions.messages import ExportChatInviteRequest
-from telethon.tl.types import ChatAdminRights
+from telethon.tl.types import ChatAdminRights, InputChannel, InputPeerChannel, InputUserSelf
 from dotenv import load_dotenv
-import asyncio
-import threading
+from async_http import HTTPServer, json_response
 
 # Load environment variables
 load_dotenv()
@@ -23,33 +25,31 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-from bot_error_wrapper import handle_errors, safe_call
-
-# Flask app
-app = Flask(__name__)
-
 # Telethon configuration
 API_ID = int(os.getenv('API_ID', '0'))
 API_HASH = os.getenv('API_HASH', '')
 PHONE_NUMBER = os.getenv('PHONE_NUMBER', '')
 
-# Global Telethon client and event loop
-client = None
-loop = None
-loop_thread = None
+# Groups created at the same time through the user session
+TELETHON_MAX_CONCURRENCY = int(os.getenv('TELETHON_MAX_CONCURRENCY', '3'))
+# Longest wait for the bot to post in a new group (seconds)
+TELETHON_BOT_REPLY_TIMEOUT = float(os.getenv('TELETHON_BOT_REPLY_TIMEOUT', '10'))
+# How long finished jobs stay visible on /jobs (seconds)
+TELETHON_JOB_RETENTION = int(os.getenv('TELETHON_JOB_RETENTION', '3600'))
+
+# HTTP server
+server = HTTPServer()
 
-def run_async_loop(loop):
-    """Run event loop in background thread"""
-    asyncio.set_event_loop(loop)
-    loop.run_forever()
+# Global Telethon client
+client = None
+# Bounds concurrent creations (created inside the event loop)
+creation_slots = None
 
-def run_coroutine_threadsafe(coro):
-    """Run a coroutine in the background event loop thread"""
-    global loop
-    future = asyncio.run_coroutine_threadsafe(coro, loop)
-    return future.result()
+# channel_id -> [(bot_user_id, future)] waiting for the bot's next message there
+bot_message_waiters = {}
+# job_id -> Job
+jobs = {}
 
-@safe_call
 async def init_client():
     """Initialize Telethon client"""
     global client
@@ -59,10 +59,46 @@ async def init_client():
         if not await client.is_user_authorized():
             logger.error("Telethon client not authorized! Run auth_telethon.py first.")
             raise Exception("Client not authorized")
+        client.add_event_handler(on_new_message, events.NewMessage(incoming=True))
         logger.info("Telethon client initialized and authorized")
     return client
 
-@safe_call
+async def on_new_message(event):
+    """Resolve whoever is waiting for this bot to post in this group"""
+    channel_id = getattr(event.message.peer_id, 'channel_id', None)
+    waiters = bot_message_waiters.get(channel_id)
+    if not waiters:
+        return
+    for bot_id, future in list(waiters):
+        if bot_id == event.sender_id and not future.done():
+            future.set_result(event.message)
+            waiters.remove((bot_id, future))
+    if not waiters:
+        bot_message_waiters.pop(channel_id, None)
+
+def expect_bot_message(channel_id, bot_id):
+    """Future resolved by the bot's next message in channel_id (register before triggering it)"""
+    future = asyncio.get_running_loop().create_future()
+    bot_message_waiters.setdefault(channel_id, []).append((bot_id, future))
+    return future
+
+async def wait_for_bot_message(channel_id, bot_id, future, what):
+    """Wait for an expected bot message; a timeout is logged, not raised"""
+    started = time.monotonic()
+    try:
+        await asyncio.wait_for(future, TELETHON_BOT_REPLY_TIMEOUT)
+        logger.info(f"✅ Bot {what} after {time.monotonic() - started:.1f}s")
+        return True
+    except asyncio.TimeoutError:
+        logger.warning(f"Bot did not post ({what}) within {TELETHON_BOT_REPLY_TIMEOUT:.0f}s, continuing")
+        return False
+    finally:
+        waiters = bot_message_waiters.get(channel_id, [])
+        if (bot_id, future) in waiters:
+            waiters.remove((bot_id, future))
+        if not waiters:
+            bot_message_waiters.pop(channel_id, None)
+
 async def create_telegram_group_async(buyer_id, seller_id, bot_username, deal_id):
     """
     Create a Telegram group for escrow with anonymous creator and bot as admin
@@ -86,12 +122,13 @@ async def create_telegram_group_async(buyer_id, seller_id, bot_username, deal_id
         group_id = group.id
         logger.info(f"✅ Created group: {group_id}")
         
-        # Get channel entity
-        channel_entity = await client.get_entity(group_id)
+        # Address the new group by its access hash (no get_entity round-trip)
+        channel_entity = InputChannel(group.id, group.access_hash)
+        channel_peer = InputPeerChannel(group.id, group.access_hash)
         
         # Step 1: Make creator anonymous
         try:
-            me = await client.get_me()
+            me = InputUserSelf()
             
             my_admin_rights = ChatAdminRights(
                 change_info=True,
@@ -112,7 +149,7 @@ async def create_telegram_group_async(buyer_id, seller_id, bot_username, deal_id
                 f"Escrow #{deal_id}"
             ))
             logger.info(f"✅ Made creator anonymous")
-            
+        
         except Exception as anon_error:
             logger.warning(f"Could not make creator anonymous: {anon_error}")
         
@@ -124,9 +161,12 @@ async def create_telegram_group_async(buyer_id, seller_id, bot_username, deal_id
             
             logger.info(f"Adding bot: {bot_username}")
             
-            # Get bot entity
-            bot_entity = await client.get_entity(bot_username)
-            logger.info(f"Got bot entity ID: {bot_entity.id}")
+            # Get bot input peer (served from the file session's entity table after the first lookup)
+            bot_entity = await client.get_input_entity(bot_username)
+            logger.info(f"Got bot entity ID: {bot_entity.user_id}")
+            
+            # The bot posts its welcome once it sees its own membership update
+            bot_ready = expect_bot_message(group_id, bot_entity.user_id)
             
             # Invite bot to channel
             await client(InviteToChannelRequest(
@@ -156,9 +196,9 @@ async def create_telegram_group_async(buyer_id, seller_id, bot_username, deal_id
             ))
             logger.info(f"✅ Bot promoted to admin")
             
-            # Wait for permissions to take effect
-            await asyncio.sleep(2)
-            
+            # Wait until the bot has picked up its membership instead of a fixed sleep
+            await wait_for_bot_message(group_id, bot_entity.user_id, bot_ready, "joined the group")
+        
         except Exception as bot_error:
             logger.error(f"❌ Error adding/promoting bot: {bot_error}")
             import traceback
@@ -167,102 +207,231 @@ async def create_telegram_group_async(buyer_id, seller_id, bot_username, deal_id
         
         # Step 3: Send /start command automatically
         try:
-            await client.send_message(channel_entity, '/start')
+            bot_reply = expect_bot_message(group_id, bot_entity.user_id)
+            await client.send_message(channel_peer, '/start')
             logger.info(f"✅ Sent /start command")
-            await asyncio.sleep(2)  # Wait for bot to process and respond
+            await wait_for_bot_message(group_id, bot_entity.user_id, bot_reply, "answered /start")
         except Exception as start_error:
             logger.warning(f"Could not send /start: {start_error}")
         
         # Step 4: Export invite link
-        invite = await client(ExportChatInviteRequest(channel_entity))
+        invite = await client(ExportChatInviteRequest(channel_peer))
         invite_link = invite.link
         logger.info(f"✅ Invite link: {invite_link}")
         
         return group_id, invite_link
-        
+    
     except Exception as e:
         logger.error(f"❌ Error creating group: {e}")
         import traceback
         traceback.print_exc()
         raise
 
-@app.route('/health', methods=['GET'])
-def health():
+class Job:
+    """A batch of group creations tracked for the /jobs endpoints"""
+
+    def __init__(self, bot_username, groups):
+        self.id = uuid.uuid4().hex[:12]
+        self.bot_username = bot_username
+        self.created_at = time.time()
+        self.finished_at = None
+        self.items = [
+            {
+                'deal_id': group['deal_id'],
+                'buyer_id': group.get('buyer_id'),
+                'seller_id': group.get('seller_id'),
+                'status': 'queued'
+            }
+            for group in groups
+        ]
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def to_dict(self, with_items=True):
+        counts = {}
+        for item in self.items:
+            counts[item['status']] = counts.get(item['status'], 0) + 1
+        data = {
+            'job_id': self.id,
+            'status': 'done' if self.done else 'running',
+            'bot_username': self.bot_username,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'total': len(self.items),
+            'counts': counts
+        }
+        if with_items:
+            data['groups'] = self.items
+        return data
+
+async def create_group_limited(item, bot_username):
+    """Create one group under the concurrency limit, recording progress in item"""
+    async with creation_slots:
+        item['status'] = 'creating'
+        started = time.monotonic()
+        try:
+            group_id, invite_link = await create_telegram_group_async(
+                item.get('buyer_id'), item.get('seller_id'), bot_username, item['deal_id']
+            )
+            item.update(status='done', group_id=group_id, invite_link=invite_link)
+        except FloodWaitError as e:
+            item.update(status='failed', error=f"FloodWait: retry in {e.seconds}s", flood_wait=e.seconds)
+        except Exception as e:
+            item.update(status='failed', error=str(e))
+        item['seconds'] = round(time.monotonic() - started, 2)
+    return item
+
+async def run_job(job):
+    """Create every group of a job (bounded by creation_slots)"""
+    try:
+        await asyncio.gather(*(create_group_limited(item, job.bot_username) for item in job.items))
+    finally:
+        job.finished_at = time.time()
+        done = sum(1 for item in job.items if item['status'] == 'done')
+        logger.info(f"✅ Job {job.id}: {done}/{len(job.items)} groups created")
+
+def prune_jobs():
+    """Forget jobs finished more than TELETHON_JOB_RETENTION seconds ago"""
+    cutoff = time.time() - TELETHON_JOB_RETENTION
+    for job_id in [j.id for j in jobs.values() if j.done and j.finished_at < cutoff]:
+        del jobs[job_id]
+
+def missing_field(data, fields):
+    for field in fields:
+        if field not in data:
+            return field
+    return None
+
+@server.route('GET', '/health')
+async def health(request):
     """Health check endpoint"""
     try:
         is_connected = client is not None and client.is_connected()
-        return jsonify({
+        return json_response({
             'status': 'ok',
-            'telethon': 'connected' if is_connected else 'disconnected'
-        }), 200
+            'telethon': 'connected' if is_connected else 'disconnected',
+            'jobs_running': sum(1 for job in jobs.values() if not job.done)
+        }, 200)
     except Exception as e:
-        return jsonify({
+        return json_response({
             'status': 'error',
             'message': str(e)
-        }), 500
+        }, 500)
 
-@app.route('/create-group', methods=['POST'])
-def create_group():
+@server.route('POST', '/create-group')
+async def create_group(request):
     """Create a Telegram group with anonymous creator and bot as admin"""
     try:
-        data = request.get_json()
+        data = request.json()
         if not data:
-            return jsonify({'success': False, 'error': 'No data provided'}), 400
+            return json_response({'success': False, 'error': 'No data provided'}, 400)
         
         # Validate request
-        required_fields = ['buyer_id', 'seller_id', 'bot_username', 'deal_id']
-        for field in required_fields:
-            if field not in data:
-                return jsonify({
-                    'success': False,
-                    'error': f'Missing required field: {field}'
-                }), 400
+        field = missing_field(data, ['buyer_id', 'seller_id', 'bot_username', 'deal_id'])
+        if field:
+            return json_response({
+                'success': False,
+                'error': f'Missing required field: {field}'
+            }, 400)
         
-        buyer_id = data['buyer_id']
-        seller_id = data['seller_id']
-        bot_username = data['bot_username']
         deal_id = data['deal_id']
         
-        # Create group using background event loop
-        group_id, invite_link = run_coroutine_threadsafe(
-            create_telegram_group_async(buyer_id, seller_id, bot_username, deal_id)
-        )
+        # Shares the concurrency limit with batch jobs
+        async with creation_slots:
+            group_id, invite_link = await create_telegram_group_async(
+                data['buyer_id'], data['seller_id'], data['bot_username'], deal_id
+            )
         
-        return jsonify({
+        return json_response({
             'success': True,
             'group_id': group_id,
             'invite_link': invite_link,
             'deal_id': deal_id
-        }), 200
-        
+        }, 200)
+    
     except Exception as e:
         import traceback
         error_traceback = traceback.format_exc()
         logger.error(f"Error in create_group endpoint:\n{error_traceback}")
-        return jsonify({
+        return json_response({
             'success': False,
             'error': f"{str(e)}\n\nTraceback:\n{error_traceback}"
-        }), 500
+        }, 500)
 
-if __name__ == '__main__':
-    print("=" * 60)
-    print("🚀 Telethon Microservice Starting...")
-    print("📍 URL: http://localhost:5001")
-    print("🔐 Using session: user_session.session")
-    print("=" * 60)
+@server.route('POST', '/create-groups')
+async def create_groups(request):
+    """
+    Create several groups as one job
     
-    # Start event loop in background thread
-    loop = asyncio.new_event_loop()
-    loop_thread = threading.Thread(target=run_async_loop, args=(loop,), daemon=True)
-    loop_thread.start()
-    logger.info("✅ Background event loop started")
+    Body: {"bot_username": ..., "groups": [{"deal_id", "buyer_id", "seller_id"}, ...], "wait": false}
+    Returns 202 with the job id (poll /jobs/<job_id>), or the finished job if wait is true.
+    """
+    data = request.json()
+    if not data or not isinstance(data.get('groups'), list) or not data['groups']:
+        return json_response({'success': False, 'error': 'Provide a non-empty "groups" list'}, 400)
+    if 'bot_username' not in data:
+        return json_response({'success': False, 'error': 'Missing required field: bot_username'}, 400)
+    for index, group in enumerate(data['groups']):
+        if not isinstance(group, dict) or 'deal_id' not in group:
+            return json_response({'success': False, 'error': f'groups[{index}] is missing deal_id'}, 400)
+    
+    prune_jobs()
+    job = Job(data['bot_username'], data['groups'])
+    jobs[job.id] = job
+    task = asyncio.create_task(run_job(job))
+    logger.info(f"📦 Job {job.id}: creating {len(job.items)} groups")
+    
+    if data.get('wait'):
+        await task
+        return json_response({'success': True, **job.to_dict()}, 200)
+    return json_response({
+        'success': True,
+        'job_id': job.id,
+        'status_url': f'/jobs/{job.id}',
+        'total': len(job.items)
+    }, 202)
+
+@server.route('GET', '/jobs')
+async def list_jobs(request):
+    """In-flight jobs (?all=1 includes finished ones still retained)"""
+    prune_jobs()
+    include_done = request.query.get('all') in ('1', 'true')
+    return json_response({
+        'jobs': [job.to_dict(with_items=False) for job in jobs.values() if include_done or not job.done]
+    }, 200)
+
+@server.route('GET', '/jobs/<job_id>')
+async def job_status(request):
+    """Per-group status of one job"""
+    job = jobs.get(request.params['job_id'])
+    if job is None:
+        return json_response({'success': False, 'error': 'Unknown job'}, 404)
+    return json_response(job.to_dict(), 200)
+
+async def main():
+    global creation_slots
+    creation_slots = asyncio.Semaphore(TELETHON_MAX_CONCURRENCY)
     
     # Initialize client
     try:
-        run_coroutine_threadsafe(init_client())
+        await init_client()
         logger.info("✅ Telethon client pre-initialized successfully")
     except Exception as e:
         logger.error(f"❌ Failed to initialize client: {e}")
     
-    # Run Flask app
-    app.run(host='0.0.0.0', port=5001, debug=False)
+    try:
+        await server.serve_forever(host='0.0.0.0', port=5001)
+    finally:
+        if client is not None:
+            await client.disconnect()
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("🚀 Telethon Microservice Starting...")
+    print("📍 URL: http://localhost:5001")
+    print("🔐 Using session: user_session.session")
+    print("=" * 60)
+    
+    asyncio.run(main())
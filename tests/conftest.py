@@ -0,0 +1,35 @@
+"""
+Shared test setup: async_database on a throwaway SQLite file
+(DATABASE_BACKEND=sqlite, see sqlite_backend.py), so tests need no Supabase.
+"""
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# async_database creates its client on import; keep it off the real escrow.db
+os.environ['DATABASE_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'import.db')
+os.environ['STATS_FLUSH_INTERVAL'] = '0'
+
+import async_database
+import sqlite_backend
+from cache import config_cache, table_cache
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'escrow.db')
+
+@pytest.fixture
+def db(db_path, monkeypatch):
+    """async_database bound to a fresh SQLite file, with empty caches"""
+    client = sqlite_backend.create_async_client(db_path)
+    monkeypatch.setattr(async_database, 'supabase', client)
+    table_cache.clear()
+    config_cache.clear()
+    async_database._pending_stats.clear()
+    yield async_database
+    client.close()
@@ -0,0 +1,131 @@
+"""BroadcastRunner: claims, and read errors and cancels never ending a broadcast as 'done' (user-025)"""
+import asyncio
+import pytest
+import broadcast
+
+class FakeBot:
+    def __init__(self, on_send=None):
+        self.sent = []
+        self.on_send = on_send
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(chat_id)
+        if self.on_send:
+            await self.on_send()
+
+def _setup(db, users=5):
+    """Add bot users and queue a broadcast; returns its id"""
+    async def run():
+        await db.supabase.table('bot_users').insert(
+            [{'user_id': 1000 + i, 'first_name': f'user{i}'} for i in range(users)]
+        ).execute()
+        return await db.create_broadcast('<b>hello</b>')
+    return asyncio.run(run())
+
+def _status(db, broadcast_id):
+    return asyncio.run(db.get_broadcast(broadcast_id))['status']
+
+def _runner(bot=None):
+    runner = broadcast.BroadcastRunner(page_size=2, lease_seconds=60)
+    runner._bot = bot or FakeBot()
+    return runner
+
+def _claim(db, runner):
+    return asyncio.run(db.claim_broadcast(runner.owner, runner.lease_seconds))
+
+def test_broadcast_is_done_after_the_last_page(db):
+    broadcast_id = _setup(db)
+    runner = _runner()
+    asyncio.run(runner._run(_claim(db, runner)))
+    assert sorted(runner._bot.sent) == [1000, 1001, 1002, 1003, 1004]
+    assert _status(db, broadcast_id) == 'done'
+
+def test_failed_page_read_leaves_broadcast_running(db, monkeypatch):
+    broadcast_id = _setup(db)
+    monkeypatch.setattr(broadcast, 'READ_RETRIES', 1)
+    get_page = db.get_bot_users_page
+    reads = []
+
+    async def flaky_page(cursor, page_size):
+        # First page reads fine, every later read fails
+        reads.append(cursor)
+        if len(reads) > 1:
+            return None
+        return await get_page(cursor, page_size=page_size)
+
+    monkeypatch.setattr(broadcast.database, 'get_bot_users_page', flaky_page)
+    runner = _runner()
+    with pytest.raises(RuntimeError):
+        asyncio.run(runner._run(_claim(db, runner)))
+    assert _status(db, broadcast_id) == 'running'
+    # One retry of the failed read
+    assert len(reads) == 3
+    # The first page's sends were recorded, so a resumed run skips them
+    sent = runner._bot.sent
+    assert asyncio.run(db.get_delivered_user_ids(broadcast_id, sent)) == set(sent) and len(sent) == 2
+
+def test_failed_delivered_read_sends_nothing(db, monkeypatch):
+    broadcast_id = _setup(db)
+    asyncio.run(db.update_broadcast(broadcast_id, total=5, started_at='2024-01-01T00:00:00'))
+    monkeypatch.setattr(broadcast, 'READ_RETRIES', 0)
+
+    async def failing(broadcast_id, user_ids):
+        return None
+
+    monkeypatch.setattr(broadcast.database, 'get_delivered_user_ids', failing)
+    runner = _runner()
+    with pytest.raises(RuntimeError):
+        asyncio.run(runner._run(_claim(db, runner)))
+    assert runner._bot.sent == []
+    assert _status(db, broadcast_id) == 'running'
+
+def test_cancel_during_last_page_is_kept(db):
+    broadcast_id = _setup(db, users=1)
+
+    async def cancel():
+        await db.supabase.table('broadcasts').update({'status': 'cancelled'}).eq('id', broadcast_id).execute()
+
+    runner = _runner(FakeBot(on_send=cancel))
+    asyncio.run(runner._run(_claim(db, runner)))
+    assert _status(db, broadcast_id) == 'cancelled'
+
+def test_claimed_broadcast_is_not_claimed_again(db):
+    broadcast_id = _setup(db)
+    first, second = _runner(), _runner()
+    assert _claim(db, first)['id'] == broadcast_id
+    assert _claim(db, second) is None
+    # The owner itself gets it back (e.g. after a failed read)
+    assert _claim(db, first)['id'] == broadcast_id
+
+def test_expired_lease_is_taken_over(db):
+    broadcast_id = _setup(db)
+    crashed, other = _runner(), _runner()
+    _claim(db, crashed)
+    asyncio.run(db.update_broadcast(broadcast_id, lease_until='2000-01-01T00:00:00.000+00:00'))
+
+    claimed = _claim(db, other)
+    assert claimed['id'] == broadcast_id and claimed['owner'] == other.owner
+    # The crashed owner can no longer renew or finish it
+    assert asyncio.run(db.renew_broadcast_lease(broadcast_id, crashed.owner, 60)) is False
+    assert asyncio.run(db.finish_broadcast(broadcast_id, crashed.owner)) is False
+
+def test_stopped_runner_releases_its_broadcast(db):
+    broadcast_id = _setup(db)
+    first, second = _runner(), _runner()
+
+    async def run():
+        sending = asyncio.Event()
+
+        async def on_send():
+            sending.set()
+            await asyncio.sleep(3600)
+
+        first._bot = FakeBot(on_send=on_send)
+        task = asyncio.create_task(first._run(await db.claim_broadcast(first.owner, first.lease_seconds)))
+        await sending.wait()
+        # What BroadcastRunner.stop() does
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert _claim(db, second)['id'] == broadcast_id
@@ -0,0 +1,38 @@
+"""DealCache: active deals expire so other replicas' writes show up (user-021)"""
+from cache import DealCache
+
+ACTIVE = ('D1', 1, 2, None, None, None, 'active')
+CLOSED = ('D2', 1, 2, None, None, None, 'completed')
+
+def test_active_deal_is_reread_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: now[0])
+    deals = DealCache(active_ttl=30)
+    deals.put(-100111, ACTIVE)
+
+    now[0] += 29
+    assert deals.get(111) == ACTIVE
+    now[0] += 2
+    assert deals.get(-100111) is None
+    assert deals.stats()['size'] == 0
+
+def test_closed_deal_does_not_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: now[0])
+    deals = DealCache(active_ttl=30)
+    deals.put(-100222, CLOSED)
+
+    now[0] += 3600
+    assert deals.get(-100222) == CLOSED
+
+def test_local_update_keeps_the_read_time(monkeypatch):
+    """A write-through patch does not make the rest of the row fresher"""
+    now = [1000.0]
+    monkeypatch.setattr('cache.time.monotonic', lambda: now[0])
+    deals = DealCache(active_ttl=30)
+    deals.put(-100333, ACTIVE)
+
+    now[0] += 20
+    deals.update('D1', buyer_address='addr')
+    now[0] += 20
+    assert deals.get(-100333) is None
@@ -0,0 +1,43 @@
+"""GroupCreationQueue: FloodWait retries and the error users see (user-012)"""
+import asyncio
+import pytest
+
+pytest.importorskip('telethon.sessions')
+import group_pool
+import group_queue
+
+def _create(results):
+    calls = []
+
+    async def create(deal_id, bot_username=None):
+        calls.append(deal_id)
+        return results[min(len(calls), len(results)) - 1]
+    return create, calls
+
+def _submit(monkeypatch, results, max_retries=2):
+    create, calls = _create(results)
+    monkeypatch.setattr(group_pool, 'create_escrow_group', create)
+    monkeypatch.setattr(group_queue, 'ZERO_WAIT_RETRY_DELAY', 0)
+
+    async def run():
+        queue = group_queue.GroupCreationQueue(workers=1, max_retries=max_retries)
+        queue.start()
+        try:
+            return await queue.submit('D1')
+        finally:
+            await queue.stop()
+
+    return asyncio.run(run()), calls
+
+def test_zero_waits_return_the_last_error(monkeypatch):
+    result, calls = _submit(monkeypatch, [{'success': False, 'error': 'A wait of 30 seconds is required', 'flood_wait': 0}])
+    assert len(calls) == 3
+    assert result['error'] == 'A wait of 30 seconds is required'
+
+def test_long_flood_wait_reports_minutes(monkeypatch):
+    result, calls = _submit(monkeypatch, [{'success': False, 'error': 'flood', 'flood_wait': 900}])
+    assert len(calls) == 1
+    assert result['error'].endswith('Please try again in 15 minutes.')
+
+def test_format_wait():
+    assert [group_queue.format_wait(s) for s in (1, 45, 60, 61)] == ['1 second', '45 seconds', '1 minute', '2 minutes']
@@ -0,0 +1,40 @@
+"""init_db: defaults seed a fresh install and never rewrite existing config (user-007)"""
+import asyncio
+
+def _config(db):
+    async def read():
+        result = await db.supabase.table('config').select('key, value').execute()
+        return {row['key']: row['value'] for row in result.data}
+    return asyncio.run(read())
+
+def _set(db, key, value):
+    asyncio.run(db.supabase.table('config').update({'value': value}).eq('key', key).execute())
+
+def _delete(db, key):
+    asyncio.run(db.supabase.table('config').delete().eq('key', key).execute())
+
+def test_blanked_admin_password_is_not_reset(db):
+    asyncio.run(db.init_db())
+    _set(db, 'admin_password', '')
+    asyncio.run(db.init_db())
+    assert _config(db)['admin_password'] == ''
+
+def test_deleted_admin_password_is_not_restored(db):
+    asyncio.run(db.init_db())
+    _delete(db, 'admin_password')
+    asyncio.run(db.init_db())
+    assert 'admin_password' not in _config(db)
+
+def test_fresh_install_gets_admin_login(db):
+    _delete(db, 'admin_username')
+    _delete(db, 'admin_password')
+    asyncio.run(db.init_db())
+    config = _config(db)
+    assert config['admin_username'] == 'MiddleCryptoSupport'
+    assert config['admin_password'] == 'admin123'
+
+def test_emptied_wallet_is_kept(db):
+    asyncio.run(db.init_db())
+    _set(db, 'wallet_BTC', '')
+    asyncio.run(db.init_db())
+    assert _config(db)['wallet_BTC'] == ''
@@ -0,0 +1,27 @@
+"""Telegram file_ids are stored apart from the admin panel's media_files rows (user-019)"""
+import asyncio
+from cache import table_cache
+
+def test_saving_a_file_id_keeps_the_current_video(db):
+    async def run():
+        await db.save_media_file('video', 'uploads/old.mp4', 'old.mp4')
+        await db.save_media_file('video', 'uploads/new.mp4', 'new.mp4')
+        # A send of the old video finishes after the admin uploaded the new one
+        await db.save_media_file_id('video', 'uploads/old.mp4', 'oldhash', 'FILE_OLD')
+        table_cache.clear()
+        media = await db.get_all_media()
+        return await db.get_media_file('video'), await db.get_media_file_id('oldhash'), media
+
+    current, file_id, media = asyncio.run(run())
+    assert current == 'uploads/new.mp4'
+    assert file_id == 'FILE_OLD'
+    assert [(path, description) for _, path, description, _ in media] == [('uploads/new.mp4', 'new.mp4')]
+
+def test_forgotten_file_id_is_gone(db):
+    async def run():
+        await db.save_media_file_id('video', 'video.mp4', 'hash1', 'FILE_1')
+        await db.forget_media_file_id('hash1')
+        table_cache.clear()
+        return await db.get_media_file_id('hash1')
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,116 @@
+"""OutboundScheduler: RetryAfter back-off and handler replies (user-024)"""
+import asyncio
+import pytest
+from telegram.error import RetryAfter
+import outbound
+
+GROUP = -100123
+OTHER_GROUP = -100456
+USER = 111
+OTHER_USER = 222
+
+class FlakySend:
+    """Raises RetryAfter(wait) for the first `failures` calls, then records when it went out"""
+
+    def __init__(self, wait=0.2, failures=1):
+        self.wait = wait
+        self.failures = failures
+        self.calls = []
+
+    async def __call__(self):
+        self.calls.append(asyncio.get_running_loop().time())
+        if len(self.calls) <= self.failures:
+            raise RetryAfter(self.wait)
+        return 'ok'
+
+def _recorder(log, name):
+    async def send():
+        log.append((name, asyncio.get_running_loop().time()))
+        return name
+    return send
+
+def test_retry_after_in_a_group_pauses_only_that_group():
+    async def run():
+        scheduler = outbound.OutboundScheduler(global_rate=100)
+        scheduler.start()
+        try:
+            flaky = FlakySend(wait=0.2)
+            log = []
+            first = scheduler.enqueue(GROUP, flaky)
+            await asyncio.sleep(0.01)
+            # Queued behind the paused message in the same group
+            later = scheduler.enqueue(GROUP, _recorder(log, 'later'))
+            other = await scheduler.send(OTHER_GROUP, _recorder(log, 'other'))
+
+            assert other == 'other'
+            # The other group went out during the pause
+            assert [name for name, _ in log] == ['other']
+            assert log[0][1] - flaky.calls[0] < 0.2
+            assert await first == 'ok'
+            assert flaky.calls[1] - flaky.calls[0] >= 0.2
+            assert await later == 'later'
+            # The retried message kept its place ahead of the later one
+            assert log[1][1] >= flaky.calls[1]
+            assert scheduler.retry_afters == 1
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(run())
+
+def test_retry_after_in_a_private_chat_pauses_everything():
+    async def run():
+        scheduler = outbound.OutboundScheduler(global_rate=100)
+        scheduler.start()
+        try:
+            flaky = FlakySend(wait=0.2)
+            log = []
+            first = scheduler.enqueue(USER, flaky)
+            await asyncio.sleep(0.01)
+            await scheduler.send(OTHER_USER, _recorder(log, 'other'))
+
+            # The global limit was hit: the other chat waited for the pause too
+            assert log[0][1] - flaky.calls[0] >= 0.2
+            assert await first == 'ok'
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(run())
+
+def test_send_fails_after_max_retries():
+    async def run():
+        scheduler = outbound.OutboundScheduler(global_rate=100, max_retries=2)
+        scheduler.start()
+        try:
+            flaky = FlakySend(wait=0.05, failures=10)
+            with pytest.raises(RetryAfter):
+                await scheduler.send(GROUP, flaky)
+            assert len(flaky.calls) == 3
+            assert scheduler.failed == 1
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(run())
+
+class FakeMessage:
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append((text, kwargs))
+        return text
+
+def test_reply_goes_through_the_scheduler(monkeypatch):
+    async def run():
+        scheduler = outbound.OutboundScheduler(global_rate=100)
+        monkeypatch.setattr(outbound, 'scheduler', scheduler)
+        scheduler.start()
+        try:
+            message = FakeMessage(GROUP)
+            assert await outbound.reply(message, 'hi', parse_mode='HTML') == 'hi'
+            assert message.replies == [('hi', {'parse_mode': 'HTML'})]
+            assert scheduler.sent == 1
+        finally:
+            await scheduler.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+"""SQLite backend: schema upgrades and not blocking the event loop (user-008)"""
+import asyncio
+import sqlite3
+import time
+import sqlite_backend
+
+def test_alter_table_columns_are_added_to_existing_databases(db_path):
+    # A database created before broadcasts got owner / lease_until
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE broadcasts (id INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT NOT NULL, "
+                 "status TEXT DEFAULT 'pending', total INTEGER DEFAULT 0, sent INTEGER DEFAULT 0, "
+                 "blocked INTEGER DEFAULT 0, failed INTEGER DEFAULT 0, next_cursor TEXT, created_at TEXT, "
+                 "started_at TEXT, finished_at TEXT, updated_at TEXT)")
+    conn.close()
+
+    client = sqlite_backend.create_client(db_path)
+    client.table('broadcasts').insert({'message': 'hi', 'owner': 'bot-1'}).execute()
+    row = client.table('broadcasts').select('*').eq('owner', 'bot-1').execute().data[0]
+    assert row['message'] == 'hi' and row['lease_until'] is None
+    client.close()
+
+    # Reopening must not try to add the columns again
+    sqlite_backend.create_client(db_path).close()
+
+def test_schema_seed_rows_are_not_restored_on_reconnect(db_path):
+    client = sqlite_backend.create_client(db_path)
+    assert client.table('config').select('key').eq('key', 'admin_password').execute().data
+    client.table('config').delete().eq('key', 'admin_password').execute()
+    client.close()
+
+    client = sqlite_backend.create_client(db_path)
+    assert client.table('config').select('key').eq('key', 'admin_password').execute().data == []
+    client.close()
+
+def test_locked_database_does_not_block_the_event_loop(db_path):
+    client = sqlite_backend.create_async_client(db_path)
+    # Another process (the admin panel) holds the write lock for a while
+    other = sqlite3.connect(db_path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.create_task(ticker())
+        write = asyncio.create_task(client.rpc('increment_stat', {'stat_key': 'total_deals'}).execute())
+        await asyncio.sleep(0.3)
+        assert not write.done()
+        other.execute("COMMIT")
+        await write
+        ticking.cancel()
+        return ticks
+
+    started = time.monotonic()
+    ticks = asyncio.run(run())
+    # The loop kept running while the write waited for the lock
+    assert ticks >= 10
+    assert time.monotonic() - started < 5
+    other.close()
+    client.close()
@@ -0,0 +1,65 @@
+"""increment_stat: atomic RPC increments and in-memory coalescing (user-005)"""
+import asyncio
+import threading
+import sqlite_backend
+
+def _stored(db, key):
+    """Value in the statistics table, bypassing caches and pending increments"""
+    async def read():
+        result = await db.supabase.table('statistics').select('value').eq('key', key).execute()
+        return result.data[0]['value'] if result.data else 0
+    return asyncio.run(read())
+
+def test_concurrent_increments_are_not_lost(db):
+    before = _stored(db, 'total_deals')
+
+    async def run():
+        await asyncio.gather(*(db.increment_stat('total_deals') for _ in range(200)))
+
+    asyncio.run(run())
+    assert _stored(db, 'total_deals') == before + 200
+
+def test_increments_from_separate_connections_are_not_lost(db, db_path):
+    """The bot and the admin panel write through different connections"""
+    before = _stored(db, 'disputes_resolved')
+    clients = [sqlite_backend.create_client(db_path) for _ in range(4)]
+
+    def worker(client):
+        for _ in range(50):
+            client.rpc('increment_stat', {'stat_key': 'disputes_resolved', 'amount': 1}).execute()
+
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for client in clients:
+        client.close()
+    assert _stored(db, 'disputes_resolved') == before + 200
+
+def test_coalesced_increments_are_visible_and_flushed_once(db):
+    before = _stored(db, 'total_deals')
+
+    async def stored(key):
+        result = await db.supabase.table('statistics').select('value').eq('key', key).execute()
+        return result.data[0]['value']
+
+    async def run():
+        db.start_stats_flusher(interval=3600)
+        try:
+            await asyncio.gather(*(db.increment_stat('total_deals', 2) for _ in range(50)))
+            # Not written yet, but already part of the statistics the bot shows
+            assert await stored('total_deals') == before
+            assert (await db.get_statistics())['total_deals'] == before + 100
+        finally:
+            await db.stop_stats_flusher()
+
+    asyncio.run(run())
+    assert _stored(db, 'total_deals') == before + 100
+    assert not db._pending_stats
+
+def test_creating_a_deal_does_not_count_as_completed(db):
+    """total_deals is shown as DEALS COMPLETED; a new group is not a completed deal"""
+    before = _stored(db, 'total_deals')
+    asyncio.run(db.create_deal('ABCDE', 1, 0, -100123))
+    assert _stored(db, 'total_deals') == before
@@ -0,0 +1,81 @@
+"""
+Per-chat Update Processor
+Lets the bot handle updates concurrently (a slow group creation no longer
+holds up every other chat) while updates from the same chat still run one
+after another, in arrival order (/seller then /buyer in a group stay ordered).
+"""
+import os
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# Updates handled at the same time across all chats
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "16"))
+
+# Updates allowed in flight (running or waiting on their chat) before new ones queue up
+MAX_PENDING_UPDATES = 1024
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    At most `workers` updates run at once; updates of one chat run serially.
+
+    An update first waits for its chat (asyncio.Lock waiters are FIFO, so
+    arrival order is kept) and only then takes a worker slot, so a busy
+    chat cannot occupy every worker with updates that are just waiting.
+    Updates without a chat (e.g. inline queries) only need a worker slot.
+    """
+
+    def __init__(self, workers=UPDATE_WORKERS):
+        # The base semaphore only caps in-flight updates; workers is enforced below
+        super().__init__(max(MAX_PENDING_UPDATES, workers))
+        self.workers = workers
+        self._slots = None
+        # chat_id -> [lock, updates holding or waiting for it]
+        self._chats = {}
+        self.processed = 0
+        self.waited = 0
+
+    async def initialize(self):
+        self._slots = asyncio.Semaphore(self.workers)
+        logger.info(f"✅ Update processor started ({self.workers} workers, per-chat ordering)")
+
+    async def shutdown(self):
+        self._chats.clear()
+
+    @staticmethod
+    def _chat_id(update):
+        if isinstance(update, Update) and update.effective_chat:
+            return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        chat_id = self._chat_id(update)
+        if chat_id is None:
+            await self._run(coroutine)
+            return
+
+        entry = self._chats.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        if entry[0].locked():
+            self.waited += 1
+        try:
+            async with entry[0]:
+                await self._run(coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[chat_id]
+
+    async def _run(self, coroutine):
+        async with self._slots:
+            try:
+                await coroutine
+            finally:
+                self.processed += 1
+
+    def stats(self):
+        """Processed updates, updates that had to wait for their chat, chats in flight"""
+        return {'processed': self.processed, 'waited_for_chat': self.waited, 'active_chats': len(self._chats)}
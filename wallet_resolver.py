@@ -0,0 +1,114 @@
+"""
+Escrow Wallet Resolver
+In-memory index answering get_bot_wallet_address lookups without a DB scan.
+
+The index is built from the crypto_addresses table plus the legacy
+wallet_* config keys, and is rebuilt only after it is invalidated (an
+address or wallet_* key was written) or has aged past max_age (writes
+made by another process, e.g. the admin panel).
+"""
+import os
+import threading
+import time
+
+import validators
+
+# Networks that must match explicitly (a generic "USDT" row never answers for them)
+SPECIFIC_NETWORKS = ['BEP20', 'ERC20', 'TRC20']
+
+LEGACY_PREFIX = 'wallet_'
+
+class WalletResolver:
+    """Network string -> escrow address index"""
+
+    def __init__(self, max_age=None):
+        self.max_age = max_age if max_age is not None else int(os.getenv("WALLET_INDEX_TTL", "300"))
+        self._rows = []
+        self._legacy = {}
+        self._index = {}
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        """True if the index is built and not stale"""
+        return self._built_at is not None and time.monotonic() - self._built_at < self.max_age
+
+    def invalidate(self):
+        """Force a rebuild on the next lookup"""
+        with self._lock:
+            self._built_at = None
+
+    def build(self, addresses, legacy_wallets):
+        """
+        Compile the index.
+
+        Args:
+            addresses: rows as returned by get_crypto_addresses()
+                (id, currency, address, network, label, created_at), newest first
+            legacy_wallets: {network_string: address} from wallet_* config keys
+        """
+        rows = [
+            ((a[1] or "").upper(), (a[3] or "").upper(), (a[4] or "").upper(), a[2])
+            for a in addresses
+        ]
+        index = {}
+        with self._lock:
+            self._rows = rows
+            self._legacy = dict(legacy_wallets)
+            # Pre-resolve every network string the bot can actually produce
+            known = set(validators.get_supported_coins()) | {'Unknown'} | set(self._legacy)
+            for currency, _network, label, _address in rows:
+                known.update(x for x in (currency, label) if x)
+            for network_string in known:
+                index[network_string] = self._scan(network_string)
+            self._index = index
+            self._built_at = time.monotonic()
+
+    def resolve(self, network_string):
+        """Return the escrow address for network_string, or None (index must be built)"""
+        address = self._index.get(network_string, ())
+        if address == ():
+            # Under the lock so a scan of old rows is never stored in an index
+            # that build() (e.g. from an admin panel thread) has just swapped in
+            with self._lock:
+                address = self._index.get(network_string, ())
+                if address == ():
+                    address = self._scan(network_string)
+                    self._index[network_string] = address
+        return address
+
+    def _scan(self, network_string):
+        """Original matching rules, applied once per distinct network string"""
+        net_upper = network_string.upper()
+        for currency, network_field, label, address in self._rows:
+            # Simple Match: Currency matches exact string (e.g. BTC)
+            if currency == net_upper:
+                return address
+
+            # Complex Match: Currency inside string (e.g. USDT in USDT (BEP20))
+            if currency and currency in net_upper:
+                # If network specified in DB, must match (e.g. BEP20)
+                if network_field and network_field in net_upper:
+                    return address
+                # If no network specified in DB, generic match
+                if not network_field and not any(x in net_upper for x in SPECIFIC_NETWORKS):
+                    return address
+
+            # Label Match (e.g. "Main Wallet")
+            if label and label == net_upper:
+                return address
+
+        # Fallback to Config (Legacy)
+        return self._legacy.get(network_string)
+
+def legacy_wallets_from_rows(config_rows):
+    """Map wallet_* config rows to {network_string: address}"""
+    return {
+        row['key'][len(LEGACY_PREFIX):]: row['value']
+        for row in config_rows
+        if row['key'].startswith(LEGACY_PREFIX) and row.get('value')
+    }
+
+# Shared resolver for this process
+wallet_resolver = WalletResolver()
@@ -0,0 +1,98 @@
+"""
+Write-Behind Queue
+Buffers rows in memory and writes them in bulk from a background task,
+so callers on the reply path never wait for the database.
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindQueue:
+    """
+    Deduplicating buffer flushed as one bulk write.
+
+    Rows are keyed by `key` (latest row wins) and handed to `flush_fn` as a
+    list every `flush_interval` seconds, or sooner once `max_batch` rows are
+    waiting. `stop()` drains everything still buffered.
+    """
+
+    def __init__(self, name, flush_fn, key, flush_interval=0.3, max_batch=500):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.key = key
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending = {}
+        self._wake = asyncio.Event()
+        self._task = None
+        self.flushed = 0
+        self.failures = 0
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    @property
+    def depth(self):
+        """Rows waiting to be written"""
+        return len(self._pending)
+
+    def put(self, row):
+        """Buffer a row (replaces any pending row with the same key)"""
+        self._pending[row[self.key]] = row
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    def start(self):
+        """Start the background flush task (must be called inside the event loop)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task and drain the buffer"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # Fresh event in case the queue is restarted on a new event loop
+        self._wake = asyncio.Event()
+        while self._pending:
+            if not await self.flush():
+                logger.error(f"❌ {self.name}: dropping {self.depth} unwritten rows on shutdown")
+                break
+
+    async def flush(self):
+        """Write buffered rows in batches of max_batch; returns False if a batch failed"""
+        while self._pending:
+            keys = list(self._pending)[:self.max_batch]
+            batch = [self._pending.pop(k) for k in keys]
+            try:
+                await self.flush_fn(batch)
+                self.flushed += len(batch)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ {self.name}: bulk write of {len(batch)} rows failed: {e}")
+                # Re-buffer without overwriting rows that arrived meanwhile
+                for row in batch:
+                    self._pending.setdefault(row[self.key], row)
+                return False
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._pending:
+                await self.flush()
+
+    def stats(self):
+        """Queue depth and write counters"""
+        return {'depth': self.depth, 'flushed': self.flushed, 'failures': self.failures}